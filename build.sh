@@ -2,15 +2,12 @@
 set -o errexit
 
 pip install -r requirements.txt
-python manage.py collectstatic --no-input
-```
-
-## **Step 3: Add to Google Sheet**
 
-Manually add test users to your Google Sheet:
-
-**Users sheet:**
-```
-username | email | password | user_type | first_name
-afnan | afnan.messaging@gmail.com | 9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08 | student | Afnan
-teacher | teacher@wellcheck.com | 9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08 | teacher | Teacher
\ No newline at end of file
+# Everything below runs against wellbeing_project/settings.py, so collectstatic
+# hashes the bundle into the STATIC_ROOT the app actually serves. Byte-compile
+# up front and run the warm-up once, so a broken template fails the build;
+# gunicorn.conf.py runs it again in the master before forking
+cd wellbeing_project
+python manage.py collectstatic --no-input
+python -m compileall -q .
+python manage.py warm_up
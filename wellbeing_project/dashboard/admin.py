@@ -1,7 +1,16 @@
 from django.contrib import admin
-from import_export import resources
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.db.models import Max, Min, Q
+from django.urls import reverse
+from django.utils.functional import cached_property
+from django.utils.html import format_html
+from import_export import fields, resources, widgets
 from import_export.admin import ImportExportModelAdmin
-from .models import UserProfile, MoodEntry
+from .jobs import id_ranges, submit
+from .models import DigestRun, ExportJob, UserProfile, MoodEntry, MoodRollup, ReportSnapshot, SyncCheckpoint, TenantMembership
+from .replica import use_replica
+from .search import comment_search_q
 
 
 # ------------------ UserProfile Admin ------------------
@@ -13,7 +22,28 @@ class UserProfileAdmin(admin.ModelAdmin):
 
 
 # ------------------ MoodEntry Export Resource ------------------
+class MoodWidget(widgets.Widget):
+    """Exports mood codes as their slug ('happy') and imports them back."""
+
+    def clean(self, value, row=None, **kwargs):
+        if value in (None, ''):
+            return None
+        # import_export reports a ValueError against the row instead of failing the import
+        if str(value).isdigit():
+            if int(value) not in MoodEntry.MOOD_CODES.values():
+                raise ValueError(f"Unknown mood code: {value}")
+            return int(value)
+        if value not in MoodEntry.MOOD_CODES:
+            raise ValueError(f"Unknown mood: {value}")
+        return MoodEntry.MOOD_CODES[value]
+
+    def render(self, value, obj=None, **kwargs):
+        return MoodEntry.MOOD_SLUGS[value] if value else ''
+
+
 class MoodEntryResource(resources.ModelResource):
+    mood = fields.Field(attribute='mood', column_name='mood', widget=MoodWidget())
+
     class Meta:
         model = MoodEntry
         fields = (
@@ -26,17 +56,149 @@ class MoodEntryResource(resources.ModelResource):
         )
 
 
+# ------------------ Estimated Count Paginator ------------------
+class EstimatedCountPaginator(Paginator):
+    """
+    Skips COUNT(*) on unfiltered querysets: the id range, which SQLite
+    answers from the primary key alone, stands in for the count while it
+    is close enough. Archiving deletes whole ranges, though, so when the
+    span is well above sqlite_stat1's row count (kept by ANALYZE, which
+    archive_moods runs) the exact count is used instead. Filtered lists
+    always get an exact count.
+    """
+    # Spans this much larger than the analysed row count are treated as gappy
+    MAX_OVERESTIMATE = 1.1
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where:
+            bounds = self.object_list.aggregate(low=Min('id'), high=Max('id'))
+            if bounds['high'] is None:
+                return 0
+            span = bounds['high'] - bounds['low'] + 1
+            analysed = self._analysed_rows()
+            if analysed is not None and span <= analysed * self.MAX_OVERESTIMATE:
+                return span
+        return super().count
+
+    def _analysed_rows(self):
+        connection = connections[self.object_list.db]
+        if connection.vendor != 'sqlite':
+            return None
+        table = self.object_list.model._meta.db_table
+        with connection.cursor() as cursor:
+            try:
+                # One row per index; each stat string starts with the table's row count
+                cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s", [table])
+            except DatabaseError:
+                return None  # never analysed
+            counts = [int(stat.split()[0]) for stat, in cursor.fetchall()]
+        return max(counts) if counts else None
+
+
 # ------------------ MoodEntry Admin WITH EXPORT ------------------
 @admin.register(MoodEntry)
 class MoodEntryAdmin(ImportExportModelAdmin):   # 👈 enables Export & Import
     resource_class = MoodEntryResource
 
     list_display = ['user', 'mood', 'mood_emoji', 'date', 'timestamp']
-    list_filter = ['mood', 'date']
+    list_select_related = ['user']
+    list_filter = ['mood']
+    date_hierarchy = 'date'
     search_fields = ['user__username', 'comment']
     readonly_fields = ['timestamp', 'date']
     ordering = ['-timestamp']
 
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ['export_in_background']
+
+    def get_search_results(self, request, queryset, search_term):
+        # Comments go through the FTS index (or icontains where it is missing)
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        matches = Q(user__username__icontains=search_term) | comment_search_q(search_term, using=queryset.db)
+        return queryset.filter(matches), False
+
+    def export_action(self, request):
+        # Full-table exports read the replica so check-ins aren't kept waiting
+        with use_replica():
+            return super().export_action(request)
+
+    @admin.action(description="Export selected entries in the background")
+    def export_in_background(self, request, queryset):
+        ids = list(queryset.order_by('id').values_list('id', flat=True))
+        job = submit('moodentry_admin', {'ranges': id_ranges(ids), 'rows': len(ids)}, request.user)
+        self.message_user(request, format_html(
+            'Export #{} is {}; <a href="{}">follow it here</a>.',
+            job.pk, job.get_status_display().lower(), reverse('admin:dashboard_exportjob_change', args=[job.pk]),
+        ))
+
     def mood_emoji(self, obj):
         return obj.get_emoji()
     mood_emoji.short_description = "Emoji"
+
+
+# ------------------ Archived Rollups ------------------
+@admin.register(MoodRollup)
+class MoodRollupAdmin(admin.ModelAdmin):
+    list_display = ['date', 'class_group', 'mood', 'count', 'archived']
+    list_filter = ['class_group', 'mood']
+    date_hierarchy = 'date'
+
+
+# ------------------ Report Snapshots ------------------
+@admin.register(ReportSnapshot)
+class ReportSnapshotAdmin(admin.ModelAdmin):
+    list_display = ['period', 'start', 'end', 'scope', 'class_group', 'created_at']
+    list_filter = ['period', 'scope']
+    date_hierarchy = 'start'
+
+    # Snapshots are immutable; rebuild them with `build_report_snapshots --rebuild`
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+# ------------------ Sheets Sync ------------------
+@admin.register(SyncCheckpoint)
+class SyncCheckpointAdmin(admin.ModelAdmin):
+    list_display = ['name', 'sheet_rows', 'db_synced_at', 'updated_at']
+
+
+# ------------------ School Directory ------------------
+@admin.register(TenantMembership)
+class TenantMembershipAdmin(admin.ModelAdmin):
+    list_display = ['email', 'tenant']
+    list_filter = ['tenant']
+    search_fields = ['email']
+
+
+# ------------------ Background Exports ------------------
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'kind', 'status', 'percent', 'created_by', 'created_at', 'finished_at', 'download']
+    list_filter = ['status', 'kind']
+    readonly_fields = [f.name for f in ExportJob._meta.fields] + ['download']
+
+    def has_add_permission(self, request):
+        return False
+
+    def download(self, obj):
+        if obj.status != 'done':
+            return '-'
+        return format_html('<a href="{}">Download</a>', reverse('export_download', args=[obj.pk]))
+
+
+# ------------------ Low-Mood Digests ------------------
+@admin.register(DigestRun)
+class DigestRunAdmin(admin.ModelAdmin):
+    list_display = ['id', 'since', 'until', 'events', 'messages', 'created_at']
+    readonly_fields = [f.name for f in DigestRun._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
@@ -1,6 +1,32 @@
 from django.apps import AppConfig
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_migrate, post_save
+
+
+def restore_comment_index(sender, using='default', **kwargs):
+    # SQLite table rebuilds (ALTER via copy) drop triggers; put them back
+    from .search import fts_installed, install_comment_index
+
+    conn = connections[using]
+    if fts_installed(conn):
+        install_comment_index(conn)
 
 
 class DashboardConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'dashboard'
+
+    def ready(self):
+        post_migrate.connect(restore_comment_index, sender=self)
+
+        from .metrics import connection_created as time_queries
+
+        connection_created.connect(time_queries)
+
+        from .heatmap import entry_changed, profile_changed
+        from .models import MoodEntry, UserProfile
+
+        for signal in (post_save, post_delete):
+            signal.connect(entry_changed, sender=MoodEntry)
+            signal.connect(profile_changed, sender=UserProfile)
@@ -0,0 +1,202 @@
+import gzip
+import json
+import os
+from collections import defaultdict
+from datetime import date, datetime
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connections, transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+
+from .heatmap import forget_history
+from .models import MoodEntry, MoodRollup
+from .risk import comment_risk
+from .tenants import tenant_db
+
+BATCH_SIZE = 2000
+
+# School terms by starting month; a date belongs to the last term started
+TERMS = [(1, 'spring'), (5, 'summer'), (9, 'autumn')]
+
+
+def term_for(day):
+    name = [term for month, term in TERMS if day.month >= month][-1]
+    return f"{day.year}-{name}"
+
+
+def archive_path(term, archive_dir=None):
+    return os.path.join(archive_dir or settings.MOOD_ARCHIVE_DIR, f"moods-{term}.jsonl.gz")
+
+
+def _serialize(entry):
+    return {
+        'id': entry.id,
+        'user_id': entry.user_id,
+        'username': entry.user.username if entry.user else None,
+        'date': entry.date.isoformat(),
+        'mood': entry.mood_slug,
+        'valence': entry.valence,
+        'comment': entry.comment,
+        'timestamp': entry.timestamp.isoformat(),
+    }
+
+
+def rollup_counts(queryset):
+    """(date, class_group, mood, count) for every day, class and mood in `queryset`."""
+    counts = (
+        queryset.values('date', 'user__userprofile__class_group', 'mood')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    return [
+        (row['date'], row['user__userprofile__class_group'] or '', row['mood'], row['count'])
+        for row in counts
+    ]
+
+
+def add_rollups(queryset, archived=False):
+    """
+    Add the counts of `queryset` onto MoodRollup, creating rows as needed.
+    With `archived`, the entries are about to be deleted: they move into
+    the archived part, and since every entry for those days goes to the
+    archive together, the day's total becomes its archived count.
+    """
+    rows = rollup_counts(queryset)
+    if not rows:
+        return 0
+    connection = connections[tenant_db()]
+    table = connection.ops.quote_name(MoodRollup._meta.db_table)
+    if archived:
+        updates = f"archived = {table}.archived + excluded.archived, count = {table}.archived + excluded.archived"
+    else:
+        updates = f"count = {table}.count + excluded.count"
+    # bulk_create(update_conflicts=True) can only overwrite; the counts have to add up
+    sql = (
+        f"INSERT INTO {table} (date, class_group, mood, count, archived) VALUES (%s, %s, %s, %s, %s) "
+        f"ON CONFLICT (date, class_group, mood) DO UPDATE SET {updates}"
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [
+            (connection.ops.adapt_datefield_value(day), group, mood, n, n if archived else 0)
+            for day, group, mood, n in rows
+        ])
+    return len(rows)
+
+
+def unarchive_rollups(queryset):
+    """Take restored entries back out of the archived part; the day's total is unchanged."""
+    for day, group, mood, n in rollup_counts(queryset):
+        MoodRollup.objects.filter(date=day, class_group=group, mood=mood).update(
+            archived=Greatest(F('archived') - n, 0)
+        )
+
+
+def archive_before(cutoff, archive_dir=None, dry_run=False):
+    """
+    Move entries dated before `cutoff` into per-term gzip JSONL files.
+    Each batch is counted into the rollups in the same transaction that
+    deletes it, so aggregates survive the delete. Returns a {term: entry
+    count} dict.
+    """
+    archive_dir = archive_dir or settings.MOOD_ARCHIVE_DIR
+    old = MoodEntry.objects.filter(date__lt=cutoff)
+    if dry_run:
+        summary = defaultdict(int)
+        for day in old.values_list('date', flat=True).iterator():
+            summary[term_for(day)] += 1
+        return dict(summary)
+
+    os.makedirs(archive_dir, exist_ok=True)
+
+    summary = defaultdict(int)
+    files = {}
+    archived_ids = []
+    try:
+        entries = old.select_related('user').order_by('date', 'id')
+        for entry in entries.iterator(chunk_size=BATCH_SIZE):
+            term = term_for(entry.date)
+            if term not in files:
+                # Appending adds a new gzip member; readers see one stream
+                files[term] = gzip.open(archive_path(term, archive_dir), 'at', encoding='utf-8')
+            files[term].write(json.dumps(_serialize(entry), ensure_ascii=False) + '\n')
+            archived_ids.append(entry.id)
+            summary[term] += 1
+    finally:
+        for f in files.values():
+            f.close()
+
+    # Only rows that made it to disk are removed
+    with transaction.atomic(using=tenant_db()):
+        for i in range(0, len(archived_ids), BATCH_SIZE):
+            batch = MoodEntry.objects.filter(id__in=archived_ids[i:i + BATCH_SIZE])
+            add_rollups(batch, archived=True)
+            batch.delete()
+    forget_history()
+    if archived_ids and connections[tenant_db()].vendor == 'sqlite':
+        # The admin's row estimate reads sqlite_stat1 (see EstimatedCountPaginator)
+        with connections[tenant_db()].cursor() as cursor:
+            cursor.execute(f"ANALYZE {MoodEntry._meta.db_table}")
+
+    return dict(summary)
+
+
+def read_archive(start, end, archive_dir=None):
+    """Yield archived records dated between `start` and `end` (inclusive)."""
+    archive_dir = archive_dir or settings.MOOD_ARCHIVE_DIR
+    terms = sorted({
+        term_for(date(year, month, 1))
+        for year in range(start.year, end.year + 1)
+        for month, _ in TERMS
+    })
+    for term in terms:
+        path = archive_path(term, archive_dir)
+        if not os.path.exists(path):
+            continue
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                record = json.loads(line)
+                if start.isoformat() <= record['date'] <= end.isoformat():
+                    yield record
+
+
+def restore_range(start, end, archive_dir=None):
+    """Re-hydrate archived entries between `start` and `end` into MoodEntry."""
+    # A range archived, restored and archived again appears twice; keep one
+    records = {r['id']: r for r in read_archive(start, end, archive_dir)}
+    ids = list(records)
+    for i in range(0, len(ids), BATCH_SIZE):
+        # Already back in the table; its count left the archived part then
+        for entry_id in MoodEntry.objects.filter(id__in=ids[i:i + BATCH_SIZE]).values_list('id', flat=True):
+            del records[entry_id]
+    if not records:
+        return 0
+
+    user_ids = {r['user_id'] for r in records.values() if r['user_id']}
+    existing_users = set(User.objects.filter(id__in=user_ids).values_list('id', flat=True))
+
+    entries = [
+        MoodEntry(
+            id=r['id'],
+            user_id=r['user_id'] if r['user_id'] in existing_users else None,
+            date=date.fromisoformat(r['date']),
+            mood=MoodEntry.MOOD_CODES[r['mood']],
+            valence=r['valence'],
+            comment=r['comment'],
+            risk_flags=comment_risk(r['comment']),
+            timestamp=datetime.fromisoformat(r['timestamp']),
+        )
+        for r in records.values()
+    ]
+    original_dates = [(e.date, e.timestamp) for e in entries]
+    with transaction.atomic(using=tenant_db()):
+        MoodEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE, ignore_conflicts=True)
+        # bulk_create applies auto_now_add; put the original dates back
+        for entry, (day, timestamp) in zip(entries, original_dates):
+            entry.date, entry.timestamp = day, timestamp
+        MoodEntry.objects.bulk_update(entries, ['date', 'timestamp'], batch_size=BATCH_SIZE)
+        for i in range(0, len(entries), BATCH_SIZE):
+            unarchive_rollups(MoodEntry.objects.filter(id__in=[e.id for e in entries[i:i + BATCH_SIZE]]))
+    forget_history()
+    return len(entries)
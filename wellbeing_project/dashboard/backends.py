@@ -0,0 +1,94 @@
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import check_password
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models.functions import Lower
+
+from .hashers import check_sheets_password, from_sheets
+from .models import UserProfile
+from .rehash import schedule_rehash
+from .sheets_client import SheetsUnavailable
+from .tenants import tenant_db
+
+
+class EmailBackend(ModelBackend):
+    """
+    Logs users in by email. The user and their UserProfile come back in one
+    indexed query, and an optional `user_type` is checked against the
+    profile. When authentication fails the reason is left on
+    `request.login_error` for the login page.
+
+    Users that only exist in the Sheets `Users` tab are copied into the
+    database on their first successful login. Outdated password hashes are
+    upgraded by the background rehash queue rather than inline.
+    """
+
+    def authenticate(self, request, email=None, password=None, user_type=None, **kwargs):
+        if email is None or password is None:
+            return None
+
+        # Case-insensitive, on the LOWER(email) index (migration 0013)
+        user = (
+            User.objects.select_related('userprofile')
+            .alias(email_lower=Lower('email'))
+            .filter(email_lower=email.strip().lower())
+            .order_by('id')
+            .first()
+        )
+        if user is None:
+            try:
+                record = self._sheets_record(email)
+            except SheetsUnavailable:
+                return self._fail(request, 'Sign-in is busy right now. Please try again in a minute.')
+            if record is None:
+                return self._fail(request, 'No account found with this email')
+            needs_upgrade = []
+            if not check_sheets_password(password, record['password'], setter=needs_upgrade.append):
+                return self._fail(request, 'Invalid password')
+            user = self._import_from_sheets(record)
+            if user is None:
+                return self._fail(request, 'No account found with this email')
+            if needs_upgrade:
+                schedule_rehash(user, password)
+        elif not check_password(password, user.password, setter=lambda raw: schedule_rehash(user, raw)):
+            return self._fail(request, 'Invalid password')
+
+        if not self.user_can_authenticate(user):
+            return self._fail(request, 'Invalid password')
+
+        profile = getattr(user, 'userprofile', None)
+        if profile is None:
+            return self._fail(request, 'Profile missing for this account')
+        if user_type is not None and profile.user_type != user_type:
+            return self._fail(request, f"Account is registered as {profile.user_type}, not {user_type}")
+
+        return user
+
+    def _fail(self, request, error):
+        if request is not None:
+            request.login_error = error
+        return None
+
+    def _sheets_record(self, email):
+        if not settings.GOOGLE_SHEETS_ENABLED:
+            return None
+        from .sheets_db import db as sheets
+
+        return sheets.get_user_by_email(email)
+
+    def _import_from_sheets(self, record):
+        try:
+            with transaction.atomic(using=tenant_db()):
+                user = User.objects.create(
+                    username=record['username'],
+                    email=record['email'],
+                    first_name=record['first_name'],
+                    password=from_sheets(record['password']),
+                )
+                # Also fills user.userprofile, so no re-fetch is needed
+                UserProfile.objects.create(user=user, user_type=record['user_type'])
+        except IntegrityError:
+            # Username already taken by a different database account
+            return None
+        return user
@@ -0,0 +1,235 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import DatabaseError, close_old_connections, transaction
+from django.utils import timezone
+
+from .heatmap import forget_history
+from .models import MoodEntry
+from .risk import comment_risk
+from .tenants import current_tenant, tenant_db, use_tenant
+
+logger = logging.getLogger(__name__)
+
+# Accept-fast check-ins. Submissions go to a small SQLite spool file next to
+# the app (never the main database, which may be the thing that is locked)
+# and a worker thread applies them to MoodEntry in batches. Each submission
+# carries an idempotency key from the form, so double submits and
+# re-applied batches are harmless: applied keys are kept as tombstones for
+# as long as a form can still be posted (SESSION_COOKIE_AGE), and a
+# submission older than the stored entry is dropped.
+SCHEMA = """CREATE TABLE IF NOT EXISTS checkin_spool (
+    key TEXT PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    mood INTEGER NOT NULL,
+    comment TEXT NOT NULL,
+    accepted_at REAL NOT NULL,
+    claimed_at REAL,
+    tenant TEXT NOT NULL DEFAULT ''
+)"""
+TOMBSTONES = """CREATE TABLE IF NOT EXISTS checkin_applied (
+    key TEXT PRIMARY KEY,
+    applied_at REAL NOT NULL
+)"""
+
+# A claimed batch not applied within this many seconds (the process died)
+# is picked up again by the next drainer
+CLAIM_TIMEOUT = 60
+POLL_SECONDS = 5
+MAX_BACKOFF = 30
+
+_local = threading.local()
+_wake = threading.Event()
+_lock = threading.Lock()
+_worker_pid = None
+
+
+def _spool():
+    conn = getattr(_local, 'conn', None)
+    path = settings.CHECKIN_SPOOL_PATH
+    if conn is None or _local.key != (os.getpid(), path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        conn = sqlite3.connect(path, timeout=10, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=FULL')
+        conn.execute(SCHEMA)
+        conn.execute(TOMBSTONES)
+        conn.execute('CREATE INDEX IF NOT EXISTS checkin_applied_at ON checkin_applied (applied_at)')
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(checkin_spool)')}
+        if 'tenant' not in columns:
+            # Spool files from before per-school databases
+            conn.execute("ALTER TABLE checkin_spool ADD COLUMN tenant TEXT NOT NULL DEFAULT ''")
+        _local.conn, _local.key = conn, (os.getpid(), path)
+    return conn
+
+
+def enqueue_checkin(user_id, day, mood, comment, key):
+    """Durably record a check-in and wake the drainer. Returns immediately."""
+    # A key that was already applied is a replayed form; drop it
+    _spool().execute(
+        'INSERT OR IGNORE INTO checkin_spool (key, user_id, date, mood, comment, accepted_at, tenant) '
+        'SELECT ?, ?, ?, ?, ?, ?, ? WHERE NOT EXISTS (SELECT 1 FROM checkin_applied WHERE key = ?)',
+        [key, user_id, day.isoformat(), mood, comment or '', time.time(), current_tenant() or '', key],
+    )
+    with _lock:
+        _ensure_worker()
+    _wake.set()
+
+
+def has_pending(user_id, day):
+    row = _spool().execute(
+        'SELECT 1 FROM checkin_spool WHERE user_id = ? AND date = ? AND tenant = ? LIMIT 1',
+        [user_id, day.isoformat(), current_tenant() or ''],
+    ).fetchone()
+    return row is not None
+
+
+def pending_count():
+    return _spool().execute('SELECT COUNT(*) FROM checkin_spool').fetchone()[0]
+
+
+def _claim(limit):
+    conn = _spool()
+    now = time.time()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        rows = conn.execute(
+            'SELECT key, user_id, date, mood, comment, accepted_at, tenant FROM checkin_spool '
+            'WHERE claimed_at IS NULL OR claimed_at < ? ORDER BY accepted_at LIMIT ?',
+            [now - CLAIM_TIMEOUT, limit],
+        ).fetchall()
+        conn.executemany('UPDATE checkin_spool SET claimed_at = ? WHERE key = ?', [(now, r[0]) for r in rows])
+        conn.execute('COMMIT')
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    return rows
+
+
+def _release(keys, applied):
+    conn = _spool()
+    now = time.time()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        if applied:
+            conn.executemany('DELETE FROM checkin_spool WHERE key = ?', [(k,) for k in keys])
+            conn.executemany(
+                'INSERT OR REPLACE INTO checkin_applied (key, applied_at) VALUES (?, ?)', [(k, now) for k in keys],
+            )
+            conn.execute('DELETE FROM checkin_applied WHERE applied_at < ?', [now - settings.SESSION_COOKIE_AGE])
+        else:
+            conn.executemany('UPDATE checkin_spool SET claimed_at = NULL WHERE key = ?', [(k,) for k in keys])
+        conn.execute('COMMIT')
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+
+
+def apply_checkins(rows):
+    """
+    Write spooled (key, user_id, date, mood, comment, accepted_at) rows to
+    MoodEntry in one transaction. The latest submission per student and
+    day wins, as with the synchronous update_or_create path, including
+    over an entry already stored: one accepted earlier is skipped.
+    """
+    latest = {}
+    for key, user_id, day, mood, comment, accepted_at, *_ in sorted(rows, key=lambda r: r[5]):
+        accepted_at = datetime.fromtimestamp(accepted_at, tz=dt_timezone.utc)
+        latest[(user_id, date.fromisoformat(day))] = (mood, comment, accepted_at)
+
+    user_ids = {user_id for user_id, _ in latest}
+    live_users = set(User.objects.filter(id__in=user_ids).values_list('id', flat=True))
+    latest = {k: v for k, v in latest.items() if k[0] in live_users}
+    if not latest:
+        return 0
+
+    with transaction.atomic(using=tenant_db()):
+        existing = {
+            (e.user_id, e.date): e
+            for e in MoodEntry.objects.filter(user_id__in=live_users, date__in={d for _, d in latest})
+            if (e.user_id, e.date) in latest
+        }
+        changed, created = [], []
+        now = timezone.now()
+        for (user_id, day), (mood, comment, accepted_at) in latest.items():
+            entry = existing.get((user_id, day)) or MoodEntry(user_id=user_id)
+            if entry.pk and entry.timestamp >= accepted_at:
+                # The stored entry was submitted later (e.g. the direct path)
+                continue
+            entry.mood, entry.valence, entry.comment = mood, MoodEntry.MOOD_VALENCE[mood], comment
+            entry.risk_flags = comment_risk(comment)
+            entry.timestamp, entry.updated_at = accepted_at, now
+            (changed if entry.pk else created).append((entry, day, accepted_at))
+
+        # bulk_update skips auto_now, so updated_at is set by hand
+        MoodEntry.objects.bulk_update(
+            [e for e, _, _ in changed], ['mood', 'valence', 'comment', 'risk_flags', 'timestamp', 'updated_at'],
+        )
+        MoodEntry.objects.bulk_create([e for e, _, _ in created])
+        # bulk_create stamps today's date and time; keep when the student checked in
+        for entry, day, accepted_at in created:
+            entry.date, entry.timestamp = day, accepted_at
+        MoodEntry.objects.bulk_update([e for e, _, _ in created], ['date', 'timestamp'])
+    written = [day for _, day, _ in changed + created]
+    if any(day < date.today() for day in written):
+        # Drained after midnight: yesterday's heatmap column changed
+        forget_history()
+    return len(written)
+
+
+def drain(batch_size=None):
+    """Apply spooled check-ins until the spool is empty. Returns rows applied."""
+    batch_size = batch_size or settings.CHECKIN_DRAIN_BATCH_SIZE
+    applied = 0
+    while True:
+        rows = _claim(batch_size)
+        if not rows:
+            return applied
+        keys = [r[0] for r in rows]
+        by_tenant = {}
+        for row in rows:
+            by_tenant.setdefault(row[6], []).append(row)
+        try:
+            for tenant, tenant_rows in by_tenant.items():
+                with use_tenant(tenant or None):
+                    apply_checkins(tenant_rows)
+        except Exception:
+            _release(keys, applied=False)
+            raise
+        _release(keys, applied=True)
+        applied += len(rows)
+
+
+def _ensure_worker():
+    global _worker_pid
+    # Threads do not survive a fork, so each gunicorn worker starts its own
+    if _worker_pid != os.getpid():
+        _worker_pid = os.getpid()
+        threading.Thread(target=_run, name='checkin-drainer', daemon=True).start()
+
+
+def _run():
+    backoff = 1
+    while True:
+        _wake.wait(POLL_SECONDS)
+        _wake.clear()
+        try:
+            drain()
+            backoff = 1
+        except DatabaseError as exc:
+            # Usually "database is locked" during the rush; the rows stay spooled
+            logger.warning("Check-in drain deferred for %ss: %s", backoff, exc)
+            time.sleep(backoff)
+            backoff = min(backoff * 2, MAX_BACKOFF)
+            _wake.set()
+        except Exception:
+            logger.exception("Check-in drain failed")
+        finally:
+            close_old_connections()
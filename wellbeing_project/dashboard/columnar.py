@@ -0,0 +1,94 @@
+from datetime import datetime, timezone
+from itertools import islice
+
+from .models import MOODS, MoodEntry
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# Parquet export of MoodEntry for the data team. Rows are read with a
+# chunked values_list() and written one row group at a time, so memory
+# stays at one row group however long the history. Moods are stored as a
+# fixed dictionary (the slugs, in MOODS order) so every file and row group
+# shares the same categories; class groups are dictionary-encoded too.
+
+ROW_GROUP_SIZE = 100_000
+
+MOOD_SLUGS = [slug for code, slug, label, emoji, valence in MOODS]
+MOOD_INDEX = {code: i for i, (code, *_) in enumerate(MOODS)}
+
+FIELDS = ['id', 'date', 'user_id', 'user__userprofile__class_group', 'mood', 'valence', 'timestamp', 'comment']
+
+
+def parquet_available():
+    return pa is not None
+
+
+def schema(comments=True):
+    fields = [
+        pa.field('id', pa.int64(), nullable=False),
+        pa.field('date', pa.date32(), nullable=False),
+        pa.field('user_id', pa.int64()),
+        pa.field('class_group', pa.dictionary(pa.int32(), pa.string())),
+        pa.field('mood', pa.dictionary(pa.int8(), pa.string()), nullable=False),
+        pa.field('valence', pa.int8(), nullable=False),
+        pa.field('timestamp', pa.timestamp('us', tz='UTC'), nullable=False),
+    ]
+    if comments:
+        fields.append(pa.field('comment', pa.string()))
+    return pa.schema(fields)
+
+
+def _row_group(rows, comments):
+    ids, dates, users, classes, moods, valences, stamps, texts = zip(*rows)
+    columns = [
+        pa.array(ids, pa.int64()),
+        pa.array(dates, pa.date32()),
+        pa.array(users, pa.int64()),
+        pa.array([c or '' for c in classes], pa.string()).dictionary_encode(),
+        pa.DictionaryArray.from_arrays(
+            pa.array([MOOD_INDEX[m] for m in moods], pa.int8()), pa.array(MOOD_SLUGS, pa.string()),
+        ),
+        pa.array(valences, pa.int8()),
+        pa.array(stamps, pa.timestamp('us', tz='UTC')),
+    ]
+    if comments:
+        columns.append(pa.array(texts, pa.string()))
+    return pa.Table.from_arrays(columns, schema=schema(comments))
+
+
+def write_parquet(out, start=None, end=None, comments=True, row_group_size=ROW_GROUP_SIZE, progress=None):
+    """
+    Write MoodEntry rows dated `start`..`end` (inclusive, either optional)
+    to `out` (a path or binary file) as Parquet. Returns the row count.
+    """
+    if pa is None:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+
+    entries = MoodEntry.objects.order_by('id')
+    if start:
+        entries = entries.filter(date__gte=start)
+    if end:
+        entries = entries.filter(date__lte=end)
+    if progress:
+        progress.total(entries.count())
+
+    metadata = {
+        'exported_at': datetime.now(timezone.utc).isoformat(),
+        'start': start.isoformat() if start else '',
+        'end': end.isoformat() if end else '',
+    }
+    rows = entries.values_list(*FIELDS).iterator(chunk_size=2000)
+    written = 0
+    with pq.ParquetWriter(
+        out, schema(comments).with_metadata(metadata), compression='zstd', use_dictionary=True,
+    ) as writer:
+        while chunk := list(islice(rows, row_group_size)):
+            writer.write_table(_row_group(chunk, comments), row_group_size=row_group_size)
+            written += len(chunk)
+            if progress:
+                progress.advance(len(chunk))
+    return written
@@ -0,0 +1,127 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import DigestRun, MoodEntry, UserProfile
+from .risk import risk_labels
+
+# Low-mood digests for teachers. Instead of a message per check-in, each
+# pass of `manage.py send_digests` reads every low-mood or flagged entry
+# updated since the previous pass in one query (updated_at is indexed and
+# bumped by every write path), groups them by class, and sends each
+# teacher one message covering their class (or the whole school, for
+# teachers without one) over a single mail connection. A pass is recorded
+# only after sending, so a failed send is retried with the same entries.
+
+
+def window(now=None):
+    """
+    (since, until) for the next digest, or None if the last one is younger
+    than DIGEST_INTERVAL_MINUTES. `until` trails `now` by
+    DIGEST_SETTLE_SECONDS: an entry can be stamped with an updated_at
+    before its transaction commits, and one committed after a pass that
+    already covered its stamp would never be reported.
+    """
+    until = (now or timezone.now()) - timedelta(seconds=settings.DIGEST_SETTLE_SECONDS)
+    interval = timedelta(minutes=settings.DIGEST_INTERVAL_MINUTES)
+    last = DigestRun.objects.values_list('until', flat=True).first()
+    if last is None:
+        return until - interval, until
+    if until - last < interval:
+        return None
+    return last, until
+
+
+def collect(since, until):
+    """{class_group: [event, ...]} for low-mood or flagged entries updated in since..until, flagged first."""
+    # Only recent days: restoring an archive also bumps updated_at
+    oldest = timezone.localdate(until) - timedelta(days=settings.DIGEST_MAX_AGE_DAYS)
+    rows = (
+        MoodEntry.objects.filter(updated_at__gt=since, updated_at__lte=until, date__gte=oldest)
+        .filter(Q(mood__in=MoodEntry.LOW_MOODS) | Q(risk_flags__gt=0))
+        .order_by('-risk_flags', 'date', 'user__username')
+        .values_list(
+            'user__first_name', 'user__last_name', 'user__username',
+            'user__userprofile__class_group', 'date', 'mood', 'risk_flags',
+        )
+    )
+    by_class = defaultdict(list)
+    for first, last, username, class_group, day, mood, flags in rows:
+        by_class[class_group or ''].append({
+            'name': f"{first} {last}".strip() or username or 'Unknown',
+            'class_group': class_group or '',
+            'date': day,
+            'mood': MoodEntry.MOOD_LABELS[mood],
+            'emoji': MoodEntry.MOOD_EMOJIS[mood],
+            'risks': risk_labels(flags),
+        })
+    return by_class
+
+
+def recipients():
+    """(email, first name, class_group) for every active teacher with an email address."""
+    return (
+        UserProfile.objects.filter(user_type='teacher', user__is_active=True)
+        .exclude(user__email='')
+        .values_list('user__email', 'user__first_name', 'class_group')
+    )
+
+
+def build_messages(by_class, since, until):
+    everyone = sorted((e for batch in by_class.values() for e in batch), key=lambda e: (not e['risks'], e['date']))
+    messages = []
+    for email, first_name, class_group in recipients():
+        if class_group:
+            events = by_class.get(class_group, [])
+        elif settings.DIGEST_SCHOOL_WIDE:
+            events = everyone
+        else:
+            continue
+        if not events:
+            continue
+        flagged = sum(1 for e in events if e['risks'])
+        body = render_to_string('low_mood_digest.txt', {
+            'teacher': first_name,
+            'class_group': class_group,
+            'events': events[:settings.DIGEST_MAX_ROWS],
+            'more': max(0, len(events) - settings.DIGEST_MAX_ROWS),
+            'flagged': flagged,
+            'since': timezone.localtime(since),
+            'until': timezone.localtime(until),
+            'dashboard_url': f"{settings.SITE_URL.rstrip('/')}/teacher/dashboard/",
+            'interval': settings.DIGEST_INTERVAL_MINUTES,
+        })
+        subject = f"Wellbeing: {len(events)} check-in{'s' if len(events) != 1 else ''} to look at"
+        if flagged:
+            subject += f" ({flagged} flagged)"
+        if class_group:
+            subject += f" - {class_group}"
+        messages.append(EmailMessage(subject, body, settings.DEFAULT_FROM_EMAIL, [email]))
+    return messages
+
+
+def send_digests(now=None, dry_run=False):
+    """
+    Send the current school's digest if one is due. Returns (events,
+    messages), or None when the last digest is too recent; a dry run
+    builds the messages without sending them or recording the pass.
+    """
+    due = window(now)
+    if due is None:
+        return None
+    since, until = due
+    by_class = collect(since, until)
+    events = sum(len(batch) for batch in by_class.values())
+    messages = build_messages(by_class, since, until) if events else []
+    if dry_run:
+        return events, messages
+    if messages:
+        # One connection for the whole batch, opened and closed once
+        get_connection(fail_silently=False).send_messages(messages)
+    DigestRun.objects.create(since=since, until=until, events=events, messages=len(messages))
+    return events, messages
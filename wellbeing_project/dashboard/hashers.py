@@ -0,0 +1,70 @@
+import hashlib
+import re
+
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    BasePasswordHasher, PBKDF2PasswordHasher, check_password, mask_hash,
+)
+from django.utils.crypto import constant_time_compare
+from django.utils.translation import gettext_noop as _
+
+LEGACY_SHEETS_HASH = re.compile(r'[0-9a-f]{64}')
+
+
+class TunedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2 with the iteration count taken from settings.PBKDF2_ITERATIONS,
+    so the login CPU budget can be tuned per deployment. Hashes made at a
+    different count still verify and are rehashed in the background.
+    """
+
+    @property
+    def iterations(self):
+        return getattr(settings, 'PBKDF2_ITERATIONS', PBKDF2PasswordHasher.iterations)
+
+
+class SheetsSHA256PasswordHasher(BasePasswordHasher):
+    """
+    Unsalted SHA-256, as SheetsDB used to store passwords. Only kept so
+    those users can log in once and be upgraded; never list it first in
+    PASSWORD_HASHERS.
+    """
+
+    algorithm = 'sheets_sha256'
+
+    def salt(self):
+        return ''
+
+    def encode(self, password, salt):
+        if salt != '':
+            raise ValueError("salt must be empty.")
+        return f"{self.algorithm}$${hashlib.sha256(password.encode()).hexdigest()}"
+
+    def decode(self, encoded):
+        algorithm, empty, hash = encoded.split('$', 2)
+        assert algorithm == self.algorithm
+        return {'algorithm': algorithm, 'hash': hash, 'salt': None}
+
+    def verify(self, password, encoded):
+        return constant_time_compare(encoded, self.encode(password, ''))
+
+    def safe_summary(self, encoded):
+        decoded = self.decode(encoded)
+        return {
+            _('algorithm'): decoded['algorithm'],
+            _('hash'): mask_hash(decoded['hash']),
+        }
+
+    def harden_runtime(self, password, encoded):
+        pass
+
+
+def from_sheets(stored):
+    """Django-format hash for a password cell from the Sheets `Users` tab."""
+    if LEGACY_SHEETS_HASH.fullmatch(stored or ''):
+        return f"{SheetsSHA256PasswordHasher.algorithm}$${stored}"
+    return stored
+
+
+def check_sheets_password(raw_password, stored, setter=None):
+    return check_password(raw_password, from_sheets(stored), setter)
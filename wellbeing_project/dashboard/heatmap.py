@@ -0,0 +1,93 @@
+import uuid
+from datetime import date, timedelta
+
+from django.core.cache import caches
+from django.db.models import Count, Q
+
+from .models import MOODS, MoodEntry
+from .tenants import current_tenant
+
+# Class x day x mood counts for the teacher heatmap. One conditional
+# aggregation query counts every mood for every (day, class) pair at
+# once. Finished days are cached per day in the shared "reports" cache;
+# anything that rewrites history (a past entry edited, synced, archived or
+# restored, a student moving class) calls forget_history(), which moves
+# the school to a new cache generation instead of hunting down keys.
+
+MOOD_CODES = [code for code, *_ in MOODS]
+
+
+def _cache():
+    return caches['reports']
+
+
+def _generation():
+    key = f"heatmap-gen:{current_tenant() or '-'}"
+    generation = _cache().get(key)
+    if generation is None:
+        generation = uuid.uuid4().hex
+        _cache().set(key, generation, None)
+    return generation
+
+
+def forget_history():
+    _cache().set(f"heatmap-gen:{current_tenant() or '-'}", uuid.uuid4().hex, None)
+
+
+def _count(days):
+    """{day: {class_group: [count per mood, in MOODS order]}} for `days`, in one query."""
+    rows = (
+        MoodEntry.objects.filter(date__in=days)
+        .values_list('date', 'user__userprofile__class_group')
+        .annotate(**{f"mood_{code}": Count('id', filter=Q(mood=code)) for code in MOOD_CODES})
+        .order_by()
+    )
+    counted = {day: {} for day in days}
+    for day, class_group, *counts in rows:
+        cells = counted[day].setdefault(class_group or '', [0] * len(MOOD_CODES))
+        # Profiles without a class and users without a profile share ''
+        counted[day][class_group or ''] = [a + b for a, b in zip(cells, counts)]
+    return counted
+
+
+def mood_heatmap(start, end, today=None):
+    """
+    Array-shaped heatmap for start..end: classes and dates label the axes
+    and counts[class][date] lists the count of each mood in `moods` order.
+    """
+    today = today or date.today()
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
+    generation = _generation()
+    keys = {day: f"heatmap:{current_tenant() or '-'}:{generation}:{day.isoformat()}" for day in days}
+    cached = _cache().get_many([keys[day] for day in days if day < today])
+    by_day = {day: cached[keys[day]] for day in days if keys[day] in cached}
+
+    missing = [day for day in days if day not in by_day]
+    if missing:
+        counted = _count(missing)
+        by_day.update(counted)
+        # Today can still change; earlier days can't (short of forget_history)
+        _cache().set_many({keys[day]: counted[day] for day in missing if day < today}, None)
+
+    classes = sorted({class_group for cells in by_day.values() for class_group in cells})
+    empty = [0] * len(MOOD_CODES)
+    return {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'moods': [slug for code, slug, *_ in MOODS],
+        'valence': [valence for *_, valence in MOODS],
+        'classes': classes,
+        'dates': [day.isoformat() for day in days],
+        'counts': [[by_day[day].get(class_group, empty) for day in days] for class_group in classes],
+    }
+
+
+def entry_changed(sender, instance, **kwargs):
+    if instance.date and instance.date < date.today():
+        forget_history()
+
+
+def profile_changed(sender, instance, **kwargs):
+    # A student moving class moves their past entries between rows
+    forget_history()
@@ -0,0 +1,244 @@
+import csv
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .columnar import write_parquet
+from .models import ExportJob, MoodEntry
+from .replica import use_replica
+from .tenants import current_tenant, tenant_db, use_tenant
+
+logger = logging.getLogger(__name__)
+
+# Exports run on a small thread pool inside the web process and report
+# progress through their ExportJob row, so any worker can answer a status
+# poll. Jobs are claimed with a conditional UPDATE, so a job is only ever
+# run once even when `manage.py run_jobs` and a web process both see it,
+# and a partial unique index keeps racing submits of the same export from
+# queueing it twice.
+
+EXPORTS = {}
+
+_pool = None
+_pool_pid = None
+_lock = threading.Lock()
+
+
+def export(kind, suffix='.csv', binary=False):
+    """Register `fn(params, out, progress)` as the export called `kind`; `out` is a text file unless `binary`."""
+    def register(fn):
+        EXPORTS[kind] = (fn, suffix, binary)
+        return fn
+    return register
+
+
+def job_key(kind, params):
+    blob = json.dumps([kind, params], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+
+def submit(kind, params, user=None):
+    """
+    The job producing this export: an identical queued or running one, a
+    finished one younger than EXPORT_RESULT_TTL, or else a new job.
+    """
+    if kind not in EXPORTS:
+        raise ValueError(f"Unknown export {kind!r}")
+    key = job_key(kind, params)
+    fresh_since = timezone.now() - timedelta(seconds=settings.EXPORT_RESULT_TTL)
+    for job in ExportJob.objects.filter(key=key).filter(
+        Q(status__in=['queued', 'running']) | Q(status='done', finished_at__gte=fresh_since)
+    ):
+        if job.status != 'done' or os.path.exists(job.result_path):
+            return job
+
+    try:
+        with transaction.atomic(using=tenant_db()):
+            job = ExportJob.objects.create(
+                kind=kind, params=params, key=key, created_by=user if user and user.is_authenticated else None,
+            )
+    except IntegrityError:
+        # Another request queued the same export since we looked; share its job
+        return submit(kind, params, user)
+    _executor().submit(run_job, job.pk, current_tenant())
+    return job
+
+
+def _executor():
+    global _pool, _pool_pid
+    with _lock:
+        # Pools don't survive a fork, so each gunicorn worker starts its own
+        if _pool_pid != os.getpid():
+            _pool = ThreadPoolExecutor(max_workers=settings.EXPORT_JOB_WORKERS, thread_name_prefix='export')
+            _pool_pid = os.getpid()
+        return _pool
+
+
+class Progress:
+    """Handed to export functions: set `total` once, then call advance() per row."""
+    SAVE_EVERY = 0.5  # seconds
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.done = 0
+        self._saved_at = time.monotonic()
+
+    def total(self, rows):
+        ExportJob.objects.filter(pk=self.job_id).update(total_rows=rows, updated_at=timezone.now())
+
+    def advance(self, rows=1):
+        self.done += rows
+        if time.monotonic() - self._saved_at >= self.SAVE_EVERY:
+            self.save()
+
+    def save(self):
+        ExportJob.objects.filter(pk=self.job_id).update(done_rows=self.done, updated_at=timezone.now())
+        self._saved_at = time.monotonic()
+
+
+def run_job(job_id, tenant=None):
+    with use_tenant(tenant):
+        try:
+            _run(job_id)
+        except Exception:
+            logger.exception("Export job %s crashed", job_id)
+        finally:
+            close_old_connections()
+
+
+def _run(job_id):
+    claimed = ExportJob.objects.filter(pk=job_id, status='queued').update(
+        status='running', started_at=timezone.now(), updated_at=timezone.now(),
+    )
+    if not claimed:
+        return
+    job = ExportJob.objects.get(pk=job_id)
+    fn, suffix, binary = EXPORTS[job.kind]
+
+    os.makedirs(settings.EXPORT_DIR, exist_ok=True)
+    # Job ids restart in every school's database; the school keeps file names apart
+    path = os.path.join(
+        settings.EXPORT_DIR, f"{current_tenant() or 'default'}-{job.kind}-{job.pk}-{job.key[:12]}{suffix}",
+    )
+    partial = f"{path}.part"
+    progress = Progress(job.pk)
+    try:
+        with open(partial, 'wb') if binary else open(partial, 'w', newline='', encoding='utf-8') as out:
+            fn(job.params, out, progress)
+        os.replace(partial, path)
+    except Exception as exc:
+        logger.exception("Export job %s (%s) failed", job.pk, job.kind)
+        if os.path.exists(partial):
+            os.remove(partial)
+        ExportJob.objects.filter(pk=job.pk).update(
+            status='failed', error=str(exc)[:1000], finished_at=timezone.now(), updated_at=timezone.now(),
+        )
+        return
+    ExportJob.objects.filter(pk=job.pk).update(
+        status='done', result_path=path, done_rows=progress.done,
+        finished_at=timezone.now(), updated_at=timezone.now(),
+    )
+
+
+def requeue_stalled(older_than):
+    """Put running jobs whose progress stopped `older_than` seconds ago (a dead worker) back in the queue."""
+    cutoff = timezone.now() - timedelta(seconds=older_than)
+    return ExportJob.objects.filter(status='running', updated_at__lt=cutoff).update(
+        status='queued', done_rows=0, updated_at=timezone.now(),
+    )
+
+
+def prune_jobs(days):
+    """Delete jobs, and their files, finished more than `days` ago."""
+    old = ExportJob.objects.filter(finished_at__lt=timezone.now() - timedelta(days=days))
+    for path in old.exclude(result_path='').values_list('result_path', flat=True):
+        if os.path.exists(path):
+            os.remove(path)
+    return old.delete()[0]
+
+
+# ----------------- Export kinds -----------------
+MOODS_CSV_HEADER = ['Student Name', 'Date', 'Mood', 'Comment', 'Timestamp']
+
+
+def moods_csv_row(entry):
+    user = entry.user
+    return [
+        (user.get_full_name() or user.username) if user else '',
+        entry.date,
+        entry.mood_slug,
+        entry.comment or '',
+        entry.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+    ]
+
+
+@export('moods_csv')
+def export_moods_csv(params, out, progress):
+    """The moods_csv download: `days` of entries up to `as_of`."""
+    end = date.fromisoformat(params['as_of'])
+    entries = MoodEntry.objects.filter(
+        date__gte=end - timedelta(days=params['days']), date__lte=end,
+    ).select_related('user')
+
+    writer = csv.writer(out)
+    writer.writerow(MOODS_CSV_HEADER)
+    with use_replica():
+        progress.total(entries.count())
+        for entry in entries.iterator(chunk_size=2000):
+            writer.writerow(moods_csv_row(entry))
+            progress.advance()
+
+
+@export('moods_parquet', suffix='.parquet', binary=True)
+def export_moods_parquet(params, out, progress):
+    """Columnar export for analysts; see dashboard/columnar.py."""
+    with use_replica():
+        write_parquet(
+            out,
+            start=date.fromisoformat(params['start']) if params.get('start') else None,
+            end=date.fromisoformat(params['end']) if params.get('end') else None,
+            comments=params.get('comments', True),
+            progress=progress,
+        )
+
+
+def id_ranges(ids):
+    """[1, 2, 3, 7, 8] -> [[1, 3], [7, 8]]: a selection of sorted ids, compact enough to store."""
+    ranges = []
+    for pk in ids:
+        if ranges and pk == ranges[-1][1] + 1:
+            ranges[-1][1] = pk
+        else:
+            ranges.append([pk, pk])
+    return ranges
+
+
+@export('moodentry_admin')
+def export_moodentries(params, out, progress):
+    """The admin's MoodEntry export (MoodEntryResource columns) for the selected ids."""
+    from .admin import MoodEntryResource
+
+    resource = MoodEntryResource()
+    writer = csv.writer(out)
+    progress.total(params['rows'])
+    header_written = False
+    with use_replica():
+        for first, last in params['ranges']:
+            for start in range(first, last + 1, 2000):
+                chunk = MoodEntry.objects.filter(id__range=(start, min(start + 1999, last))).order_by('id')
+                dataset = resource.export(queryset=chunk)
+                if not header_written:
+                    writer.writerow(dataset.headers)
+                    header_written = True
+                writer.writerows(dataset)
+                progress.advance(len(dataset))
@@ -0,0 +1,36 @@
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+
+
+@contextmanager
+def scratch_database(on_disk=False):
+    """
+    Run the body against a freshly migrated throwaway database. SQLite test
+    databases live in memory unless `on_disk` is set (needed when the
+    benchmark opens its own connections, e.g. to hold a lock).
+    """
+    old_name = connection.settings_dict['NAME']
+    test_settings = connection.settings_dict['TEST']
+    old_test_name = test_settings.get('NAME')
+    if on_disk and connection.vendor == 'sqlite':
+        test_settings['NAME'] = os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        test_settings['NAME'] = old_test_name
+
+
+def best_of(fn, repeat=5):
+    """Smallest wall-clock time of `repeat` calls to fn, in seconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
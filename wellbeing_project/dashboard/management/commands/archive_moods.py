@@ -0,0 +1,46 @@
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard.archive import archive_before, restore_range
+
+
+class Command(BaseCommand):
+    help = "Archive mood entries past the retention horizon into per-term gzip files, or restore a date range"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.MOOD_RETENTION_DAYS,
+            help="Archive entries older than this many days (default: MOOD_RETENTION_DAYS)",
+        )
+        parser.add_argument('--archive-dir', default=settings.MOOD_ARCHIVE_DIR)
+        parser.add_argument('--dry-run', action='store_true', help="Report what would be archived")
+        parser.add_argument(
+            '--restore', nargs=2, metavar=('START', 'END'),
+            help="Re-hydrate archived entries dated START..END (YYYY-MM-DD, inclusive)",
+        )
+
+    def handle(self, *args, **options):
+        archive_dir = options['archive_dir']
+
+        if options['restore']:
+            try:
+                start, end = (date.fromisoformat(d) for d in options['restore'])
+            except ValueError:
+                raise CommandError("--restore dates must be YYYY-MM-DD")
+            restored = restore_range(start, end, archive_dir)
+            self.stdout.write(self.style.SUCCESS(f"Restored {restored} entries from {start} to {end}"))
+            return
+
+        if options['days'] < 1:
+            raise CommandError("--days must be at least 1")
+        cutoff = date.today() - timedelta(days=options['days'])
+        summary = archive_before(cutoff, archive_dir, dry_run=options['dry_run'])
+
+        verb = "Would archive" if options['dry_run'] else "Archived"
+        for term, count in sorted(summary.items()):
+            self.stdout.write(f"  {term}: {count}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {sum(summary.values())} entries dated before {cutoff}"
+        ))
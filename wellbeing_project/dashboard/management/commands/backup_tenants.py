@@ -0,0 +1,36 @@
+import os
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard.replica import backup_database
+from dashboard.tenants import tenant_alias
+
+
+class Command(BaseCommand):
+    help = "Copy the default and each school's SQLite file with the online backup API (safe while serving)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--out', default=os.path.join(settings.BASE_DIR, 'backups'))
+        parser.add_argument('--tenant', action='append', help="Only back up this school (repeatable)")
+
+    def handle(self, *args, **options):
+        slugs = options['tenant'] or settings.SCHOOL_TENANTS
+        unknown = set(slugs) - set(settings.SCHOOL_TENANTS)
+        if unknown:
+            raise CommandError(f"Unknown schools: {', '.join(sorted(unknown))}")
+        aliases = [tenant_alias(slug) for slug in slugs]
+        if not options['tenant']:
+            aliases.insert(0, 'default')
+
+        out_dir = os.path.join(options['out'], datetime.now().strftime('%Y%m%d-%H%M%S'))
+        os.makedirs(out_dir, exist_ok=True)
+        for alias in aliases:
+            db = settings.DATABASES[alias]
+            if db['ENGINE'] != 'django.db.backends.sqlite3':
+                raise CommandError(f"{alias} is not SQLite; use that server's own backup tools")
+            target = os.path.join(out_dir, f"{alias}.sqlite3")
+            backup_database(db['NAME'], target)
+            self.stdout.write(f"  {alias} -> {target} ({os.path.getsize(target) // 1024} KB)")
+        self.stdout.write(self.style.SUCCESS(f"Backed up {len(aliases)} databases to {out_dir}"))
@@ -0,0 +1,82 @@
+import os
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.base import SessionBase
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory, override_settings
+
+from dashboard import checkin_queue
+from dashboard.management.benchmark import scratch_database
+from dashboard.models import MoodEntry, UserProfile
+from dashboard.views import student_checkin
+
+
+def hold_write_lock(path, seconds, started):
+    # Another writer (an import, a long admin action) mid-transaction
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute('BEGIN IMMEDIATE')
+    started.set()
+    time.sleep(seconds)
+    conn.execute('COMMIT')
+    conn.close()
+
+
+class Command(BaseCommand):
+    help = "Check-in acceptance latency, direct vs spooled, while another writer holds the database"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=200)
+        parser.add_argument('--lock-seconds', type=float, default=2.0)
+
+    def handle(self, *args, **options):
+        n = options['students']
+        with scratch_database(on_disk=True), tempfile.TemporaryDirectory() as spool_dir:
+            users = User.objects.bulk_create(User(username=f"student{i}") for i in range(n))
+            UserProfile.objects.bulk_create(UserProfile(user=u, user_type='student') for u in users)
+            db_path = connection.settings_dict['NAME']
+            factory = RequestFactory()
+
+            for label, queued in (('direct', False), ('spooled', True)):
+                MoodEntry.objects.all().delete()
+                spool = os.path.join(spool_dir, f"{label}.sqlite3")
+                with override_settings(CHECKIN_QUEUE_ENABLED=queued, CHECKIN_SPOOL_PATH=spool):
+                    latencies, errors = [], 0
+                    started = threading.Event()
+                    locker = threading.Thread(
+                        target=hold_write_lock, args=(db_path, options['lock_seconds'], started)
+                    )
+                    locker.start()
+                    started.wait()
+                    begin = time.perf_counter()
+                    for i, user in enumerate(users):
+                        request = factory.post('/student/checkin/', {
+                            'mood': 'calm', 'comment': 'ok', 'checkin_key': f"k{i}",
+                        })
+                        request.user, request.session = user, SessionBase()
+                        t0 = time.perf_counter()
+                        try:
+                            student_checkin(request)
+                        except Exception:
+                            errors += 1
+                        latencies.append(time.perf_counter() - t0)
+                    accepted = time.perf_counter() - begin
+                    locker.join()
+                    if queued:
+                        while checkin_queue.pending_count():
+                            time.sleep(0.01)
+                    stored = time.perf_counter() - begin
+
+                    latencies.sort()
+                    self.stdout.write(
+                        f"  {label:<8} p50 {statistics.median(latencies) * 1000:7.2f} ms"
+                        f"   p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:8.2f} ms"
+                        f"   max {latencies[-1] * 1000:8.1f} ms   errors {errors}"
+                        f"   all accepted {accepted:5.2f}s   all stored {stored:5.2f}s"
+                        f"   rows {MoodEntry.objects.count()}"
+                    )
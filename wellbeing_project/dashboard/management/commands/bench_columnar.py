@@ -0,0 +1,96 @@
+import csv
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard.columnar import parquet_available, write_parquet
+from dashboard.jobs import MOODS_CSV_HEADER, moods_csv_row
+from dashboard.management.benchmark import best_of, scratch_database
+from dashboard.models import MoodEntry, UserProfile
+
+try:
+    import pandas
+except ImportError:
+    pandas = None
+
+COMMENTS = ['', '', '', 'tired today', 'good day with friends', 'worried about the test', 'fine']
+
+
+class Command(BaseCommand):
+    help = "Size, write time and load time of the moods export as CSV vs Parquet"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--entries', type=int, default=200_000)
+        parser.add_argument('--students', type=int, default=500)
+
+    def handle(self, *args, **options):
+        if not parquet_available():
+            raise CommandError("Needs pyarrow: pip install pyarrow")
+        with scratch_database(), tempfile.TemporaryDirectory() as tmp:
+            self._populate(options['entries'], options['students'])
+            csv_path = os.path.join(tmp, 'moods.csv')
+            parquet_path = os.path.join(tmp, 'moods.parquet')
+
+            t0 = time.perf_counter()
+            with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(MOODS_CSV_HEADER)
+                for entry in MoodEntry.objects.select_related('user').iterator(chunk_size=2000):
+                    writer.writerow(moods_csv_row(entry))
+            csv_write = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            write_parquet(parquet_path)
+            parquet_write = time.perf_counter() - t0
+
+            if pandas is not None:
+                csv_load = best_of(lambda: pandas.read_csv(csv_path, parse_dates=['Date', 'Timestamp']), 3)
+                parquet_load = best_of(lambda: pandas.read_parquet(parquet_path), 3)
+                loader = 'pandas'
+            else:
+                import pyarrow.csv
+                import pyarrow.parquet
+                csv_load = best_of(lambda: pyarrow.csv.read_csv(csv_path), 3)
+                parquet_load = best_of(lambda: pyarrow.parquet.read_table(parquet_path), 3)
+                loader = 'pyarrow'
+
+            csv_size, parquet_size = os.path.getsize(csv_path), os.path.getsize(parquet_path)
+            self.stdout.write(f"  {options['entries']} entries, loaded with {loader}")
+            self.stdout.write(f"  {'':8} {'size':>10} {'write':>9} {'load':>9}")
+            self.stdout.write(f"  {'csv':8} {csv_size / 1e6:8.1f}MB {csv_write:8.2f}s {csv_load:8.3f}s")
+            self.stdout.write(f"  {'parquet':8} {parquet_size / 1e6:8.1f}MB {parquet_write:8.2f}s {parquet_load:8.3f}s")
+            self.stdout.write(
+                f"  parquet is {parquet_size / csv_size:.0%} of the CSV size and loads {csv_load / parquet_load:.1f}x faster"
+            )
+
+    def _populate(self, entries, students):
+        rng = random.Random(7)
+        users = User.objects.bulk_create(
+            User(username=f"student{i}", first_name='Student', last_name=str(i)) for i in range(students)
+        )
+        UserProfile.objects.bulk_create(
+            UserProfile(user=u, user_type='student', class_group=f"{7 + i % 5}{'ABC'[i % 3]}")
+            for i, u in enumerate(users)
+        )
+        start = date.today() - timedelta(days=entries // students)
+        moods = [rng.randint(1, 12) for _ in range(entries)]
+        # bulk_create skips save(), so valence has to be filled in here
+        created = MoodEntry.objects.bulk_create(
+            (
+                MoodEntry(
+                    user=users[i % students], mood=mood, valence=MoodEntry.MOOD_VALENCE[mood],
+                    comment=rng.choice(COMMENTS),
+                )
+                for i, mood in enumerate(moods)
+            ),
+            batch_size=5000,
+        )
+        # bulk_create stamps today; spread them over the range
+        for i, e in enumerate(created):
+            e.date = start + timedelta(days=i // students)
+        MoodEntry.objects.bulk_update(created, ['date'], batch_size=5000)
@@ -0,0 +1,53 @@
+import os
+
+from django.contrib.auth.hashers import (
+    Argon2PasswordHasher, PBKDF2PasswordHasher, ScryptPasswordHasher,
+)
+from django.core.management.base import BaseCommand
+
+from dashboard.hashers import SheetsSHA256PasswordHasher
+from dashboard.management.benchmark import best_of
+
+
+def variant(base, **attrs):
+    name = base.__name__ + ''.join(f"_{k}{v}" for k, v in attrs.items())
+    return type(name, (base,), attrs)()
+
+
+CANDIDATES = [
+    ('sheets sha256 (legacy)', lambda: SheetsSHA256PasswordHasher()),
+    ('pbkdf2 260k', lambda: variant(PBKDF2PasswordHasher, iterations=260_000)),
+    ('pbkdf2 600k', lambda: variant(PBKDF2PasswordHasher, iterations=600_000)),
+    ('pbkdf2 1M (default)', lambda: variant(PBKDF2PasswordHasher, iterations=1_000_000)),
+    ('scrypt n=2^14 (default)', lambda: variant(ScryptPasswordHasher, work_factor=2 ** 14)),
+    ('scrypt n=2^15', lambda: variant(ScryptPasswordHasher, work_factor=2 ** 15, maxmem=2 ** 27)),
+    ('scrypt n=2^16', lambda: variant(ScryptPasswordHasher, work_factor=2 ** 16, maxmem=2 ** 28)),
+    ('argon2 t=1', lambda: variant(Argon2PasswordHasher, time_cost=1)),
+    ('argon2 t=2 (default)', lambda: variant(Argon2PasswordHasher, time_cost=2)),
+    ('argon2 t=4', lambda: variant(Argon2PasswordHasher, time_cost=4)),
+]
+
+
+class Command(BaseCommand):
+    help = "Time password hashers at several work factors on this machine"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help="CPU cores serving logins, for the capacity estimate",
+        )
+
+    def handle(self, *args, **options):
+        repeat, workers = options['repeat'], options['workers']
+        self.stdout.write(f"{'hasher':<26}{'ms/hash':>10}{'logins/s/core':>16}{f'logins/s x{workers}':>16}")
+        for label, make in CANDIDATES:
+            hasher = make()
+            try:
+                salt = hasher.salt()
+                seconds = best_of(lambda: hasher.encode('correct horse battery', salt), repeat)
+            except (ImportError, ValueError) as exc:
+                self.stdout.write(f"{label:<26}  skipped ({exc})")
+                continue
+            per_core = 1 / seconds
+            self.stdout.write(f"{label:<26}{seconds * 1000:>10.1f}{per_core:>16.1f}{per_core * workers:>16.0f}")
@@ -0,0 +1,73 @@
+import random
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from dashboard.heatmap import mood_heatmap
+from dashboard.management.benchmark import best_of, scratch_database
+from dashboard.models import MoodEntry, UserProfile
+
+CLASSES = ['7A', '7B', '8A', '8B', '9A', '9B', '10A', '10B']
+
+
+def per_view_heatmap(start, end):
+    # The dashboard's pattern, once per class per day
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    return {
+        (class_group, day): dict(
+            MoodEntry.objects.filter(date=day, user__userprofile__class_group=class_group)
+            .values_list('mood').annotate(count=Count('mood'))
+        )
+        for class_group in CLASSES
+        for day in days
+    }
+
+
+class Command(BaseCommand):
+    help = "Class x day heatmap over a term: per-view queries vs one conditional aggregation vs cached days"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=400)
+        parser.add_argument('--days', type=int, default=90)
+
+    def handle(self, *args, **options):
+        rng = random.Random(3)
+        today = date.today()
+        start = today - timedelta(days=options['days'] - 1)
+        with scratch_database(), override_settings(CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'reports': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'bench-heatmap'},
+        }):
+            users = User.objects.bulk_create(User(username=f"s{i}") for i in range(options['students']))
+            UserProfile.objects.bulk_create(
+                UserProfile(user=u, user_type='student', class_group=CLASSES[i % len(CLASSES)])
+                for i, u in enumerate(users)
+            )
+            entries = MoodEntry.objects.bulk_create(
+                MoodEntry(user=u, mood=rng.randint(1, 12))
+                for _ in range(options['days']) for u in users if rng.random() < 0.8
+            )
+            # bulk_create stamps today; spread them over the range
+            for i, e in enumerate(entries):
+                e.date = start + timedelta(days=i * options['days'] // len(entries))
+            MoodEntry.objects.bulk_update(entries, ['date'], batch_size=5000)
+            self.stdout.write(f"  {len(entries)} entries, {len(CLASSES)} classes, {options['days']} days")
+
+            def cold():
+                caches['reports'].clear()
+                mood_heatmap(start, today, today=today)
+
+            for label, fn in (
+                ('per-view queries', lambda: per_view_heatmap(start, today)),
+                ('one query', cold),
+                ('cached past days', lambda: mood_heatmap(start, today, today=today)),
+            ):
+                fn()
+                with CaptureQueriesContext(connection) as queries:
+                    fn()
+                self.stdout.write(f"  {label:<18} {best_of(fn, 3) * 1000:8.1f} ms   {len(queries):4} queries")
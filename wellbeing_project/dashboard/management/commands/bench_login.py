@@ -0,0 +1,70 @@
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from dashboard.management.benchmark import best_of, scratch_database
+from dashboard.models import UserProfile
+
+
+def legacy_login(request, email, password, user_type):
+    # The pre-EmailBackend login_view: three lookups
+    user_obj = User.objects.get(email=email)
+    user = authenticate(request, username=user_obj.username, password=password)
+    profile = UserProfile.objects.get(user=user)
+    return user if profile.user_type == user_type else None
+
+
+def email_login(request, email, password, user_type):
+    return authenticate(request, email=email, password=password, user_type=user_type)
+
+
+class Command(BaseCommand):
+    help = "Compare queries and throughput of the old and email-backend login paths"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=5000)
+        parser.add_argument('--logins', type=int, default=500, help="Logins per timed run")
+        parser.add_argument(
+            '--real-hasher', action='store_true',
+            help="Keep the configured password hasher (otherwise MD5, to isolate DB cost)",
+        )
+
+    def handle(self, *args, **options):
+        if options['real_hasher']:
+            self._run(options)
+        else:
+            with override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher']):
+                self._run(options)
+
+    def _run(self, options):
+        n_users, n_logins = options['users'], options['logins']
+        with scratch_database():
+            password = make_password('morning-rush')
+            users = User.objects.bulk_create(
+                User(username=f"student{i}", email=f"student{i}@school.test", password=password)
+                for i in range(n_users)
+            )
+            UserProfile.objects.bulk_create(
+                UserProfile(user=u, user_type='student', class_group=f"Y{i % 12}") for i, u in enumerate(users)
+            )
+
+            request = RequestFactory().post('/')
+            emails = [f"student{(i * 7919) % n_users}@school.test" for i in range(n_logins)]
+
+            for label, login in (('legacy (3 lookups)', legacy_login), ('EmailBackend', email_login)):
+                with CaptureQueriesContext(connection) as ctx:
+                    assert login(request, emails[0], 'morning-rush', 'student') is not None
+                queries = len(ctx.captured_queries)
+
+                def burst():
+                    for email in emails:
+                        login(request, email, 'morning-rush', 'student')
+
+                seconds = best_of(burst, repeat=3)
+                self.stdout.write(
+                    f"  {label:<20} {queries} queries/login   {n_logins / seconds:8.0f} logins/s"
+                )
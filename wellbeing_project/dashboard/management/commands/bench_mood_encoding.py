@@ -0,0 +1,67 @@
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+
+from dashboard.models import MOODS
+
+
+class Command(BaseCommand):
+    help = "Compare table size and GROUP BY speed of string vs small-integer mood storage"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        rng = random.Random(42)
+        start = date(2024, 1, 1)
+        data = [
+            (rng.randrange(1, 5000), (start + timedelta(days=i % 365)).isoformat(), rng.choice(MOODS))
+            for i in range(rows)
+        ]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            results = {}
+            for label, mood_type, pick in (
+                ('varchar slug', 'varchar(20)', lambda m: m[1]),
+                ('smallint code', 'smallint unsigned', lambda m: m[0]),
+            ):
+                path = os.path.join(tmp, label.replace(' ', '_') + '.sqlite3')
+                conn = sqlite3.connect(path)
+                conn.execute(
+                    f"CREATE TABLE entry (id integer PRIMARY KEY, user_id integer, "
+                    f"date date NOT NULL, mood {mood_type} NOT NULL, valence smallint NOT NULL)"
+                )
+                conn.executemany(
+                    "INSERT INTO entry (user_id, date, mood, valence) VALUES (?, ?, ?, ?)",
+                    ((u, d, pick(m), m[4]) for u, d, m in data),
+                )
+                conn.execute("CREATE INDEX entry_date_mood ON entry (date, mood)")
+                conn.commit()
+                conn.execute("VACUUM")
+
+                timings = []
+                for _ in range(repeat):
+                    t0 = time.perf_counter()
+                    conn.execute("SELECT mood, COUNT(*) FROM entry GROUP BY mood").fetchall()
+                    conn.execute(
+                        "SELECT mood, COUNT(*) FROM entry WHERE date >= ? GROUP BY mood",
+                        ((start + timedelta(days=300)).isoformat(),),
+                    ).fetchall()
+                    timings.append(time.perf_counter() - t0)
+                conn.close()
+                results[label] = (os.path.getsize(path), min(timings))
+
+            self.stdout.write(f"{rows:,} rows, best of {repeat}")
+            for label, (size, seconds) in results.items():
+                self.stdout.write(f"  {label:<14} {size / 1024 / 1024:8.1f} MiB   {seconds * 1000:8.1f} ms aggregate")
+            (old_size, old_time), (new_size, new_time) = results.values()
+            self.stdout.write(self.style.SUCCESS(
+                f"size -{(1 - new_size / old_size) * 100:.0f}%, aggregate {old_time / new_time:.2f}x faster"
+            ))
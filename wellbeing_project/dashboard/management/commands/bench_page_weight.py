@@ -0,0 +1,69 @@
+import gzip
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.staticfiles import finders
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+
+from dashboard.management.benchmark import scratch_database
+from dashboard.models import MoodEntry, UserProfile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+PAGES = [
+    ('login', None, '/'),
+    ('student check-in', 'student', '/student/checkin/'),
+    ('student history', 'student', '/student/history/'),
+    ('teacher dashboard', 'teacher', '/teacher/dashboard/'),
+    ('teacher results', 'teacher', '/teacher/results/'),
+    ('teacher students', 'teacher', '/teacher/students/'),
+]
+
+
+def gz(data):
+    return len(gzip.compress(data, 9))
+
+
+class Command(BaseCommand):
+    help = "Compare transferred bytes per page view: inline styles vs the cached CSS bundle"
+
+    @override_settings(ALLOWED_HOSTS=['testserver'])
+    def handle(self, *args, **options):
+        css = open(finders.find('css/wellcheck.css'), 'rb').read()
+        css_wire = len(brotli.compress(css)) if brotli else gz(css)
+        encoding = 'br' if brotli else 'gzip'
+        self.stdout.write(
+            f"css/wellcheck.css: {len(css):,} B raw, {gz(css):,} B gzip"
+            + (f", {css_wire:,} B brotli" if brotli else "")
+        )
+
+        with scratch_database():
+            clients = {None: Client()}
+            for role in ('student', 'teacher'):
+                user = User.objects.create_user(role, f"{role}@school.test", 'pw')
+                UserProfile.objects.create(user=user, user_type=role, class_group='7A')
+                clients[role] = Client()
+                clients[role].force_login(user)
+            MoodEntry.objects.create(user=User.objects.get(username='student'), mood=1, comment='ok')
+
+            header = f"{'page':<20}{'before':>10}{'first view':>13}{'repeat view':>13}"
+            self.stdout.write(
+                "Bytes per view. Before: uncompressed HTML with the stylesheet inline. "
+                f"After: gzip HTML, CSS bundle as {encoding} once, then from cache."
+            )
+            self.stdout.write(header)
+            for label, role, url in PAGES:
+                html = clients[role].get(url).content
+                # Before: every response carried the whole stylesheet inline,
+                # uncompressed (per-element style attributes not counted)
+                before = len(html) + len(css)
+                first = gz(html) + css_wire
+                repeat = gz(html)
+                self.stdout.write(f"{label:<20}{before:>10,}{first:>13,}{repeat:>13,}")
+
+        if settings.DEBUG:
+            self.stdout.write("Note: DEBUG is on, so {% static %} URLs are not fingerprinted here.")
@@ -0,0 +1,77 @@
+import os
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from dashboard.management.benchmark import scratch_database
+from dashboard.models import MoodEntry
+from dashboard.replica import backup_database
+
+
+def slow_export(path, stop, row_pause):
+    # moods_csv streaming a large table: the read lock is held until the cursor is exhausted
+    conn = sqlite3.connect(path)
+    while not stop.is_set():
+        for i, _ in enumerate(conn.execute('SELECT * FROM dashboard_moodentry')):
+            if stop.is_set():
+                break
+            if i % 1000 == 0:
+                time.sleep(row_pause)
+    conn.close()
+
+
+class Command(BaseCommand):
+    help = "Check-in write latency while a long export reads the primary vs a replica"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--entries', type=int, default=50000)
+        parser.add_argument('--writes', type=int, default=100)
+
+    def handle(self, *args, **options):
+        with scratch_database(on_disk=True), tempfile.TemporaryDirectory() as tmp:
+            user = User.objects.create(username='bench')
+            MoodEntry.objects.bulk_create(
+                [MoodEntry(user=user, mood=1 + i % 12, comment='fine') for i in range(options['entries'])],
+                batch_size=2000,
+            )
+            primary = connection.settings_dict['NAME']
+            replica = os.path.join(tmp, 'replica.sqlite3')
+            t0 = time.perf_counter()
+            backup_database(primary, replica)
+            self.stdout.write(f"  replica taken in {time.perf_counter() - t0:.2f}s")
+
+            for label, read_path in (('export on primary', primary), ('export on replica', replica)):
+                stop = threading.Event()
+                reader = threading.Thread(target=slow_export, args=(read_path, stop, 0.005))
+                reader.start()
+                time.sleep(0.05)
+
+                writer = sqlite3.connect(primary, timeout=5, isolation_level=None)
+                latencies, errors = [], 0
+                for i in range(options['writes']):
+                    t0 = time.perf_counter()
+                    try:
+                        writer.execute(
+                            "UPDATE dashboard_moodentry SET comment = ? WHERE id = ?", [f"edit {i}", i + 1]
+                        )
+                    except sqlite3.OperationalError:
+                        errors += 1
+                    latencies.append(time.perf_counter() - t0)
+                    # Check-ins arrive spread out, not back to back
+                    time.sleep(0.02)
+                writer.close()
+                stop.set()
+                reader.join()
+
+                latencies.sort()
+                self.stdout.write(
+                    f"  {label:<18} p50 {statistics.median(latencies) * 1000:8.2f} ms"
+                    f"   p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:8.2f} ms"
+                    f"   max {latencies[-1] * 1000:8.2f} ms   errors {errors}"
+                )
@@ -0,0 +1,138 @@
+import http.client
+import importlib.util
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+WORKER_CLASSES = {
+    'sync': ('wellbeing_project.wsgi', ['--worker-class', 'sync']),
+    'gthread': ('wellbeing_project.wsgi', ['--worker-class', 'gthread']),
+    'uvicorn': ('wellbeing_project.asgi:application', ['--worker-class', 'uvicorn.workers.UvicornWorker']),
+}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_until_up(server, port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise CommandError(f"Server exited with status {server.returncode}")
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise CommandError(f"Server on port {port} did not come up")
+
+
+def load(port, path, clients, seconds):
+    """Hammer `path` from `clients` threads; return per-request latencies and error count."""
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    stop_at = time.monotonic() + seconds
+
+    def connect():
+        return http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+
+    def client():
+        conn = connect()
+        mine, failed = [], 0
+        while time.monotonic() < stop_at:
+            start = time.perf_counter()
+            for attempt in range(2):
+                try:
+                    conn.request('GET', path)
+                    response = conn.getresponse()
+                    response.read()
+                    ok = response.status < 500
+                    if response.will_close:
+                        # sync workers do not keep connections alive
+                        conn.close()
+                        conn = connect()
+                    break
+                except (OSError, http.client.HTTPException):
+                    # A kept-alive connection may be closed under us (e.g.
+                    # max_requests recycling); retry once on a fresh one
+                    conn.close()
+                    conn = connect()
+                    ok = False
+            if ok:
+                mine.append(time.perf_counter() - start)
+            else:
+                failed += 1
+        with lock:
+            latencies.extend(mine)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, errors[0]
+
+
+class Command(BaseCommand):
+    help = "Compare gunicorn sync, gthread and uvicorn workers under gunicorn.conf.py"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/', help="URL to request (default: login page)")
+        parser.add_argument('--clients', type=int, default=32)
+        parser.add_argument('--seconds', type=int, default=10)
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument('--only', choices=WORKER_CLASSES, action='append')
+
+    def handle(self, *args, **options):
+        config = os.path.join(settings.BASE_DIR, 'gunicorn.conf.py')
+        header = f"{'worker':<10}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}"
+        self.stdout.write(f"{options['clients']} clients x {options['seconds']}s on {options['path']}")
+        self.stdout.write(header)
+
+        for name in options['only'] or WORKER_CLASSES:
+            app, worker_args = WORKER_CLASSES[name]
+            if name == 'uvicorn' and importlib.util.find_spec('uvicorn') is None:
+                self.stdout.write(f"{name:<10}  skipped (uvicorn not installed)")
+                continue
+
+            port = free_port()
+            server = subprocess.Popen(
+                [
+                    sys.executable, '-m', 'gunicorn', app, '-c', config,
+                    '--bind', f"127.0.0.1:{port}",
+                    '--workers', str(options['workers']),
+                    '--threads', str(options['threads']),
+                    '--access-logfile', os.devnull, '--log-level', 'warning',
+                    *worker_args,
+                ],
+                cwd=settings.BASE_DIR,
+            )
+            try:
+                wait_until_up(server, port)
+                load(port, options['path'], 4, 1)  # warm the workers
+                latencies, errors = load(port, options['path'], options['clients'], options['seconds'])
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+
+            if not latencies:
+                self.stdout.write(f"{name:<10}  no successful requests ({errors} errors)")
+                continue
+            latencies.sort()
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+            self.stdout.write(
+                f"{name:<10}{len(latencies) / options['seconds']:>10.0f}"
+                f"{statistics.median(latencies) * 1000:>10.1f}{p99 * 1000:>10.1f}{errors:>8}"
+            )
@@ -0,0 +1,73 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from dashboard.management.benchmark import scratch_database
+from dashboard.models import UserProfile
+
+ENGINES = ['db', 'cached_db', 'signed_cookies']
+WRITES = ('INSERT', 'UPDATE', 'DELETE')
+
+
+def session_queries(ctx):
+    queries = [q['sql'] for q in ctx.captured_queries if 'django_session' in q['sql']]
+    return len(queries), sum(q.lstrip().upper().startswith(WRITES) for q in queries)
+
+
+class Command(BaseCommand):
+    help = "Queries and django_session writes per login and per page for each SESSION_BACKEND"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=200)
+        parser.add_argument('--pages', type=int, default=5, help="Page views per student after login")
+
+    def handle(self, *args, **options):
+        n, pages = options['students'], options['pages']
+        overrides = {
+            'PASSWORD_HASHERS': ['django.contrib.auth.hashers.MD5PasswordHasher'],
+            'ALLOWED_HOSTS': ['testserver'],
+            # Keep the run self-contained: a private in-memory sessions cache
+            'CACHES': {**settings.CACHES, 'sessions': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'bench-sessions',
+            }},
+        }
+        with scratch_database(), override_settings(**overrides):
+            password = make_password('pw')
+            users = User.objects.bulk_create(
+                User(username=f"s{i}", email=f"s{i}@school.test", password=password) for i in range(n)
+            )
+            UserProfile.objects.bulk_create(UserProfile(user=u, user_type='student') for u in users)
+
+            self.stdout.write(
+                f"  {'backend':<15}{'queries/page':>13}{'session q/page':>16}"
+                f"{'session writes/login':>22}{'requests/s':>12}"
+            )
+            for engine in ENGINES:
+                caches['sessions'].clear()
+                with override_settings(SESSION_ENGINE=settings.SESSION_ENGINE.rsplit('.', 1)[0] + '.' + engine):
+                    login_writes = page_queries = page_session = 0
+                    started = time.perf_counter()
+                    for i in range(n):
+                        client = Client()
+                        connection.queries_log.clear()
+                        with CaptureQueriesContext(connection) as ctx:
+                            client.post('/', {'email': f"s{i}@school.test", 'password': 'pw', 'user_type': 'student'})
+                        login_writes += session_queries(ctx)[1]
+                        connection.queries_log.clear()
+                        with CaptureQueriesContext(connection) as ctx:
+                            for _ in range(pages):
+                                assert client.get('/student/history/').status_code == 200
+                        page_queries += len(ctx.captured_queries)
+                        page_session += session_queries(ctx)[0]
+                    elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f"  {engine:<15}{page_queries / (n * pages):>13.1f}{page_session / (n * pages):>16.1f}"
+                    f"{login_writes / n:>22.1f}{n * (pages + 1) / elapsed:>12.0f}"
+                )
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from dashboard.sheets_batch import read_scope
+from dashboard.sheets_client import SheetsClient, ThrottledSpreadsheet
+from dashboard.sheets_db import SheetsDB
+from dashboard.management.commands.bench_sheets_client import make_sheet
+
+
+def render_dashboard(db, usernames):
+    # What a Sheets-backed teacher dashboard needs for one page
+    db.get_todays_mood_summary()
+    db.get_all_users('student')
+    db.get_all_users('teacher')
+    for username in usernames:
+        db.get_mood_entries(username, days=7)
+
+
+class Command(BaseCommand):
+    help = "Sheets round trips and time per dashboard render, with and without the request read scope"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=500)
+        parser.add_argument('--latency', type=float, default=0.15, help="Simulated API round trip (s)")
+
+    def handle(self, *args, **options):
+        usernames = [f"student{i}" for i in range(5)]
+        with override_settings(SHEETS_QUOTA_PER_MINUTE=10_000, SHEETS_QUOTA_BURST=1_000):
+            for label, scoped in (('per-call reads', False), ('request scope', True)):
+                fake = make_sheet(options['students'], None, options['latency'], 0)
+                db = SheetsDB()
+                db.sheet = ThrottledSpreadsheet(SheetsClient(), fake)
+                started = time.perf_counter()
+                if scoped:
+                    with read_scope('Users', 'MoodEntries'):
+                        render_dashboard(db, usernames)
+                else:
+                    render_dashboard(db, usernames)
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f"  {label:<15} {sum(fake.calls.values()):3} round trips   {elapsed * 1000:8.1f} ms"
+                )
@@ -0,0 +1,85 @@
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from dashboard import sheets_client
+from dashboard.sheets_client import SheetsClient, SheetsUnavailable, ThrottledSpreadsheet
+from dashboard.sheets_fake import FakeSpreadsheet
+
+
+def make_sheet(students, quota, latency, failure_rate):
+    fake = FakeSpreadsheet(quota_per_minute=quota, latency=latency, failure_rate=failure_rate)
+    fake.worksheet('Users').rows.extend(
+        [f"student{i}", f"student{i}@school.test", 'x', 'student', ''] for i in range(students)
+    )
+    fake.worksheet('MoodEntries').rows.extend(
+        [f"student{i}", '2026-01-05', 'calm', '', '2026-01-05 08:00:00'] for i in range(students)
+    )
+    return fake
+
+
+def workload(sheet, i, students):
+    # Mostly dashboard renders (the same whole-sheet read), some login lookups
+    if i % 4:
+        return sheet.worksheet('MoodEntries').get_all_records()
+    users = sheet.worksheet('Users')
+    cell = users.find(f"student{random.randrange(students)}@school.test")
+    return users.row_values(cell.row)
+
+
+class Command(BaseCommand):
+    help = "Hammer a fake Sheets API (quota, latency, 5xx) directly and through SheetsClient"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=400)
+        parser.add_argument('--threads', type=int, default=20)
+        parser.add_argument('--quota', type=int, default=300, help="Fake API requests per minute")
+        parser.add_argument('--latency', type=float, default=0.05)
+        parser.add_argument('--failure-rate', type=float, default=0.05)
+        parser.add_argument('--students', type=int, default=500)
+
+    def handle(self, *args, **options):
+        random.seed(7)
+        for label in ('direct gspread', 'SheetsClient'):
+            fake = make_sheet(options['students'], options['quota'], options['latency'], options['failure_rate'])
+            if label == 'SheetsClient':
+                sheets_client.metrics.reset()
+                sheet = ThrottledSpreadsheet(
+                    SheetsClient(rate=options['quota'], burst=options['quota'] // 6, budget_wait=1.0), fake,
+                )
+            else:
+                sheet = fake
+
+            outcomes = {'ok': 0, 'degraded': 0, 'failed': 0}
+            latencies = []
+
+            def run(i):
+                started = time.perf_counter()
+                try:
+                    workload(sheet, i, options['students'])
+                    outcome = 'ok'
+                except SheetsUnavailable:
+                    outcome = 'degraded'
+                except Exception:
+                    outcome = 'failed'
+                return outcome, time.perf_counter() - started
+
+            with ThreadPoolExecutor(options['threads']) as pool:
+                for outcome, seconds in pool.map(run, range(options['requests'])):
+                    outcomes[outcome] += 1
+                    latencies.append(seconds)
+
+            latencies.sort()
+            self.stdout.write(
+                f"  {label:<15} ok {outcomes['ok']:4}   degraded {outcomes['degraded']:4}   "
+                f"errors {outcomes['failed']:4}   api requests {sum(fake.calls.values()):4}   "
+                f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:7.1f} ms"
+            )
+            if label == 'SheetsClient':
+                totals = {}
+                for counts in sheets_client.metrics.snapshot().values():
+                    for field in sheets_client.SheetsMetrics.FIELDS:
+                        totals[field] = totals.get(field, 0) + counts[field]
+                self.stdout.write("  " + "   ".join(f"{k} {v}" for k, v in totals.items()))
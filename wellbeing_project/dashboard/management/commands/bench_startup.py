@@ -0,0 +1,64 @@
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# What a gunicorn worker does at boot
+BOOT = "import wellbeing_project.wsgi"
+
+# What every process imported up front before the Sheets integration was
+# made lazy
+EAGER_GOOGLE = "import google.oauth2.service_account, gspread, oauth2client.service_account"
+
+
+def import_profile(code):
+    """Run `code` under -X importtime; return (wall seconds, {top-level package: self us})."""
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+    )
+    wall = time.perf_counter() - start
+
+    packages = defaultdict(int)
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if not parts[0].strip().isdigit():
+            continue  # header
+        # Self time, summed per top-level package, so nested imports count too
+        packages[parts[2].strip().split('.')[0]] += int(parts[0])
+    return wall, packages
+
+
+class Command(BaseCommand):
+    help = "Measure worker boot import cost per package with python -X importtime"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--top', type=int, default=12)
+
+    def handle(self, *args, **options):
+        scenarios = [
+            ('boot, Sheets libs imported eagerly (previous)', f"{EAGER_GOOGLE}; {BOOT}"),
+            ('boot, Sheets libs lazy (current)', BOOT),
+        ]
+        walls = {}
+        for label, code in scenarios:
+            runs = [import_profile(code) for _ in range(options['repeat'])]
+            wall, packages = min(runs, key=lambda run: run[0])
+            walls[label] = wall
+
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{label}: {wall * 1000:.0f} ms wall"))
+            ranked = sorted(packages.items(), key=lambda item: item[1], reverse=True)
+            for package, us in ranked[:options['top']]:
+                self.stdout.write(f"  {package:<28}{us / 1000:>9.1f} ms")
+
+        before, after = walls.values()
+        self.stdout.write(self.style.SUCCESS(
+            f"Boot is {(before - after) * 1000:.0f} ms ({(1 - after / before) * 100:.0f}%) faster per process"
+        ))
@@ -0,0 +1,45 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard.models import ReportSnapshot
+from dashboard.reports import closed_periods, first_recorded_day, build_snapshot
+
+
+class Command(BaseCommand):
+    help = "Snapshot weekly and term mood summaries for periods that have ended (run nightly from cron)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--period', choices=['week', 'term', 'all'], default='all',
+            help="Which kind of period to snapshot (default: both)",
+        )
+        parser.add_argument(
+            '--since', help="Only periods ending on or after this date (YYYY-MM-DD); default: first recorded day",
+        )
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help="Recompute periods that already have snapshots, e.g. after restoring archived entries",
+        )
+
+    def handle(self, *args, **options):
+        since = first_recorded_day()
+        if options['since']:
+            try:
+                since = date.fromisoformat(options['since'])
+            except ValueError:
+                raise CommandError("--since must be YYYY-MM-DD")
+        if since is None:
+            self.stdout.write("No mood data yet; nothing to snapshot.")
+            return
+
+        periods = [p for p, _ in ReportSnapshot.PERIOD_CHOICES] if options['period'] == 'all' else [options['period']]
+        for period in periods:
+            built = rows = 0
+            for start, end in closed_periods(period, since):
+                written = build_snapshot(period, start, end, rebuild=options['rebuild'])
+                if written:
+                    built += 1
+                    rows += written
+                    self.stdout.write(f"  {period} {start}..{end}: {written} rows")
+            self.stdout.write(self.style.SUCCESS(f"{period}: {built} new snapshots ({rows} rows)"))
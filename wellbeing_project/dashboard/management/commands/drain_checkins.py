@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from dashboard.checkin_queue import drain, pending_count
+
+
+class Command(BaseCommand):
+    help = "Apply spooled check-ins to the database (leftovers after a restart, or from cron)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+
+    def handle(self, *args, **options):
+        applied = drain(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Applied {applied} check-ins; {pending_count()} still spooled"))
@@ -0,0 +1,37 @@
+import os
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard.columnar import ROW_GROUP_SIZE, parquet_available, write_parquet
+
+
+def _date(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"Not a YYYY-MM-DD date: {value}")
+
+
+class Command(BaseCommand):
+    help = "Write MoodEntry history to a Parquet file for analysis (dictionary-encoded moods, row groups)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('out', help="Path of the .parquet file to write")
+        parser.add_argument('--start', type=_date, help="First date to include (YYYY-MM-DD)")
+        parser.add_argument('--end', type=_date, help="Last date to include (YYYY-MM-DD)")
+        parser.add_argument('--no-comments', action='store_true', help="Leave the free-text comments out")
+        parser.add_argument('--row-group-size', type=int, default=ROW_GROUP_SIZE)
+
+    def handle(self, *args, **options):
+        if not parquet_available():
+            raise CommandError("Parquet export needs pyarrow: pip install pyarrow")
+        rows = write_parquet(
+            options['out'],
+            start=options['start'],
+            end=options['end'],
+            comments=not options['no_comments'],
+            row_group_size=options['row_group_size'],
+        )
+        size = os.path.getsize(options['out'])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {rows} entries to {options['out']} ({size / 1024:.0f} KB)"))
@@ -0,0 +1,83 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from dashboard.models import MoodEntry
+from dashboard.risk import comment_risk, matcher, risk_labels
+from dashboard.tenants import tenant_db
+
+
+def _init_worker():
+    # Needed when workers are spawned rather than forked (macOS, Windows)
+    import django
+    django.setup()
+
+
+def _batches(size):
+    # A page at a time by id rather than .iterator(), so no SQLite read
+    # cursor on the table is still open while bulk_update writes to it
+    last_id = 0
+    while True:
+        batch = list(
+            MoodEntry.objects.filter(id__gt=last_id).order_by('id')
+            .values_list('id', 'risk_flags', 'comment')[:size]
+        )
+        if not batch:
+            return
+        last_id = batch[-1][0]
+        yield batch
+
+
+def _classify(batch):
+    pattern = matcher()
+    return [(pk, old, comment_risk(comment, pattern)) for pk, old, comment in batch]
+
+
+class Command(BaseCommand):
+    help = "Re-check stored comments against COMMENT_RISK_KEYWORDS and update their risk flags"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--dry-run', action='store_true', help="Count the changes without saving them")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        batches = _batches(options['batch_size'])
+
+        checked = changed = 0
+        newly_flagged = {}
+        for results in self._classify_all(batches, options['workers']):
+            checked += len(results)
+            updates = [MoodEntry(id=pk, risk_flags=new) for pk, old, new in results if new != old]
+            for pk, old, new in results:
+                for label in risk_labels(new & ~old):
+                    newly_flagged[label] = newly_flagged.get(label, 0) + 1
+            changed += len(updates)
+            if updates and not options['dry_run']:
+                # bulk_update leaves updated_at alone, so the Sheets sync doesn't see these
+                with transaction.atomic(using=tenant_db()):
+                    MoodEntry.objects.bulk_update(updates, ['risk_flags'], batch_size=1000)
+
+        for label, count in sorted(newly_flagged.items()):
+            self.stdout.write(f"  {label}: {count} newly flagged")
+        verb = "would change" if options['dry_run'] else "changed"
+        self.stdout.write(self.style.SUCCESS(
+            f"Checked {checked} comments, {verb} {changed} in {time.perf_counter() - started:.1f}s"
+        ))
+
+    def _classify_all(self, batches, workers):
+        if workers <= 1:
+            yield from map(_classify, batches)
+            return
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            # A few batches in flight at a time, so memory doesn't grow with the table
+            pending = [pool.submit(_classify, b) for b in islice(batches, workers * 2)]
+            while pending:
+                results = pending.pop(0).result()
+                pending.extend(pool.submit(_classify, b) for b in islice(batches, 1))
+                yield results
@@ -0,0 +1,42 @@
+import os
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from dashboard.models import TenantMembership
+from dashboard.tenants import tenant_alias, use_tenant
+
+
+class Command(BaseCommand):
+    help = "Migrate the default database and every school database, then rebuild the email -> school directory"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--skip-directory', action='store_true', help="Only run migrations")
+
+    def handle(self, *args, **options):
+        os.makedirs(settings.TENANT_DB_DIR, exist_ok=True)
+        for slug in [None] + settings.SCHOOL_TENANTS:
+            alias = tenant_alias(slug) if slug else 'default'
+            self.stdout.write(f"Migrating {alias}")
+            # Under the school so data migrations that don't pass using= still hit its database
+            with use_tenant(slug):
+                call_command('migrate', database=alias, interactive=False, verbosity=options['verbosity'] - 1)
+
+        if options['skip_directory']:
+            return
+        for slug in settings.SCHOOL_TENANTS:
+            emails = {
+                e.lower()
+                for e in User.objects.using(tenant_alias(slug)).exclude(email='').values_list('email', flat=True)
+            }
+            TenantMembership.objects.bulk_create(
+                [TenantMembership(email=email, tenant=slug) for email in emails],
+                batch_size=1000,
+                update_conflicts=True,
+                unique_fields=['email'],
+                update_fields=['tenant'],
+            )
+            self.stdout.write(f"  {slug}: {len(emails)} directory entries")
+        self.stdout.write(self.style.SUCCESS("Tenants migrated"))
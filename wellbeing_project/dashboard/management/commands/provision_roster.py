@@ -0,0 +1,228 @@
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models.functions import Lower
+from django.utils.crypto import get_random_string
+
+from dashboard.models import TenantMembership, UserProfile
+from dashboard.tenants import current_tenant, tenant_db, use_tenant
+
+USER_TYPES = {value for value, _ in UserProfile.USER_TYPE_CHOICES}
+
+
+def _init_worker():
+    # Needed when workers are spawned rather than forked (macOS, Windows)
+    import django
+    django.setup()
+
+
+def _hash(job):
+    password, iterations = job
+    hasher = PBKDF2PasswordHasher()
+    return hasher.encode(password, hasher.salt(), iterations)
+
+
+class Command(BaseCommand):
+    help = (
+        "Create users and profiles from a roster CSV "
+        "(columns: email, first_name, last_name, class_group, user_type, username, password)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_path')
+        parser.add_argument('--default-type', choices=sorted(USER_TYPES), default='student')
+        parser.add_argument(
+            '--passwords-out', metavar='PATH',
+            help="Generate passwords for rows without one and write email,password here",
+        )
+        parser.add_argument(
+            '--iterations', type=int, default=settings.PBKDF2_ITERATIONS,
+            help="PBKDF2 cost for the initial hashes; anything other than PBKDF2_ITERATIONS "
+                 "is rehashed in the background on the user's first login",
+        )
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--sheets', action='store_true', help="Also append the users to the Sheets Users tab")
+        parser.add_argument('--dry-run', action='store_true', help="Validate the roster without writing anything")
+        parser.add_argument('--tenant', help="School (from SCHOOL_TENANTS) whose database gets the users")
+
+    def handle(self, *args, **options):
+        tenant = options['tenant'] or current_tenant()
+        if tenant and tenant not in settings.SCHOOL_TENANTS:
+            raise CommandError(f"Unknown school {tenant!r}; SCHOOL_TENANTS is {settings.SCHOOL_TENANTS}")
+        with use_tenant(tenant):
+            self._provision(options)
+
+    def _provision(self, options):
+        started = time.perf_counter()
+        rows = self._read(options['csv_path'], options['default_type'])
+
+        rows, skipped = self._drop_existing(rows)
+        for row in skipped:
+            self.stdout.write(f"  skipping line {row['line']}: {row['email']} already exists")
+        missing = [r for r in rows if not r['password']]
+        if missing and not options['passwords_out']:
+            raise CommandError(
+                f"{len(missing)} rows have no password (first: line {missing[0]['line']}); "
+                "add them or pass --passwords-out"
+            )
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f"Roster OK: would create {len(rows)} users"))
+            return
+        if not rows:
+            self.stdout.write("Nothing to create.")
+            return
+
+        for row in missing:
+            row['password'] = get_random_string(12)
+        if missing:
+            with open(options['passwords_out'], 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(['email', 'password'])
+                writer.writerows((r['email'], r['password']) for r in missing)
+            os.chmod(options['passwords_out'], 0o600)
+
+        t0 = time.perf_counter()
+        hashes = self._hash_all(rows, options['iterations'], options['workers'])
+        hashed_in = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        self._create(rows, hashes, options['batch_size'])
+        created_in = time.perf_counter() - t0
+
+        if options['sheets']:
+            self._mirror_to_sheets(rows, hashes)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(rows)} users in {time.perf_counter() - started:.1f}s "
+            f"(hashing {hashed_in:.1f}s on {options['workers']} workers, database {created_in:.1f}s)"
+        ))
+
+    def _read(self, path, default_type):
+        try:
+            f = open(path, newline='', encoding='utf-8-sig')
+        except OSError as exc:
+            raise CommandError(f"Cannot read {path}: {exc}")
+
+        rows, errors, seen, seen_usernames = [], [], set(), set()
+        with f:
+            reader = csv.DictReader(f)
+            if not reader.fieldnames or 'email' not in reader.fieldnames:
+                raise CommandError("The roster needs at least an 'email' column")
+            for line, record in enumerate(reader, start=2):
+                record = {k.strip(): (v or '').strip() for k, v in record.items() if k}
+                email = record.get('email', '').lower()
+                row = {
+                    'line': line,
+                    'email': email,
+                    'username': record.get('username') or email,
+                    'first_name': record.get('first_name', ''),
+                    'last_name': record.get('last_name', ''),
+                    'class_group': record.get('class_group', ''),
+                    'user_type': record.get('user_type') or default_type,
+                    'password': record.get('password', ''),
+                }
+                if '@' not in email:
+                    errors.append(f"line {line}: invalid email {email!r}")
+                elif email in seen:
+                    errors.append(f"line {line}: {email} appears more than once")
+                elif row['username'] in seen_usernames:
+                    errors.append(f"line {line}: username {row['username']} appears more than once")
+                elif row['user_type'] not in USER_TYPES:
+                    errors.append(f"line {line}: unknown user_type {row['user_type']!r}")
+                elif len(row['class_group']) > 50 or len(row['username']) > 150:
+                    errors.append(f"line {line}: class_group or username too long")
+                seen.add(email)
+                seen_usernames.add(row['username'])
+                rows.append(row)
+
+        if errors:
+            raise CommandError(
+                f"{len(errors)} invalid rows, nothing created:\n  " + "\n  ".join(errors[:20])
+            )
+        return rows
+
+    def _drop_existing(self, rows):
+        emails, usernames = set(), set()
+        for i in range(0, len(rows), 500):
+            chunk = rows[i:i + 500]
+            # Stored addresses may be mixed case; roster emails are already lowered
+            emails.update(User.objects.annotate(lower_email=Lower('email')).filter(
+                lower_email__in=[r['email'] for r in chunk]
+            ).values_list('lower_email', flat=True))
+            usernames.update(User.objects.filter(
+                username__in=[r['username'] for r in chunk]
+            ).values_list('username', flat=True))
+        keep = [r for r in rows if r['email'] not in emails and r['username'] not in usernames]
+        skipped = [r for r in rows if r['email'] in emails or r['username'] in usernames]
+        return keep, skipped
+
+    def _hash_all(self, rows, iterations, workers):
+        jobs = [(r['password'], iterations) for r in rows]
+        if workers <= 1:
+            return [_hash(job) for job in jobs]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            return list(pool.map(_hash, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+
+    def _create(self, rows, hashes, batch_size):
+        with transaction.atomic(using=tenant_db()):
+            users = User.objects.bulk_create(
+                [
+                    User(
+                        username=r['username'], email=r['email'], password=hashed,
+                        first_name=r['first_name'], last_name=r['last_name'],
+                    )
+                    for r, hashed in zip(rows, hashes)
+                ],
+                batch_size=batch_size,
+            )
+            if any(u.pk is None for u in users):
+                # Backends without RETURNING: look the new ids up
+                ids = dict(User.objects.filter(
+                    username__in=[u.username for u in users]
+                ).values_list('username', 'id'))
+                for u in users:
+                    u.pk = ids[u.username]
+            UserProfile.objects.bulk_create(
+                [
+                    UserProfile(user=u, user_type=r['user_type'], class_group=r['class_group'])
+                    for u, r in zip(users, rows)
+                ],
+                batch_size=batch_size,
+            )
+        tenant = current_tenant()
+        if tenant:
+            # Directory entries live in the default database, so login can find the school
+            TenantMembership.objects.using('default').bulk_create(
+                [TenantMembership(email=r['email'], tenant=tenant) for r in rows],
+                batch_size=batch_size,
+                update_conflicts=True,
+                unique_fields=['email'],
+                update_fields=['tenant'],
+            )
+
+    def _mirror_to_sheets(self, rows, hashes):
+        from dashboard.sheets_db import db
+
+        if not db.sheet:
+            self.stderr.write("Google Sheets is not configured; skipped mirroring")
+            return
+        try:
+            # One API call for the whole roster instead of one append_row per user
+            db.sheet.worksheet('Users').append_rows([
+                [r['username'], r['email'], hashed, r['user_type'], r['first_name']]
+                for r, hashed in zip(rows, hashes)
+            ])
+        except Exception as exc:
+            # SheetsUnavailable or an API error. The users are committed by now,
+            # so this is a warning, not a failed import.
+            self.stderr.write(f"Could not append to the Users sheet, users were still created: {exc}")
+            return
+        self.stdout.write(f"Appended {len(rows)} rows to the Users sheet")
@@ -0,0 +1,39 @@
+import time
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired rows from django_session in small batches, so the write lock is "
+        "never held for long (unlike a single clearsessions DELETE on a large table)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--pause', type=float, default=0.05, help="Seconds to yield between batches")
+        parser.add_argument(
+            '--all', action='store_true',
+            help="Delete every row, e.g. after switching SESSION_BACKEND to signed_cookies",
+        )
+
+    def handle(self, *args, **options):
+        if options['all'] and settings.SESSION_ENGINE.endswith(('.db', '.cached_db')):
+            raise CommandError("Sessions are still stored in the database; --all would log everyone out.")
+
+        sessions = Session.objects.all()
+        if not options['all']:
+            sessions = sessions.filter(expire_date__lt=timezone.now())
+
+        deleted = 0
+        while True:
+            keys = list(sessions.values_list('session_key', flat=True)[:options['batch_size']])
+            if not keys:
+                break
+            deleted += Session.objects.filter(session_key__in=keys).delete()[0]
+            time.sleep(options['pause'])
+
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} sessions"))
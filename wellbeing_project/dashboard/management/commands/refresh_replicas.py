@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard.replica import primary_alias, refresh_replica, replica_age
+
+
+class Command(BaseCommand):
+    help = "Refresh the read-only replicas used by exports and reports (from cron, and after migrating)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--if-older-than', type=float, metavar='SECONDS',
+            help="Skip replicas taken less than this long ago",
+        )
+
+    def handle(self, *args, **options):
+        if not settings.READ_REPLICA_ENABLED:
+            raise CommandError("Read replicas are off; set READ_REPLICA=1")
+        min_age = options['if_older_than']
+        for alias in [a for a in settings.DATABASES if a == primary_alias(a)]:
+            age = replica_age(alias)
+            if min_age is not None and age is not None and age < min_age:
+                self.stdout.write(f"  {alias}: {age:.0f}s old, kept")
+                continue
+            took = refresh_replica(alias)
+            self.stdout.write(f"  {alias}: refreshed in {took:.2f}s")
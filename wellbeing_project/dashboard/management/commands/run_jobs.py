@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard.jobs import prune_jobs, requeue_stalled, run_job
+from dashboard.models import ExportJob
+from dashboard.tenants import use_tenant
+
+
+class Command(BaseCommand):
+    help = "Run queued export jobs (those left behind by a restart) and clean up old ones, in every school"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--stalled-after', type=int, default=300, metavar='SECONDS',
+            help="Re-run running jobs that have reported no progress for this long",
+        )
+        parser.add_argument('--keep-days', type=int, default=settings.EXPORT_KEEP_DAYS)
+        parser.add_argument('--tenant', action='append', help="Only this school (repeatable)")
+
+    def handle(self, *args, **options):
+        slugs = options['tenant'] or settings.SCHOOL_TENANTS
+        unknown = set(slugs) - set(settings.SCHOOL_TENANTS)
+        if unknown:
+            raise CommandError(f"Unknown schools: {', '.join(sorted(unknown))}")
+        if not options['tenant']:
+            slugs = [None, *slugs]
+
+        for slug in slugs:
+            with use_tenant(slug):
+                requeued = requeue_stalled(options['stalled_after'])
+                queued = list(
+                    ExportJob.objects.filter(status='queued').order_by('created_at').values_list('id', flat=True)
+                )
+                for job_id in queued:
+                    run_job(job_id, slug)
+                pruned = prune_jobs(options['keep_days'])
+            self.stdout.write(
+                f"  {slug or 'default'}: ran {len(queued)} jobs ({requeued} stalled, requeued); "
+                f"pruned {pruned} older than {options['keep_days']} days"
+            )
+        self.stdout.write(self.style.SUCCESS("Export jobs done"))
@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard.digest import send_digests
+from dashboard.tenants import use_tenant
+
+
+class Command(BaseCommand):
+    help = "Email teachers a digest of low-mood and flagged check-ins, if one is due (run from cron)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', action='append', help="Only this school (repeatable)")
+        parser.add_argument('--dry-run', action='store_true', help="Print the messages instead of sending them")
+
+    def handle(self, *args, **options):
+        slugs = options['tenant'] or settings.SCHOOL_TENANTS
+        unknown = set(slugs) - set(settings.SCHOOL_TENANTS)
+        if unknown:
+            raise CommandError(f"Unknown schools: {', '.join(sorted(unknown))}")
+        if not options['tenant']:
+            slugs = [None, *slugs]
+
+        for slug in slugs:
+            with use_tenant(slug):
+                result = send_digests(dry_run=options['dry_run'])
+            name = slug or 'default'
+            if result is None:
+                self.stdout.write(f"  {name}: not due yet")
+                continue
+            events, messages = result
+            if options['dry_run']:
+                for message in messages:
+                    self.stdout.write(f"--- To: {', '.join(message.to)}\nSubject: {message.subject}\n\n{message.body}")
+            verb = 'would send' if options['dry_run'] else 'sent'
+            self.stdout.write(f"  {name}: {events} entries, {verb} {len(messages)} messages")
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard.sheets_sync import sync_moods
+
+
+class Command(BaseCommand):
+    help = "Two-way sync of the MoodEntries worksheet with the database (incremental unless --full)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help="Re-read the whole sheet, not just new rows")
+        parser.add_argument(
+            '--prefer', choices=['db', 'sheet'], default='db',
+            help="Which side wins when both changed the same entry (default: db)",
+        )
+        parser.add_argument('--fake', metavar='PATH', help="Sync against a local JSON fake sheet instead")
+        parser.add_argument('--dry-run', action='store_true', help="Report what would change")
+
+    def handle(self, *args, **options):
+        if options['fake']:
+            from dashboard.sheets_client import SheetsClient, ThrottledSpreadsheet
+            from dashboard.sheets_fake import FakeSpreadsheet
+
+            sheet = ThrottledSpreadsheet(SheetsClient(), FakeSpreadsheet(options['fake']))
+        else:
+            from dashboard.sheets_db import db
+
+            sheet = db.sheet
+            if sheet is None:
+                raise CommandError("Google Sheets is not configured (GOOGLE_SHEETS_ENABLED / GOOGLE_SHEETS_CREDS)")
+
+        stats = sync_moods(sheet, full=options['full'], prefer=options['prefer'], dry_run=options['dry_run'])
+        for name, count in sorted(stats.items()):
+            self.stdout.write(f"  {name}: {count}")
+        if options['fake']:
+            self.stdout.write(f"  sheets api calls: {sum(sheet.calls.values())}")
+        self.stdout.write(self.style.SUCCESS("Dry run complete" if options['dry_run'] else "Sync complete"))
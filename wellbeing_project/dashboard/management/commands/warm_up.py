@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from dashboard.warmup import warm_up
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the pre-fork warm-up once (from build.sh), so a template that fails to "
+        "compile fails the deploy instead of the first request"
+    )
+
+    def handle(self, *args, **options):
+        templates = warm_up()
+        self.stdout.write(self.style.SUCCESS(f"Warmed up {templates} templates"))
@@ -0,0 +1,265 @@
+import glob
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache.backends.filebased import FileBasedCache
+from django.db.utils import OperationalError
+
+# Counters and histograms in Prometheus text format, kept in process
+# without a client library. Each process adds up its own numbers; when
+# METRICS_DIR is set (gunicorn.conf.py sets it) every process also writes
+# its totals to <pid>.json there, at most every METRICS_FLUSH_SECONDS, and
+# /metrics adds up all the files, so a scrape sees the whole server
+# whichever worker answers it. When a worker exits the master folds its
+# file into retired.json, so counters survive worker recycling.
+
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+
+COUNTERS = {
+    'wellbeing_checkins_total': "Check-ins accepted, by path; rate() * 60 gives check-ins per minute.",
+    'wellbeing_sqlite_locked_total': "Statements that gave up waiting for a SQLite lock (database is locked).",
+    'wellbeing_cache_requests_total': "Cache lookups by cache and result.",
+    'wellbeing_ratelimited_total': "Requests answered 429, by endpoint and the budget they spent.",
+    'wellbeing_sheets_calls_total': "Google Sheets API calls by method.",
+    'wellbeing_sheets_errors_total': "Google Sheets API calls that raised, by method.",
+    'wellbeing_sheets_retries_total': "Google Sheets API calls retried after a 429/5xx or network error, by method.",
+    'wellbeing_sheets_throttled_total': "Google Sheets API calls refused by the local quota, by method.",
+    'wellbeing_sheets_coalesced_total': "Google Sheets reads answered by an identical call in flight, by method.",
+    'wellbeing_sheets_seconds_total': "Time spent in Google Sheets API calls, by method.",
+}
+HISTOGRAMS = {
+    'wellbeing_request_seconds': ("Request latency by view.", REQUEST_BUCKETS),
+    'wellbeing_db_query_seconds': ("Database query time by database.", QUERY_BUCKETS),
+    'wellbeing_sqlite_write_seconds': (
+        "Write statements by database; past a millisecond or so this is time waiting for the SQLite write lock.",
+        QUERY_BUCKETS,
+    ),
+}
+
+RETIRED = 'retired.json'
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.counters = {name: {} for name in COUNTERS}
+        self.histograms = {name: {} for name in HISTOGRAMS}
+
+    def incr(self, name, amount=1, **labels):
+        key = _key(labels)
+        with self.lock:
+            values = self.counters[name]
+            values[key] = values.get(key, 0) + amount
+
+    def observe(self, name, seconds, **labels):
+        key = _key(labels)
+        buckets = HISTOGRAMS[name][1]
+        with self.lock:
+            # One count per bucket (not cumulative) + [sum, count]
+            values = self.histograms[name].get(key)
+            if values is None:
+                values = self.histograms[name][key] = [0] * (len(buckets) + 1) + [0.0, 0]
+            values[bisect_left(buckets, seconds)] += 1
+            values[-2] += seconds
+            values[-1] += 1
+
+    def snapshot(self):
+        with self.lock:
+            snapshot = {
+                'counters': {name: dict(values) for name, values in self.counters.items()},
+                'histograms': {name: {k: list(v) for k, v in values.items()} for name, values in self.histograms.items()},
+            }
+        _add_sheets(snapshot)
+        return snapshot
+
+
+registry = Registry()
+incr = registry.incr
+observe = registry.observe
+
+_flushed_at = 0.0
+
+
+def _key(labels):
+    return json.dumps(sorted(labels.items()))
+
+
+def _add_sheets(snapshot):
+    from .sheets_client import metrics as sheets_metrics
+
+    counters = snapshot['counters']
+    for method, stats in sheets_metrics.snapshot().items():
+        key = _key({'method': method})
+        for field in ('calls', 'errors', 'retries', 'throttled', 'coalesced'):
+            counters[f"wellbeing_sheets_{field}_total"][key] = stats[field]
+        counters['wellbeing_sheets_seconds_total'][key] = stats['latency_total']
+
+
+def merge(total, snapshot):
+    for name, values in snapshot.get('counters', {}).items():
+        into = total['counters'].setdefault(name, {})
+        for key, value in values.items():
+            into[key] = into.get(key, 0) + value
+    for name, values in snapshot.get('histograms', {}).items():
+        into = total['histograms'].setdefault(name, {})
+        for key, value in values.items():
+            into[key] = [a + b for a, b in zip(into[key], value)] if key in into else list(value)
+    return total
+
+
+# ----------------- Shared-file aggregation -----------------
+def _path(name):
+    return os.path.join(settings.METRICS_DIR, name)
+
+
+def _write(path, snapshot):
+    tmp = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(snapshot, f)
+    os.replace(tmp, path)
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def flush(force=False):
+    """Write this process's totals to METRICS_DIR, if set and one is due."""
+    global _flushed_at
+    if not settings.METRICS_DIR:
+        return
+    now = time.monotonic()
+    if not force and now - _flushed_at < settings.METRICS_FLUSH_SECONDS:
+        return
+    _flushed_at = now
+    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+    _write(_path(f"{os.getpid()}.json"), registry.snapshot())
+
+
+def retire(pid):
+    """Fold an exited worker's file into retired.json; called in the gunicorn master."""
+    path = _path(f"{pid}.json")
+    if not os.path.exists(path):
+        return
+    retired = merge({'counters': {}, 'histograms': {}}, _read(_path(RETIRED)))
+    _write(_path(RETIRED), merge(retired, _read(path)))
+    os.remove(path)
+
+
+def clear():
+    """Start from zero; called once when gunicorn starts."""
+    for path in glob.glob(_path('*.json')):
+        os.remove(path)
+
+
+def collect():
+    """Totals for this process plus, with METRICS_DIR, every other process's last flush."""
+    total = merge({'counters': {}, 'histograms': {}}, registry.snapshot())
+    if settings.METRICS_DIR:
+        own = _path(f"{os.getpid()}.json")
+        for path in glob.glob(_path('*.json')):
+            if path != own:
+                merge(total, _read(path))
+    return total
+
+
+def _labels(key, **extra):
+    pairs = json.loads(key) + list(extra.items())
+    if not pairs:
+        return ''
+    escaped = (
+        str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n') for _, value in pairs
+    )
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(total):
+    lines = []
+    for name, help_text in COUNTERS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+        for key, value in sorted(total['counters'].get(name, {}).items()):
+            lines.append(f"{name}{_labels(key)} {_number(value)}")
+    for name, (help_text, buckets) in HISTOGRAMS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        for key, values in sorted(total['histograms'].get(name, {}).items()):
+            running = 0
+            for bound, count in zip([*map(str, buckets), '+Inf'], values):
+                running += count
+                lines.append(f"{name}_bucket{_labels(key, le=bound)} {running}")
+            lines.append(f"{name}_sum{_labels(key)} {_number(values[-2])}")
+            lines.append(f"{name}_count{_labels(key)} {values[-1]}")
+    return '\n'.join(lines) + '\n'
+
+
+# ----------------- Instrumentation -----------------
+def _timed_query(execute, sql, params, many, context):
+    alias = context['connection'].alias
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    except OperationalError as exc:
+        if 'locked' in str(exc):
+            incr('wellbeing_sqlite_locked_total', db=alias)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        observe('wellbeing_db_query_seconds', elapsed, db=alias)
+        if sql.lstrip()[:6].upper() in ('INSERT', 'UPDATE', 'DELETE', 'REPLAC'):
+            observe('wellbeing_sqlite_write_seconds', elapsed, db=alias)
+
+
+def connection_created(sender, connection, **kwargs):
+    # The wrapper object outlives reconnects; add the timer only once
+    if _timed_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_timed_query)
+
+
+class MetricsMiddleware:
+    """Time every request by view name; goes first so it covers the other middleware too."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        response = self.get_response(request)
+        match = getattr(request, 'resolver_match', None)
+        observe('wellbeing_request_seconds', time.perf_counter() - started,
+                view=match.view_name if match else 'unresolved')
+        flush()
+        return response
+
+
+class CountingFileBasedCache(FileBasedCache):
+    """
+    FileBasedCache that counts hits and misses, labelled by its directory
+    name. get_many() and get_or_set() go through get(), so they count too.
+    """
+
+    _missing = object()
+
+    def __init__(self, dir, params):
+        super().__init__(dir, params)
+        self.metrics_name = os.path.basename(os.path.normpath(dir))
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, self._missing, version)
+        incr('wellbeing_cache_requests_total', cache=self.metrics_name,
+             result='miss' if value is self._missing else 'hit')
+        return default if value is self._missing else value
@@ -0,0 +1,22 @@
+from .sheets_batch import declare, read_scope
+
+# Worksheets each view reads through SheetsDB, by URL name. Declared before
+# the view runs, they all come back in its first Sheets round trip.
+SHEETS_READS = {
+    # The EmailBackend falls back to the Users sheet for unknown emails
+    'login': ('Users',),
+}
+
+
+class SheetsReadScopeMiddleware:
+    """Memoize Sheets reads for the duration of each request (see sheets_batch.py)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with read_scope():
+            return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        declare(*SHEETS_READS.get(request.resolver_match.url_name, ()))
@@ -0,0 +1,100 @@
+from django.db import migrations, models
+
+
+# slug -> (code, valence). Frozen copy of dashboard.models.MOODS at the
+# time of this migration.
+MOOD_CODES = {
+    'happy': (1, 2),
+    'ecstatic': (2, 3),
+    'inspired': (3, 2),
+    'calm': (4, 1),
+    'good': (5, 1),
+    'numb': (6, 0),
+    'worried': (7, -1),
+    'lethargic': (8, -1),
+    'grumpy': (9, -1),
+    'sad': (10, -2),
+    'stressed': (11, -2),
+    'angry': (12, -3),
+}
+
+MOOD_CHOICES = [
+    (1, 'Happy'), (2, 'Ecstatic'), (3, 'Inspired'), (4, 'Calm'),
+    (5, 'Good'), (6, 'Numb'), (7, 'Worried'), (8, 'Lethargic'),
+    (9, 'Grumpy'), (10, 'Sad'), (11, 'Stressed'), (12, 'Angry'),
+]
+
+
+def encode_moods(apps, schema_editor):
+    MoodEntry = apps.get_model('dashboard', 'MoodEntry')
+    entries = MoodEntry.objects.using(schema_editor.connection.alias)
+    for value in entries.values_list('mood', flat=True).distinct():
+        # Exact slugs, plus the same slug with other casing or stray spaces
+        known = MOOD_CODES.get((value or '').strip().lower())
+        if known:
+            entries.filter(mood=value).update(mood_code=known[0], valence=known[1])
+
+    # Anything else is left for a person to decide; guessing would corrupt history
+    unknown = entries.filter(mood_code__isnull=True)
+    if unknown.exists():
+        report = [
+            f"{value!r}: {unknown.filter(mood=value).count()} rows, e.g. ids "
+            f"{', '.join(str(pk) for pk in unknown.filter(mood=value).values_list('pk', flat=True)[:5])}"
+            for value in unknown.values_list('mood', flat=True).distinct()
+        ]
+        raise ValueError(
+            "Mood entries with unrecognised moods; correct or delete them, then migrate again:\n  "
+            + "\n  ".join(report)
+        )
+
+
+def decode_moods(apps, schema_editor):
+    MoodEntry = apps.get_model('dashboard', 'MoodEntry')
+    entries = MoodEntry.objects.using(schema_editor.connection.alias)
+    for slug, (code, valence) in MOOD_CODES.items():
+        entries.filter(mood_code=code).update(mood=slug)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0002_alter_moodentry_unique_together_alter_moodentry_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='moodentry',
+            name='mood_code',
+            field=models.PositiveSmallIntegerField(choices=MOOD_CHOICES, null=True),
+        ),
+        migrations.AddField(
+            model_name='moodentry',
+            name='valence',
+            field=models.SmallIntegerField(default=0),
+        ),
+        # Nullable so that unapplying can re-add the column before decoding into it
+        migrations.AlterField(
+            model_name='moodentry',
+            name='mood',
+            field=models.CharField(choices=[(slug, slug.title()) for slug in MOOD_CODES], max_length=20, null=True),
+        ),
+        migrations.RunPython(encode_moods, decode_moods),
+        migrations.RemoveField(
+            model_name='moodentry',
+            name='mood',
+        ),
+        migrations.RenameField(
+            model_name='moodentry',
+            old_name='mood_code',
+            new_name='mood',
+        ),
+        migrations.AlterField(
+            model_name='moodentry',
+            name='mood',
+            field=models.PositiveSmallIntegerField(choices=MOOD_CHOICES),
+        ),
+        migrations.AddIndex(
+            model_name='moodentry',
+            index=models.Index(fields=['date', 'mood'], name='moodentry_date_mood_idx'),
+        ),
+    ]
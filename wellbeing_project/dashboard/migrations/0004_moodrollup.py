@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-19 14:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0003_moodentry_mood_codes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MoodRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('class_group', models.CharField(blank=True, max_length=50)),
+                ('mood', models.PositiveSmallIntegerField(choices=[(1, 'Happy'), (2, 'Ecstatic'), (3, 'Inspired'), (4, 'Calm'), (5, 'Good'), (6, 'Numb'), (7, 'Worried'), (8, 'Lethargic'), (9, 'Grumpy'), (10, 'Sad'), (11, 'Stressed'), (12, 'Angry')])),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-date'],
+                'constraints': [models.UniqueConstraint(fields=('date', 'class_group', 'mood'), name='moodrollup_unique_day')],
+            },
+        ),
+    ]
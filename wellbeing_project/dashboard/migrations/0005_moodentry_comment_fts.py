@@ -0,0 +1,68 @@
+from django.db import migrations
+
+# Frozen copy of the FTS5 table and triggers from dashboard/search.py at the
+# time of this migration; later changes to search.py must not alter it.
+FTS_TABLE = 'dashboard_moodentry_fts'
+
+CREATE_SQL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        comment, content='dashboard_moodentry', content_rowid='id',
+        tokenize='porter unicode61'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON dashboard_moodentry BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, comment) VALUES (new.id, new.comment);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON dashboard_moodentry BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, comment) VALUES ('delete', old.id, old.comment);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF comment ON dashboard_moodentry BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, comment) VALUES ('delete', old.id, old.comment);
+        INSERT INTO {FTS_TABLE}(rowid, comment) VALUES (new.id, new.comment);
+    END""",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+
+def _fts5_available(cursor):
+    cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+    if cursor.fetchone()[0]:
+        return True
+    cursor.execute("SELECT 1 FROM pragma_module_list WHERE name = 'fts5'")
+    return cursor.fetchone() is not None
+
+
+def create_index(apps, schema_editor):
+    # Without FTS5 search falls back to icontains; nothing to create
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        if not _fts5_available(cursor):
+            return
+        for sql in CREATE_SQL:
+            cursor.execute(sql)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for sql in DROP_SQL:
+            cursor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0004_moodrollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
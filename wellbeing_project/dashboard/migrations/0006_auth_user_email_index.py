@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """Index auth_user.email, which EmailBackend looks users up by."""
+
+    dependencies = [
+        ('dashboard', '0005_moodentry_comment_fts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            "CREATE INDEX IF NOT EXISTS dashboard_auth_user_email_idx ON auth_user (email)",
+            "DROP INDEX IF EXISTS dashboard_auth_user_email_idx",
+        ),
+    ]
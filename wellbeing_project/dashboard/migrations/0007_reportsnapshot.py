@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-19 14:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0006_auth_user_email_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('week', 'Week'), ('term', 'Term')], max_length=10)),
+                ('start', models.DateField()),
+                ('end', models.DateField()),
+                ('scope', models.CharField(choices=[('school', 'School'), ('class', 'Class')], max_length=10)),
+                ('class_group', models.CharField(blank=True, max_length=50)),
+                ('data', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-start', 'scope', 'class_group'],
+                'constraints': [models.UniqueConstraint(fields=('period', 'start', 'scope', 'class_group'), name='reportsnapshot_unique_period')],
+            },
+        ),
+    ]
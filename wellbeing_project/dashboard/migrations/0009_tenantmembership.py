@@ -0,0 +1,21 @@
+# Generated by Django 5.2.8 on 2026-10-19 14:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0008_moodentry_updated_at_synccheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TenantMembership',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', models.EmailField(max_length=254, unique=True)),
+                ('tenant', models.CharField(db_index=True, max_length=50)),
+            ],
+        ),
+    ]
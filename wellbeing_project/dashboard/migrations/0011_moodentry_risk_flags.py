@@ -0,0 +1,24 @@
+# Generated by Django 5.2.8 on 2026-10-19 14:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0010_exportjob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='moodentry',
+            name='risk_flags',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='moodentry',
+            index=models.Index(condition=models.Q(('risk_flags__gt', 0)), fields=['date'], name='moodentry_flagged_idx'),
+        ),
+    ]
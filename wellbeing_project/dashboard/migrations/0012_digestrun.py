@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-19 15:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0011_moodentry_risk_flags'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DigestRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('since', models.DateTimeField()),
+                ('until', models.DateTimeField(db_index=True)),
+                ('events', models.PositiveIntegerField(default=0)),
+                ('messages', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-until'],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """EmailBackend matches emails case-insensitively on LOWER(email); index that instead."""
+
+    dependencies = [
+        ('dashboard', '0012_digestrun'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            [
+                "CREATE INDEX IF NOT EXISTS dashboard_auth_user_email_lower_idx ON auth_user (LOWER(email))",
+                "DROP INDEX IF EXISTS dashboard_auth_user_email_idx",
+            ],
+            [
+                "CREATE INDEX IF NOT EXISTS dashboard_auth_user_email_idx ON auth_user (email)",
+                "DROP INDEX IF EXISTS dashboard_auth_user_email_lower_idx",
+            ],
+        ),
+    ]
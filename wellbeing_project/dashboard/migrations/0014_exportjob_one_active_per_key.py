@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-19 15:23
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fail_duplicate_active_jobs(apps, schema_editor):
+    # Earlier racing submits could queue the same export twice; keep the oldest
+    ExportJob = apps.get_model('dashboard', 'ExportJob')
+    active = ExportJob.objects.using(schema_editor.connection.alias).filter(status__in=['queued', 'running'])
+    kept = {}
+    for job_id, key in active.order_by('id').values_list('id', 'key'):
+        if key in kept:
+            active.filter(pk=job_id).update(status='failed', error=f"Duplicate of job #{kept[key]}")
+        else:
+            kept[key] = job_id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0013_auth_user_email_lower_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(fail_duplicate_active_jobs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='exportjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['queued', 'running'])), fields=('key',), name='dashboard_exportjob_one_active_per_key'),
+        ),
+    ]
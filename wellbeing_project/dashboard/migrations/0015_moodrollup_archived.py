@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-19 15:37
+
+from django.db import migrations, models
+
+
+def mark_archived_days(apps, schema_editor):
+    # Rollups for days with no raw entries left were written by archiving
+    alias = schema_editor.connection.alias
+    MoodEntry = apps.get_model('dashboard', 'MoodEntry')
+    MoodRollup = apps.get_model('dashboard', 'MoodRollup')
+    live_days = MoodEntry.objects.using(alias).values('date')
+    MoodRollup.objects.using(alias).exclude(date__in=live_days).update(archived=models.F('count'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0014_exportjob_one_active_per_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='moodrollup',
+            name='archived',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(mark_archived_days, migrations.RunPython.noop),
+    ]
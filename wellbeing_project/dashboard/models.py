@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth.models import User
 
+from .risk import comment_risk, risk_labels
+
 class UserProfile(models.Model):
     USER_TYPE_CHOICES = [
         ('student', 'Student'),
@@ -13,49 +15,228 @@ class UserProfile(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.user_type}"
 
+# Moods are stored as small integer codes. Each row of this table is
+# (code, slug, label, emoji, valence); the slug is what forms, CSV exports
+# and the Google Sheet use, the code is what goes in the database.
+MOODS = [
+    (1, 'happy', 'Happy', '😊', 2),
+    (2, 'ecstatic', 'Ecstatic', '😄', 3),
+    (3, 'inspired', 'Inspired', '✨', 2),
+    (4, 'calm', 'Calm', '😌', 1),
+    (5, 'good', 'Good', '👍', 1),
+    (6, 'numb', 'Numb', '😐', 0),
+    (7, 'worried', 'Worried', '😟', -1),
+    (8, 'lethargic', 'Lethargic', '😴', -1),
+    (9, 'grumpy', 'Grumpy', '😠', -1),
+    (10, 'sad', 'Sad', '😢', -2),
+    (11, 'stressed', 'Stressed', '😰', -2),
+    (12, 'angry', 'Angry', '😡', -3),
+]
+
 class MoodEntry(models.Model):
-    MOOD_CHOICES = [
-        ('happy', 'Happy'),
-        ('ecstatic', 'Ecstatic'),
-        ('inspired', 'Inspired'),
-        ('calm', 'Calm'),
-        ('good', 'Good'),
-        ('numb', 'Numb'),
-        ('worried', 'Worried'),
-        ('lethargic', 'Lethargic'),
-        ('grumpy', 'Grumpy'),
-        ('sad', 'Sad'),
-        ('stressed', 'Stressed'),
-        ('angry', 'Angry'),
-    ]
-    
-    MOOD_EMOJI = {
-        'happy': '😊',
-        'ecstatic': '😄',
-        'inspired': '✨',
-        'calm': '😌',
-        'good': '👍',
-        'numb': '😐',
-        'worried': '😟',
-        'lethargic': '😴',
-        'grumpy': '😠',
-        'sad': '😢',
-        'stressed': '😰',
-        'angry': '😡',
-    }
+    MOOD_CHOICES = [(code, label) for code, slug, label, emoji, valence in MOODS]
+
+    # Lookup tables indexed by mood code (index 0 is unused)
+    MOOD_SLUGS = ('',) + tuple(m[1] for m in MOODS)
+    MOOD_LABELS = ('',) + tuple(m[2] for m in MOODS)
+    MOOD_EMOJIS = ('😊',) + tuple(m[3] for m in MOODS)
+    MOOD_VALENCE = (0,) + tuple(m[4] for m in MOODS)
+
+    MOOD_CODES = {m[1]: m[0] for m in MOODS}
+    MOOD_EMOJI = {m[1]: m[3] for m in MOODS}
+
+    LOW_MOODS = [m[0] for m in MOODS if m[1] in ('sad', 'stressed', 'angry', 'worried')]
     
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True)
     date = models.DateField(auto_now_add=True)
-    mood = models.CharField(max_length=20, choices=MOOD_CHOICES)
+    mood = models.PositiveSmallIntegerField(choices=MOOD_CHOICES)
+    valence = models.SmallIntegerField(default=0)
     comment = models.TextField(blank=True, null=True)
     timestamp = models.DateTimeField(auto_now_add=True)
+    # Bumped on every save; the Sheets sync uses it to find local changes
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    # Bitmask of dashboard.risk.RISK_CATEGORIES found in the comment
+    risk_flags = models.PositiveSmallIntegerField(default=0)
     
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['date', 'mood'], name='moodentry_date_mood_idx'),
+            # Only flagged rows are indexed; the dashboard asks for nothing else
+            models.Index(fields=['date'], condition=models.Q(risk_flags__gt=0), name='moodentry_flagged_idx'),
+        ]
     
     def __str__(self):
-        return f"{self.user.username if self.user else 'Unknown'} - {self.mood} - {self.date}"
+        return f"{self.user.username if self.user else 'Unknown'} - {self.mood_slug} - {self.date}"
+
+    def save(self, *args, **kwargs):
+        self.valence = self.MOOD_VALENCE[self.mood]
+        self.risk_flags = comment_risk(self.comment)
+        # update_or_create() saves only the fields it was given; keep the derived ones with them
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            derived = {'mood': 'valence', 'comment': 'risk_flags'}
+            kwargs['update_fields'] = {*update_fields, *(derived[f] for f in update_fields if f in derived)}
+        super().save(*args, **kwargs)
+
+    @property
+    def risk_labels(self):
+        return risk_labels(self.risk_flags)
+
+    @property
+    def mood_slug(self):
+        return self.MOOD_SLUGS[self.mood or 0]
+
+    def get_mood_display(self):
+        return self.MOOD_LABELS[self.mood or 0]
     
     def get_emoji(self):
-        return self.MOOD_EMOJI.get(self.mood, '😊')
+        return self.MOOD_EMOJIS[self.mood or 0]
+
+
+class MoodRollup(models.Model):
+    """
+    Daily mood counts per class, kept when raw entries are archived.
+    `count` is the day's total; `archived` is the part of it whose entries
+    now live only in the archive files (see dashboard/archive.py).
+    """
+    date = models.DateField()
+    class_group = models.CharField(max_length=50, blank=True)
+    mood = models.PositiveSmallIntegerField(choices=MoodEntry.MOOD_CHOICES)
+    count = models.PositiveIntegerField(default=0)
+    archived = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'class_group', 'mood'], name='moodrollup_unique_day'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.class_group or '-'} {MoodEntry.MOOD_SLUGS[self.mood]}: {self.count}"
+
+
+class ReportSnapshot(models.Model):
+    """
+    Frozen mood summary for a closed week or term, written nightly by
+    `manage.py build_report_snapshots`. One school-wide row per period plus
+    one row per class; `data` holds the aggregates the report page shows.
+    """
+    PERIOD_CHOICES = [
+        ('week', 'Week'),
+        ('term', 'Term'),
+    ]
+    SCOPE_CHOICES = [
+        ('school', 'School'),
+        ('class', 'Class'),
+    ]
+    period = models.CharField(max_length=10, choices=PERIOD_CHOICES)
+    start = models.DateField()
+    end = models.DateField()
+    scope = models.CharField(max_length=10, choices=SCOPE_CHOICES)
+    class_group = models.CharField(max_length=50, blank=True)
+    data = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-start', 'scope', 'class_group']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['period', 'start', 'scope', 'class_group'], name='reportsnapshot_unique_period',
+            ),
+        ]
 
+    def __str__(self):
+        who = (self.class_group or '-') if self.scope == 'class' else 'school'
+        return f"{self.period} {self.start}–{self.end} {who}"
+
+
+class SyncCheckpoint(models.Model):
+    """Where the last Sheets sync of a worksheet left off (see dashboard/sheets_sync.py)."""
+    name = models.CharField(max_length=50, unique=True)
+    # Rows of the worksheet already read, header included
+    sheet_rows = models.PositiveIntegerField(default=0)
+    # Local changes up to this moment have been pushed
+    db_synced_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.sheet_rows} rows, db at {self.db_synced_at}"
+
+
+class TenantMembership(models.Model):
+    """Which school's database an email belongs to; lives in the default database."""
+    email = models.EmailField(unique=True)
+    tenant = models.CharField(max_length=50, db_index=True)
+
+    def __str__(self):
+        return f"{self.email} -> {self.tenant}"
+
+    def save(self, *args, **kwargs):
+        # tenant_for_email() looks addresses up lower-cased
+        self.email = self.email.lower()
+        super().save(*args, **kwargs)
+
+
+class ExportJob(models.Model):
+    """
+    An export run in the background (see dashboard/jobs.py). `key` hashes
+    kind and params, so identical requests share one job and one file.
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    kind = models.CharField(max_length=50)
+    params = models.JSONField(default=dict)
+    key = models.CharField(max_length=64, db_index=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued', db_index=True)
+    done_rows = models.PositiveIntegerField(default=0)
+    total_rows = models.PositiveIntegerField(default=0)
+    result_path = models.CharField(max_length=500, blank=True)
+    error = models.TextField(blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Bumped with every progress update; a running job that stops moving was orphaned
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            # At most one queued or running job per export, however many requests race to submit it
+            models.UniqueConstraint(
+                fields=['key'], condition=models.Q(status__in=['queued', 'running']),
+                name='dashboard_exportjob_one_active_per_key',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
+
+    @property
+    def percent(self):
+        if self.status == 'done':
+            return 100
+        return int(self.done_rows * 100 / self.total_rows) if self.total_rows else 0
+
+
+class DigestRun(models.Model):
+    """
+    One pass of `manage.py send_digests` (see dashboard/digest.py). Entries
+    updated up to `until` have been reported; the next pass starts there.
+    """
+    since = models.DateTimeField()
+    until = models.DateTimeField(db_index=True)
+    events = models.PositiveIntegerField(default=0)
+    messages = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-until']
+
+    def __str__(self):
+        return f"Digest {self.since:%Y-%m-%d %H:%M} - {self.until:%H:%M} ({self.messages} sent)"
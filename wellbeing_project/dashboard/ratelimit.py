@@ -0,0 +1,166 @@
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.http import HttpResponse
+
+from . import metrics
+from .tenants import current_tenant
+
+logger = logging.getLogger(__name__)
+
+# Per-endpoint request budgets (settings.RATE_LIMITS), checked before the
+# view does any hashing or database work. Counts live in a small SQLite
+# file shared by every worker on the host, one row per key and fixed
+# window; a request is measured against a sliding window by weighting the
+# previous window's count by how much of it still overlaps:
+#     estimate = previous * (1 - elapsed / period) + current
+# Rejected requests are not counted, so a client over budget gets in at
+# the budgeted rate and no faster. If the counter file is unavailable the
+# request goes through.
+
+SCHEMA = """CREATE TABLE IF NOT EXISTS ratelimit_hits (
+    key TEXT NOT NULL,
+    window INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    expires REAL NOT NULL,
+    PRIMARY KEY (key, window)
+) WITHOUT ROWID"""
+
+PRUNE_SECONDS = 300
+
+_local = threading.local()
+_pruned_at = 0.0
+
+
+def _counts():
+    conn = getattr(_local, 'conn', None)
+    path = settings.RATE_LIMIT_PATH
+    if conn is None or _local.key != (os.getpid(), path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        conn = sqlite3.connect(path, timeout=1, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        # Losing the last few counts in a crash is fine
+        conn.execute('PRAGMA synchronous=OFF')
+        conn.execute(SCHEMA)
+        _local.conn, _local.key = conn, (os.getpid(), path)
+    return conn
+
+
+def client_ip(request):
+    # Behind RATE_LIMIT_PROXIES proxies, the address the nearest untrusted hop sent
+    if settings.RATE_LIMIT_PROXIES:
+        forwarded = [ip.strip() for ip in request.headers.get('X-Forwarded-For', '').split(',') if ip.strip()]
+        if len(forwarded) >= settings.RATE_LIMIT_PROXIES:
+            return forwarded[-settings.RATE_LIMIT_PROXIES]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def identities(request, kinds):
+    """{kind: value} for the budgets of one endpoint; kinds the request can't be tied to are left out."""
+    found = {}
+    if 'ip' in kinds:
+        found['ip'] = client_ip(request)
+    if 'email' in kinds and request.method == 'POST':
+        email = request.POST.get('email', '').strip().lower()
+        if email:
+            found['email'] = email
+    if 'user' in kinds:
+        # From the session, not request.user, which would query the database
+        user_id = request.session.get(SESSION_KEY)
+        if user_id:
+            found['user'] = f"{current_tenant() or ''}:{user_id}"
+    return found
+
+
+def _retry_after(previous, current, limit, period, elapsed):
+    if current >= limit:
+        wait = period - elapsed
+    else:
+        # Solves previous * (1 - t / period) + current = limit for t
+        wait = period * (previous - limit + current) / previous - elapsed
+    # Strictly past the point where the estimate equals the limit, which is still refused
+    return max(1, math.floor(wait) + 1)
+
+
+def hit(scope, found, now=None):
+    """
+    Count one request against every budget of `scope`, unless one of them
+    is spent. Returns (kind, seconds to wait) for the first spent budget,
+    or None when the request may go ahead.
+    """
+    now = now or time.time()
+    budgets = settings.RATE_LIMITS[scope]
+    conn = _counts()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        updates = []
+        for kind, value in found.items():
+            limit, period = budgets[kind]
+            key = f"{scope}:{kind}:{value}"
+            window = int(now // period)
+            counts = dict(conn.execute(
+                'SELECT window, count FROM ratelimit_hits WHERE key = ? AND window IN (?, ?)',
+                [key, window - 1, window],
+            ).fetchall())
+            previous, current = counts.get(window - 1, 0), counts.get(window, 0)
+            elapsed = now - window * period
+            if previous * (1 - elapsed / period) + current >= limit:
+                conn.execute('COMMIT')
+                return kind, _retry_after(previous, current, limit, period, elapsed)
+            # Read until the end of the next window, as its "previous"
+            updates.append((key, window, (window + 2) * period))
+        conn.executemany(
+            'INSERT INTO ratelimit_hits (key, window, count, expires) VALUES (?, ?, 1, ?) '
+            'ON CONFLICT (key, window) DO UPDATE SET count = count + 1',
+            updates,
+        )
+        conn.execute('COMMIT')
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    _prune(conn, now)
+    return None
+
+
+def _prune(conn, now):
+    global _pruned_at
+    if now - _pruned_at < PRUNE_SECONDS:
+        return
+    _pruned_at = now
+    conn.execute('DELETE FROM ratelimit_hits WHERE expires < ?', [now])
+
+
+def rate_limited(scope, methods=None):
+    """
+    Answer 429 once a request is over any of the `scope` budgets in
+    settings.RATE_LIMITS; only `methods` are counted when given. Put it
+    above @login_required so rejected requests never reach the database.
+    """
+    def decorate(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if settings.RATE_LIMIT_ENABLED and (methods is None or request.method in methods):
+                try:
+                    spent = hit(scope, identities(request, settings.RATE_LIMITS[scope]))
+                except sqlite3.Error as exc:
+                    logger.warning("Rate limit check for %s skipped: %s", scope, exc)
+                    spent = None
+                if spent:
+                    kind, wait = spent
+                    metrics.incr('wellbeing_ratelimited_total', scope=scope, by=kind)
+                    response = HttpResponse(
+                        f"Too many requests. Please try again in {wait} seconds.\n",
+                        status=429, content_type='text/plain; charset=utf-8',
+                    )
+                    response['Retry-After'] = str(wait)
+                    return response
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorate
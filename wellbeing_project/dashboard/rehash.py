@@ -0,0 +1,72 @@
+import logging
+import os
+import queue
+import threading
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+# Password upgrades (legacy Sheets hashes, changed PBKDF2 cost) are slow by
+# design, so logins hand them to a worker thread instead of paying inline.
+_queue = queue.Queue(maxsize=getattr(settings, 'PASSWORD_REHASH_QUEUE_SIZE', 1000))
+_pending = set()
+_lock = threading.Lock()
+_worker_pid = None
+
+
+def schedule_rehash(user, raw_password):
+    # The database the user came from: with per-school databases it is not always "default"
+    job = (user._state.db or 'default', user.pk, user.password, raw_password)
+    if not getattr(settings, 'PASSWORD_REHASH_ASYNC', True):
+        _rehash(*job)
+        return
+
+    with _lock:
+        if job[:2] in _pending:
+            return
+        _ensure_worker()
+        try:
+            _queue.put_nowait(job)
+        except queue.Full:
+            # Nothing lost: the next login schedules it again
+            logger.warning("Password rehash queue full; skipping user %s", user.pk)
+            return
+        _pending.add(job[:2])
+
+
+def wait_for_rehashes():
+    """Block until every queued rehash has been written (for commands and tests)."""
+    _queue.join()
+
+
+def _rehash(using, user_id, old_encoded, raw_password):
+    # Only replace the hash we verified; a password change in between wins
+    User.objects.using(using).filter(pk=user_id, password=old_encoded).update(
+        password=make_password(raw_password)
+    )
+
+
+def _ensure_worker():
+    global _worker_pid
+    # Threads do not survive a fork, so each gunicorn worker starts its own
+    if _worker_pid != os.getpid():
+        _worker_pid = os.getpid()
+        threading.Thread(target=_run, name='password-rehash', daemon=True).start()
+
+
+def _run():
+    while True:
+        using, user_id, old_encoded, raw_password = _queue.get()
+        try:
+            _rehash(using, user_id, old_encoded, raw_password)
+        except Exception:
+            logger.exception("Password rehash failed for user %s", user_id)
+        finally:
+            with _lock:
+                _pending.discard((using, user_id))
+            close_old_connections()
+            _queue.task_done()
@@ -0,0 +1,175 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+
+from .tenants import is_shared, tenant_db
+
+logger = logging.getLogger(__name__)
+
+# Read-only copies of each SQLite database, taken with the online backup
+# API. Views wrapped in reads_from_replica send their queries to the copy
+# of whatever database they would otherwise read (default or a school's),
+# so long exports and reports don't hold locks that check-ins wait on.
+# A copy older than READ_REPLICA_MAX_AGE is not used: those reads go to
+# the primary while a fresh copy is made in the background.
+
+_reading = ContextVar('read_replica', default=False)
+
+# Accounts and profiles decide who may see a page, so they are always read
+# from the primary: a stale copy could miss a new teacher or keep one who
+# was removed.
+PRIMARY_APPS = {'auth'}
+PRIMARY_MODELS = {'userprofile'}
+
+_lock = threading.Lock()
+_refreshing = set()
+
+# backup_database() copies this many pages (4 KB each by default) per
+# step and sleeps this long between steps
+BACKUP_STEP_PAGES = 256
+BACKUP_STEP_SLEEP = 0.005
+BACKUP_MAX_RESTARTS = 5
+
+
+class _KeptRestarting(Exception):
+    pass
+
+
+def replica_alias(alias):
+    return f"{alias}_replica"
+
+
+def primary_alias(alias):
+    return alias.removesuffix('_replica')
+
+
+def backup_database(source, target):
+    """
+    Copy the SQLite file `source` to `target` as one consistent snapshot.
+    The copy is made next to `target` and swapped in, so readers of the
+    old copy are never left with a half-written file.
+    """
+    os.makedirs(os.path.dirname(target) or '.', exist_ok=True)
+    tmp = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(tmp)
+    remaining, restarts = None, 0
+
+    def progress(status, left, total):
+        # A write from another connection sends the copy back to the start,
+        # so a step that doesn't bring `left` down means it restarted
+        nonlocal remaining, restarts
+        if remaining is not None and left >= remaining:
+            restarts += 1
+            if restarts > BACKUP_MAX_RESTARTS:
+                raise _KeptRestarting
+        remaining = left
+        if left:
+            # Called between steps, with the read lock released
+            time.sleep(BACKUP_STEP_SLEEP)
+
+    try:
+        # The primary isn't in WAL mode, so a step holds a read lock that
+        # writers must wait for. Short steps with a pause between them let
+        # check-ins through; if writes keep restarting the copy, finish it
+        # in one step and make the writers wait that once.
+        try:
+            src.backup(dst, pages=BACKUP_STEP_PAGES, progress=progress)
+        except _KeptRestarting:
+            logger.info("Copy of %s kept restarting; finishing it in one step", source)
+            src.backup(dst, pages=-1)
+    finally:
+        dst.close()
+        src.close()
+    os.replace(tmp, target)
+
+
+def replica_age(alias):
+    """Seconds since the replica of `alias` was taken, or None if there is none."""
+    try:
+        return time.time() - os.path.getmtime(settings.DATABASES[replica_alias(alias)]['NAME'])
+    except (KeyError, OSError):
+        return None
+
+
+def refresh_replica(alias):
+    started = time.perf_counter()
+    backup_database(settings.DATABASES[alias]['NAME'], settings.DATABASES[replica_alias(alias)]['NAME'])
+    return time.perf_counter() - started
+
+
+def _refresh_in_background(alias):
+    with _lock:
+        if alias in _refreshing:
+            return
+        _refreshing.add(alias)
+
+    def run():
+        try:
+            refresh_replica(alias)
+        except Exception as exc:
+            logger.warning("Refreshing the %s replica failed: %s", alias, exc)
+        finally:
+            with _lock:
+                _refreshing.discard(alias)
+
+    threading.Thread(target=run, name=f"replica-{alias}", daemon=True).start()
+
+
+def replica_for(alias):
+    """The replica alias for `alias` if it is fresh enough, otherwise `alias` itself."""
+    if replica_alias(alias) not in settings.DATABASES:
+        return alias
+    age = replica_age(alias)
+    if age is None or age > settings.READ_REPLICA_MAX_AGE:
+        _refresh_in_background(alias)
+        return alias
+    return replica_alias(alias)
+
+
+@contextmanager
+def use_replica():
+    token = _reading.set(True)
+    try:
+        yield
+    finally:
+        _reading.reset(token)
+
+
+def reads_from_replica(view):
+    """For read-only views that can show data up to READ_REPLICA_MAX_AGE old."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with use_replica():
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaRouter:
+    """Goes before TenantRouter; only has an opinion inside use_replica()."""
+
+    def db_for_read(self, model, **hints):
+        if not (_reading.get() and settings.READ_REPLICA_ENABLED) or is_shared(model):
+            return None
+        if model._meta.app_label in PRIMARY_APPS or model._meta.model_name in PRIMARY_MODELS:
+            return None
+        return replica_for(tenant_db())
+
+    def allow_relation(self, obj1, obj2, **hints):
+        db1, db2 = obj1._state.db, obj2._state.db
+        if db1 and db2 and primary_alias(db1) == primary_alias(db2):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the copy
+        if db != primary_alias(db):
+            return False
+        return None
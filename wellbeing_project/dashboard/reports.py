@@ -0,0 +1,126 @@
+from collections import defaultdict
+from datetime import date, timedelta
+
+from django.db import transaction
+from django.db.models import F, Min
+
+from .archive import TERMS, add_rollups
+from .models import MoodEntry, MoodRollup, ReportSnapshot
+from .tenants import tenant_db
+
+
+def week_bounds(day):
+    """Monday..Sunday week containing `day`."""
+    start = day - timedelta(days=day.weekday())
+    return start, start + timedelta(days=6)
+
+
+def term_bounds(day):
+    """First and last day of the school term containing `day` (see archive.TERMS)."""
+    starts = [date(day.year, month, 1) for month, _ in TERMS] + [date(day.year + 1, TERMS[0][0], 1)]
+    for start, next_start in zip(starts, starts[1:]):
+        if start <= day < next_start:
+            return start, next_start - timedelta(days=1)
+
+
+BOUNDS = {'week': week_bounds, 'term': term_bounds}
+
+
+def closed_periods(period, since, today=None):
+    """(start, end) of every `period` from the one containing `since` that ended before `today`."""
+    today = today or date.today()
+    start, end = BOUNDS[period](since)
+    while end < today:
+        yield start, end
+        start, end = BOUNDS[period](end + timedelta(days=1))
+
+
+def first_recorded_day():
+    days = [
+        MoodEntry.objects.aggregate(first=Min('date'))['first'],
+        MoodRollup.objects.aggregate(first=Min('date'))['first'],
+    ]
+    days = [d for d in days if d]
+    return min(days) if days else None
+
+
+def refresh_rollups(start, end):
+    """
+    Recount MoodRollup totals for start..end: the archived part written
+    when entries were archived, plus whatever raw entries the days still
+    have (late check-ins, restored ranges).
+    """
+    entries = MoodEntry.objects.filter(date__range=(start, end))
+    with transaction.atomic(using=tenant_db()):
+        rollups = MoodRollup.objects.filter(date__range=(start, end))
+        rollups.filter(archived=0).delete()
+        rollups.exclude(count=F('archived')).update(count=F('archived'))
+        add_rollups(entries)
+
+
+def _summary(counts, daily):
+    """Aggregates for one scope from {mood: count} and {date: {mood: count}}."""
+    checkins = sum(counts.values())
+    low = sum(counts.get(code, 0) for code in MoodEntry.LOW_MOODS)
+    valence = sum(MoodEntry.MOOD_VALENCE[code] * n for code, n in counts.items())
+    days = []
+    for day in sorted(daily):
+        day_counts = daily[day]
+        day_total = sum(day_counts.values())
+        days.append({
+            'date': day.isoformat(),
+            'checkins': day_total,
+            'average_valence': round(
+                sum(MoodEntry.MOOD_VALENCE[code] * n for code, n in day_counts.items()) / day_total, 2
+            ),
+        })
+    return {
+        'checkins': checkins,
+        'days_with_data': len(days),
+        'moods': {MoodEntry.MOOD_SLUGS[code]: n for code, n in sorted(counts.items())},
+        'low_mood_count': low,
+        'low_mood_percent': round(low / checkins * 100, 1) if checkins else 0,
+        'average_valence': round(valence / checkins, 2) if checkins else None,
+        'daily': days,
+    }
+
+
+def summarize(start, end):
+    """
+    School-wide and per-class summaries for start..end, aggregated from
+    MoodRollup in one query. Returns (school, {class_group: summary}).
+    """
+    refresh_rollups(start, end)
+    rows = MoodRollup.objects.filter(date__range=(start, end)).values_list('date', 'class_group', 'mood', 'count')
+
+    counts = defaultdict(lambda: defaultdict(int))
+    daily = defaultdict(lambda: defaultdict(lambda: defaultdict(int)))
+    for day, class_group, mood, count in rows:
+        for scope in (None, class_group):
+            counts[scope][mood] += count
+            daily[scope][day][mood] += count
+
+    school = _summary(counts.pop(None, {}), daily.pop(None, {}))
+    classes = {group: _summary(counts[group], daily[group]) for group in sorted(counts)}
+    return school, classes
+
+
+def build_snapshot(period, start, end, rebuild=False):
+    """
+    Store the snapshot rows for one closed period. Existing snapshots are
+    left alone unless `rebuild` is set. Returns the number of rows written.
+    """
+    existing = ReportSnapshot.objects.filter(period=period, start=start)
+    if existing.exists() and not rebuild:
+        return 0
+
+    school, classes = summarize(start, end)
+    snapshots = [ReportSnapshot(period=period, start=start, end=end, scope='school', data=school)]
+    snapshots += [
+        ReportSnapshot(period=period, start=start, end=end, scope='class', class_group=group, data=summary)
+        for group, summary in classes.items()
+    ]
+    with transaction.atomic(using=tenant_db()):
+        existing.delete()
+        ReportSnapshot.objects.bulk_create(snapshots)
+    return len(snapshots)
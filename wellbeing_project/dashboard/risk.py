@@ -0,0 +1,63 @@
+import re
+from functools import lru_cache
+
+from django.conf import settings
+
+# Comments are checked for worrying phrases when they are saved, and the
+# result kept on the entry as a bitmask (MoodEntry.risk_flags), so the
+# dashboard can list flagged students without reading any text.
+#
+# The categories and their bits are fixed here; the phrases for each come
+# from settings.COMMENT_RISK_KEYWORDS. A phrase matches as whole words,
+# case-insensitively, with any run of spaces or hyphens between words; a
+# trailing "*" matches any word ending ("abus*" -> abuse, abused, abusive).
+# After changing the phrases run `manage.py flag_comments`.
+
+RISK_CATEGORIES = [
+    ('self_harm', 'Self-harm'),
+    ('bullying', 'Bullying'),
+    ('unsafe', 'Unsafe at home'),
+    ('hopeless', 'Hopelessness'),
+]
+RISK_BITS = {name: 1 << i for i, (name, _) in enumerate(RISK_CATEGORIES)}
+
+
+def _pattern(phrase):
+    words = phrase.lower().split()
+    wildcard = words[-1].endswith('*')
+    words[-1] = words[-1].rstrip('*')
+    body = r'[\s\-]+'.join(re.escape(w) for w in words)
+    return rf"\b{body}\w*" if wildcard else rf"\b{body}\b"
+
+
+@lru_cache(maxsize=4)
+def _compile(keywords):
+    # One alternation with a named group per category: a single pass over the text
+    groups = [
+        f"(?P<{name}>{'|'.join(_pattern(p) for p in phrases)})"
+        for name, phrases in keywords
+        if phrases
+    ]
+    return re.compile('|'.join(groups), re.IGNORECASE) if groups else None
+
+
+def matcher():
+    keywords = getattr(settings, 'COMMENT_RISK_KEYWORDS', {})
+    return _compile(tuple(
+        (name, tuple(keywords.get(name, ()))) for name, _ in RISK_CATEGORIES
+    ))
+
+
+def comment_risk(comment, pattern=None):
+    """Bitmask of the RISK_CATEGORIES whose phrases appear in `comment`."""
+    pattern = pattern or matcher()
+    if not comment or pattern is None:
+        return 0
+    flags = 0
+    for match in pattern.finditer(comment):
+        flags |= RISK_BITS[match.lastgroup]
+    return flags
+
+
+def risk_labels(flags):
+    return [label for name, label in RISK_CATEGORIES if flags & RISK_BITS[name]]
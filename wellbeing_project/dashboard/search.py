@@ -0,0 +1,159 @@
+from django.db import connections, router
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+from django.utils.text import Truncator
+
+from .models import MoodEntry
+from .tenants import tenant_connection
+
+# External-content FTS5 index over MoodEntry.comment. The triggers keep it
+# in step with the table; rowid is the MoodEntry id.
+FTS_TABLE = 'dashboard_moodentry_fts'
+
+CREATE_SQL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        comment, content='dashboard_moodentry', content_rowid='id',
+        tokenize='porter unicode61'
+    )""",
+]
+
+TRIGGER_SQL = [
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON dashboard_moodentry BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, comment) VALUES (new.id, new.comment);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON dashboard_moodentry BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, comment) VALUES ('delete', old.id, old.comment);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF comment ON dashboard_moodentry BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, comment) VALUES ('delete', old.id, old.comment);
+        INSERT INTO {FTS_TABLE}(rowid, comment) VALUES (new.id, new.comment);
+    END""",
+]
+
+DROP_SQL = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+
+def fts_supported(conn=None):
+    conn = conn or tenant_connection()
+    if conn.vendor != 'sqlite':
+        return False
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        if cursor.fetchone()[0]:
+            return True
+        # Some builds load FTS5 without advertising the compile option
+        cursor.execute("SELECT 1 FROM pragma_module_list WHERE name = 'fts5'")
+        return cursor.fetchone() is not None
+
+
+def read_connection():
+    """The connection MoodEntry reads go to (the school's database, or its replica)."""
+    return connections[router.db_for_read(MoodEntry)]
+
+
+def fts_installed(conn=None):
+    conn = conn or read_connection()
+    if conn.vendor != 'sqlite':
+        return False
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+        return cursor.fetchone() is not None
+
+
+def install_comment_index(conn=None, rebuild=False):
+    """Create the FTS table and triggers if missing; index existing rows when new."""
+    conn = conn or tenant_connection()
+    if not fts_supported(conn):
+        return False
+    created = not fts_installed(conn)
+    with conn.cursor() as cursor:
+        for sql in CREATE_SQL + TRIGGER_SQL:
+            cursor.execute(sql)
+        if created or rebuild:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    return True
+
+
+def drop_comment_index(conn=None):
+    conn = conn or tenant_connection()
+    if conn.vendor != 'sqlite':
+        return
+    with conn.cursor() as cursor:
+        for sql in DROP_SQL:
+            cursor.execute(sql)
+
+
+def fts_query(term):
+    """Turn free text into an FTS5 query: every word must match, as a prefix."""
+    words = [w.replace('"', '""') for w in term.split()]
+    return ' '.join(f'"{w}"*' for w in words if w)
+
+
+def comment_search_q(term, using=None):
+    """Q matching MoodEntry rows whose comment contains `term`, for a queryset read from `using`."""
+    query = fts_query(term)
+    if not query:
+        return Q(pk__in=[])
+    if fts_installed(connections[using] if using else None):
+        return Q(id__in=RawSQL(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [query]
+        ))
+    return Q(comment__icontains=term)
+
+
+# snippet() wraps hits in these; they are swapped for <mark> after escaping
+HIT_START, HIT_END = '\x02', '\x03'
+
+
+def _highlight(snippet):
+    return mark_safe(escape(snippet).replace(HIT_START, '<mark>').replace(HIT_END, '</mark>'))
+
+
+def search_comments(term, limit=50):
+    """
+    Comments matching `term`, best match first (BM25), as a list of
+    {'entry', 'score', 'snippet_html'} dicts. Without FTS5 this falls back
+    to a newest-first icontains scan.
+    """
+    query = fts_query(term)
+    if not query:
+        return []
+
+    # The MATCH and the entry lookup must read the same database
+    alias = router.db_for_read(MoodEntry)
+    entries = MoodEntry.objects.using(alias).select_related('user', 'user__userprofile')
+
+    if not fts_installed(connections[alias]):
+        matches = entries.filter(comment__icontains=term.strip()).order_by('-date', '-id')[:limit]
+        return [
+            {
+                'entry': entry,
+                'score': None,
+                'snippet_html': escape(Truncator(entry.comment).words(24)),
+            }
+            for entry in matches
+        ]
+
+    with connections[alias].cursor() as cursor:
+        cursor.execute(
+            f"""SELECT rowid, bm25({FTS_TABLE}),
+                       snippet({FTS_TABLE}, 0, %s, %s, '…', 24)
+                FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s
+                ORDER BY rank LIMIT %s""",
+            [HIT_START, HIT_END, query, limit],
+        )
+        hits = cursor.fetchall()
+
+    by_id = entries.in_bulk([rowid for rowid, _, _ in hits])
+    return [
+        {'entry': by_id[rowid], 'score': round(-score, 3), 'snippet_html': _highlight(snippet)}
+        for rowid, score, snippet in hits
+        if rowid in by_id
+    ]
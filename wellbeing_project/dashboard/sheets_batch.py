@@ -0,0 +1,118 @@
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+logger = logging.getLogger(__name__)
+
+# Request-scoped Sheets reads. Inside read_scope() (opened for every request
+# by SheetsReadScopeMiddleware) all worksheet reads share one
+# SheetsReadBatch: the first read fetches every range declared so far in a
+# single values_batch_get, and parsed values are kept for the rest of the
+# request. Code that knows what it will read can name the ranges up front,
+# e.g. `with read_scope('Users', 'MoodEntries'):` or declare() inside a
+# scope, so they come together. SheetsReadScopeMiddleware declares each
+# view's worksheets before the view runs.
+
+
+class _Scope:
+    def __init__(self):
+        self.declared = []
+        self.batch = None
+
+
+_scope = ContextVar('sheets_read_scope', default=None)
+
+
+def numericise(value):
+    """Cells that read as numbers become int or float, as in gspread's get_all_records()."""
+    # Same rules as gspread.utils.numericise with its defaults
+    if not isinstance(value, str) or '_' in value:
+        return value
+    cleaned = value.replace(',', '')
+    for kind in (int, float):
+        try:
+            return kind(cleaned)
+        except ValueError:
+            pass
+    return value
+
+
+def _a1(range_name):
+    # A bare worksheet title means the whole worksheet
+    if '!' in range_name:
+        return range_name
+    return "'{}'".format(range_name.replace("'", "''"))
+
+
+class SheetsReadBatch:
+    def __init__(self, sheet, ranges=()):
+        self.sheet = sheet
+        self.pending = list(ranges)
+        self.values = {}
+        self._records = {}
+        self.round_trips = 0
+
+    def want(self, *ranges):
+        for range_name in ranges:
+            if range_name not in self.values and range_name not in self.pending:
+                self.pending.append(range_name)
+
+    def get(self, range_name):
+        """Rows of `range_name`, fetching it with everything else pending if needed."""
+        if range_name not in self.values:
+            self.want(range_name)
+            ranges, self.pending = self.pending, []
+            response = self.sheet.values_batch_get([_a1(r) for r in ranges])
+            self.round_trips += 1
+            for name, value_range in zip(ranges, response.get('valueRanges', [])):
+                self.values[name] = value_range.get('values', [])
+        return self.values[range_name]
+
+    def records(self, title):
+        """Worksheet rows as dicts keyed by the header row, typed like get_all_records()."""
+        if title not in self._records:
+            header, *rows = self.get(title) or [[]]
+            self._records[title] = [
+                dict(zip(header, map(numericise, row + [''] * (len(header) - len(row))))) for row in rows
+            ]
+        # Callers sort and filter; the memoized list stays intact
+        return list(self._records[title])
+
+
+def declare(*ranges):
+    """Fetch `ranges` with the current scope's next read; does nothing outside a scope."""
+    scope = _scope.get()
+    if scope is None:
+        return
+    scope.declared.extend(r for r in ranges if r not in scope.declared)
+    if scope.batch is not None:
+        scope.batch.want(*ranges)
+
+
+@contextmanager
+def read_scope(*ranges):
+    """Share one SheetsReadBatch between all reads in the block."""
+    if _scope.get() is not None:
+        declare(*ranges)
+        yield
+        return
+    scope = _Scope()
+    token = _scope.set(scope)
+    declare(*ranges)
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+        if scope.batch is not None:
+            logger.debug("Sheets reads: %s round trip(s) for %s", scope.batch.round_trips, list(scope.batch.values))
+
+
+def batch_for(sheet):
+    """The current request's batch for `sheet`, or a one-off batch outside a scope."""
+    scope = _scope.get()
+    if scope is None:
+        return SheetsReadBatch(sheet)
+    if scope.batch is None or scope.batch.sheet is not sheet:
+        scope.batch = SheetsReadBatch(sheet, scope.declared)
+    return scope.batch
+
@@ -0,0 +1,248 @@
+import logging
+import random
+import socket
+import sys
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Every Sheets request goes through SheetsClient.call(): a token bucket keeps
+# the process under the per-minute quota, 429/5xx responses and network
+# errors are retried with jittered exponential backoff, identical reads already in flight are shared
+# instead of repeated, and each call is counted in `metrics`.
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+READ_METHODS = {'get_all_values', 'get_all_records', 'row_values', 'col_values', 'find', 'batch_get', 'get'}
+
+
+class SheetsUnavailable(Exception):
+    """The Sheets API could not be reached within the request's budget."""
+
+
+class TokenBucket:
+    """`rate` tokens per minute, holding at most `burst`."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate / 60.0
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, timeout):
+        """Take a token, waiting up to `timeout` seconds. False if none came free."""
+        deadline = time.monotonic() + timeout
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class SheetsMetrics:
+    """Per-method counters and latency, shared by every client in the process."""
+
+    FIELDS = ('calls', 'errors', 'retries', 'throttled', 'coalesced')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.counts = defaultdict(lambda: dict.fromkeys(self.FIELDS, 0))
+        self.latency = defaultdict(lambda: {'total': 0.0, 'max': 0.0})
+
+    def incr(self, method, field):
+        with self.lock:
+            self.counts[method][field] += 1
+
+    def observe(self, method, seconds):
+        with self.lock:
+            stats = self.latency[method]
+            stats['total'] += seconds
+            stats['max'] = max(stats['max'], seconds)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                method: {
+                    **counts,
+                    'latency_total': round(self.latency[method]['total'], 4),
+                    'latency_max': round(self.latency[method]['max'], 4),
+                }
+                for method, counts in self.counts.items()
+            }
+
+
+metrics = SheetsMetrics()
+
+
+class _InFlight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def _status(exc):
+    # gspread's APIError (and the fake's) carry the HTTP response
+    response = getattr(exc, 'response', None)
+    return getattr(response, 'status_code', None)
+
+
+def _transport_error(exc):
+    # requests is only loaded with gspread; if it isn't, nothing raised its errors
+    if isinstance(exc, (ConnectionError, TimeoutError, socket.gaierror)):
+        return True
+    requests = sys.modules.get('requests')
+    return requests is not None and isinstance(exc, (requests.ConnectionError, requests.Timeout))
+
+
+def _retry_after(exc):
+    headers = getattr(getattr(exc, 'response', None), 'headers', None) or {}
+    try:
+        return float(headers.get('Retry-After', 0))
+    except ValueError:
+        return 0
+
+
+class SheetsClient:
+    def __init__(self, rate=None, burst=None, max_retries=None, budget_wait=None):
+        self.bucket = TokenBucket(
+            rate or settings.SHEETS_QUOTA_PER_MINUTE, burst or settings.SHEETS_QUOTA_BURST,
+        )
+        self.max_retries = settings.SHEETS_MAX_RETRIES if max_retries is None else max_retries
+        self.budget_wait = settings.SHEETS_BUDGET_WAIT if budget_wait is None else budget_wait
+        self.backoff_base = 0.5
+        self.backoff_cap = 4.0
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def call(self, method, fn, *args, coalesce_key=None, **kwargs):
+        """Run fn(*args, **kwargs) under the quota; raises SheetsUnavailable when it cannot."""
+        if coalesce_key is None:
+            return self._execute(method, fn, args, kwargs)
+
+        with self._lock:
+            pending = self._inflight.get(coalesce_key)
+            leader = pending is None
+            if leader:
+                pending = self._inflight[coalesce_key] = _InFlight()
+
+        if not leader:
+            metrics.incr(method, 'coalesced')
+            pending.done.wait()
+            if pending.error is not None:
+                raise pending.error
+            # Callers sort and filter what they get back; give each its own list
+            return list(pending.result) if isinstance(pending.result, list) else pending.result
+
+        try:
+            pending.result = self._execute(method, fn, args, kwargs)
+            return pending.result
+        except Exception as exc:
+            pending.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[coalesce_key]
+            pending.done.set()
+
+    def _execute(self, method, fn, args, kwargs):
+        attempt = 0
+        while True:
+            if not self.bucket.acquire(self.budget_wait):
+                metrics.incr(method, 'throttled')
+                raise SheetsUnavailable(f"Sheets quota exhausted ({method})")
+
+            metrics.incr(method, 'calls')
+            started = time.monotonic()
+            try:
+                return fn(*args, **kwargs)
+            except Exception as exc:
+                metrics.incr(method, 'errors')
+                status = _status(exc)
+                if status in RETRY_STATUSES:
+                    problem = f"returned {status}"
+                elif _transport_error(exc):
+                    problem = f"unreachable: {exc.__class__.__name__}"
+                else:
+                    raise
+                if attempt >= self.max_retries:
+                    raise SheetsUnavailable(f"Sheets {problem} ({method})") from exc
+                # Full jitter keeps workers that hit the limit together from retrying together
+                delay = max(
+                    random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt)),
+                    min(_retry_after(exc), self.backoff_cap),
+                )
+                metrics.incr(method, 'retries')
+                logger.info("Sheets %s %s; retry %s in %.2fs", method, problem, attempt + 1, delay)
+                time.sleep(delay)
+                attempt += 1
+            finally:
+                metrics.observe(method, time.monotonic() - started)
+
+
+class ThrottledWorksheet:
+    """Worksheet whose API methods go through a SheetsClient."""
+
+    def __init__(self, client, worksheet):
+        self._client = client
+        self._worksheet = worksheet
+        self.title = worksheet.title
+
+    def __getattr__(self, name):
+        attr = getattr(self._worksheet, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            key = None
+            if name in READ_METHODS:
+                key = (self.title, name, repr(args), repr(sorted(kwargs.items())))
+            return self._client.call(f"{self.title}.{name}", attr, *args, coalesce_key=key, **kwargs)
+        return call
+
+
+class ThrottledSpreadsheet:
+    """Spreadsheet wrapper; worksheet handles are fetched once and reused."""
+
+    def __init__(self, client, spreadsheet):
+        self._client = client
+        self._spreadsheet = spreadsheet
+        self._worksheets = {}
+        self._lock = threading.Lock()
+
+    def worksheet(self, title):
+        with self._lock:
+            ws = self._worksheets.get(title)
+        if ws is not None:
+            return ws
+        # gspread fetches sheet metadata for this, so it is a billed call too.
+        # Fetched outside the lock so other worksheets aren't held up; callers
+        # after the same title share the one request.
+        ws = self._client.call(
+            'worksheet', self._spreadsheet.worksheet, title, coalesce_key=('worksheet', title),
+        )
+        with self._lock:
+            return self._worksheets.setdefault(title, ThrottledWorksheet(self._client, ws))
+
+    def values_batch_get(self, ranges, params=None):
+        return self._client.call(
+            'values_batch_get', self._spreadsheet.values_batch_get, ranges, params,
+            coalesce_key=('values_batch_get', tuple(ranges), repr(params)),
+        )
+
+    def __getattr__(self, name):
+        return getattr(self._spreadsheet, name)
@@ -1,56 +1,99 @@
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
+import functools
 import json
+import logging
 import os
 from datetime import datetime
-import hashlib
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.utils.functional import SimpleLazyObject
+
+from .hashers import check_sheets_password
+from .sheets_batch import batch_for
+from .sheets_client import SheetsClient, SheetsUnavailable, ThrottledSpreadsheet
+
+logger = logging.getLogger(__name__)
+
+
+def degrade_to(empty):
+    """When Sheets is unavailable, log and return empty() instead of raising."""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            try:
+                return method(self, *args, **kwargs)
+            except SheetsUnavailable as exc:
+                logger.warning("SheetsDB.%s degraded: %s", method.__name__, exc)
+                return empty()
+        return wrapper
+    return decorator
+
 
 class SheetsDB:
+    """
+    Thin data layer over the Google Sheet. All requests go through a
+    rate-limited SheetsClient; when the quota or the API gives out, reads
+    come back empty and writes return False instead of raising, except
+    get_user_by_email which raises SheetsUnavailable so login can say so.
+    """
+
     def __init__(self):
         # Get credentials from environment variable
         creds_json = os.environ.get('GOOGLE_SHEETS_CREDS')
-        if creds_json:
+        self.client = None
+        self.sheet = None
+        if settings.GOOGLE_SHEETS_ENABLED and settings.GOOGLE_SHEETS_FAKE_PATH:
+            from .sheets_fake import FakeSpreadsheet
+
+            self.sheet = ThrottledSpreadsheet(SheetsClient(), FakeSpreadsheet(settings.GOOGLE_SHEETS_FAKE_PATH))
+        elif settings.GOOGLE_SHEETS_ENABLED and creds_json:
+            # Imported here so processes that never touch Sheets skip them
+            import gspread
+            from oauth2client.service_account import ServiceAccountCredentials
+
             creds_dict = json.loads(creds_json)
             scope = ['https://spreadsheets.google.com/feeds',
                     'https://www.googleapis.com/auth/drive']
             creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
             self.client = gspread.authorize(creds)
             sheet_id = os.environ.get('SHEET_ID')
-            self.sheet = self.client.open_by_key(sheet_id)
-        else:
-            self.client = None
-            self.sheet = None
+            api = SheetsClient()
+            self.sheet = ThrottledSpreadsheet(api, api.call('open_by_key', self.client.open_by_key, sheet_id))
     
+    def _records(self, title):
+        # Shared with every other read in this request; see sheets_batch.py
+        return batch_for(self.sheet).records(title)
+
     def get_user_by_email(self, email):
         if not self.sheet:
             return None
-        users = self.sheet.worksheet('Users')
-        try:
-            cell = users.find(email)
-            row = users.row_values(cell.row)
-            return {
-                'username': row[0],
-                'email': row[1],
-                'password': row[2],
-                'user_type': row[3],
-                'first_name': row[4] if len(row) > 4 else ''
-            }
-        except:
-            return None
+        for record in self._records('Users'):
+            if str(record.get('email', '')).strip().lower() == email.strip().lower():
+                # Records are numericised like get_all_records(); these are always text
+                return {
+                    'username': str(record['username']),
+                    'email': record['email'],
+                    'password': str(record['password']),
+                    'user_type': record['user_type'],
+                    'first_name': record.get('first_name', ''),
+                }
+        return None
     
+    @degrade_to(bool)
     def create_user(self, username, email, password, user_type, first_name=''):
         if not self.sheet:
             return False
         users = self.sheet.worksheet('Users')
-        # Hash password
-        hashed = hashlib.sha256(password.encode()).hexdigest()
+        # Same hash format as the Django user table
+        hashed = make_password(password)
         users.append_row([username, email, hashed, user_type, first_name])
         return True
     
     def verify_password(self, stored_password, provided_password):
-        hashed = hashlib.sha256(provided_password.encode()).hexdigest()
-        return stored_password == hashed
+        # Accepts Django hashes as well as the old unsalted SHA-256 ones
+        return check_sheets_password(provided_password, stored_password)
     
+    @degrade_to(bool)
     def add_mood_entry(self, username, mood, comment=''):
         if not self.sheet:
             return False
@@ -60,11 +103,11 @@ class SheetsDB:
         moods.append_row([username, date, mood, comment, timestamp])
         return True
     
+    @degrade_to(list)
     def get_mood_entries(self, username=None, days=30):
         if not self.sheet:
             return []
-        moods = self.sheet.worksheet('MoodEntries')
-        all_records = moods.get_all_records()
+        all_records = self._records('MoodEntries')
         
         if username:
             all_records = [r for r in all_records if r['username'] == username]
@@ -73,11 +116,11 @@ class SheetsDB:
         all_records.sort(key=lambda x: x['timestamp'], reverse=True)
         return all_records[:days]
     
+    @degrade_to(dict)
     def get_todays_mood_summary(self):
         if not self.sheet:
             return {}
-        moods = self.sheet.worksheet('MoodEntries')
-        all_records = moods.get_all_records()
+        all_records = self._records('MoodEntries')
         today = datetime.now().strftime('%Y-%m-%d')
         
         today_moods = [r for r in all_records if r['date'] == today]
@@ -89,12 +132,12 @@ class SheetsDB:
         
         return summary
     
+    @degrade_to(list)
     def get_all_users(self, user_type='student'):
         if not self.sheet:
             return []
-        users = self.sheet.worksheet('Users')
-        all_records = users.get_all_records()
+        all_records = self._records('Users')
         return [r for r in all_records if r['user_type'] == user_type]
 
-# Global instance
-db = SheetsDB()
\ No newline at end of file
+# Global instance, connected on first use
+db = SimpleLazyObject(SheetsDB)
\ No newline at end of file
@@ -0,0 +1,194 @@
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter, deque, namedtuple
+
+from .sheets_batch import numericise
+
+# In-memory stand-in for the parts of gspread the app uses, for local
+# development and benchmarks without Google credentials. Point
+# GOOGLE_SHEETS_FAKE_PATH at a JSON file to keep the sheet between runs.
+# `calls` counts API requests the way Google would bill them, and the
+# quota/latency/failure_rate options make it misbehave like the real API.
+
+HEADERS = {
+    'Users': ['username', 'email', 'password', 'user_type', 'first_name'],
+    'MoodEntries': ['username', 'date', 'mood', 'comment', 'timestamp'],
+}
+
+Cell = namedtuple('Cell', 'row col value')
+
+A1_RANGE = re.compile(r'^([A-Z]+)(\d*)(?::([A-Z]+)(\d*))?$')
+
+
+def _col(letters):
+    n = 0
+    for ch in letters:
+        n = n * 26 + ord(ch) - 64
+    return n
+
+
+def _parse_range(a1):
+    """'A2:E' -> (first_row, last_row or None, first_col, last_col), 1-based."""
+    match = A1_RANGE.match(a1.split('!')[-1])
+    if not match:
+        raise ValueError(f"Unsupported range {a1!r}")
+    c1, r1, c2, r2 = match.groups()
+    return int(r1 or 1), int(r2) if r2 else None, _col(c1), _col(c2 or c1)
+
+
+def _trim(rows):
+    # The Sheets API drops trailing empty cells and rows
+    rows = [list(r) for r in rows]
+    for row in rows:
+        while row and row[-1] == '':
+            row.pop()
+    while rows and not rows[-1]:
+        rows.pop()
+    return rows
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class FakeAPIError(Exception):
+    """Shaped like gspread.exceptions.APIError: the HTTP response is on .response."""
+
+    def __init__(self, status_code, message, headers=None):
+        super().__init__(f"[{status_code}]: {message}")
+        self.response = FakeResponse(status_code, headers)
+        self.code = status_code
+
+
+class FakeWorksheet:
+    def __init__(self, spreadsheet, title, rows):
+        self.spreadsheet = spreadsheet
+        self.title = title
+        self.rows = rows
+
+    def _call(self):
+        self.spreadsheet.request(self.title)
+
+    def _read(self, a1):
+        first_row, last_row, first_col, last_col = _parse_range(a1)
+        last_row = last_row or len(self.rows)
+        return _trim(
+            [(row + [''] * last_col)[first_col - 1:last_col] for row in self.rows[first_row - 1:last_row]]
+        )
+
+    def _write(self, a1, values):
+        first_row, _, first_col, _ = _parse_range(a1)
+        for offset, values_row in enumerate(values):
+            index = first_row - 1 + offset
+            while len(self.rows) <= index:
+                self.rows.append([])
+            row = self.rows[index]
+            row.extend([''] * (first_col - 1 + len(values_row) - len(row)))
+            row[first_col - 1:first_col - 1 + len(values_row)] = [str(v) for v in values_row]
+
+    def get_all_values(self):
+        self._call()
+        return _trim(self.rows)
+
+    def get_all_records(self):
+        self._call()
+        header, *rows = _trim(self.rows) or [[]]
+        return [dict(zip(header, map(numericise, row + [''] * (len(header) - len(row))))) for row in rows]
+
+    def row_values(self, row):
+        self._call()
+        return _trim([self.rows[row - 1]])[0] if row <= len(self.rows) else []
+
+    def find(self, query):
+        self._call()
+        for r, row in enumerate(self.rows, start=1):
+            for c, value in enumerate(row, start=1):
+                if value == query:
+                    return Cell(r, c, value)
+        return None
+
+    def batch_get(self, ranges):
+        self._call()
+        return [self._read(a1) for a1 in ranges]
+
+    def batch_update(self, data):
+        self._call()
+        for item in data:
+            self._write(item['range'], item['values'])
+        self.spreadsheet.save()
+
+    def update(self, range_name, values):
+        self.batch_update([{'range': range_name, 'values': values}])
+
+    def append_row(self, values):
+        self.append_rows([values])
+
+    def append_rows(self, values):
+        self._call()
+        # Like the API, the rows go after the last non-empty row
+        del self.rows[len(_trim(self.rows)):]
+        first = len(self.rows) + 1
+        self.rows.extend([str(v) for v in row] for row in values)
+        self.spreadsheet.save()
+        width = max((len(row) for row in values), default=1)
+        return {'updates': {
+            'updatedRange': f"'{self.title}'!A{first}:{chr(64 + width)}{len(self.rows)}",
+            'updatedRows': len(values),
+        }}
+
+
+class FakeSpreadsheet:
+    def __init__(self, path=None, quota_per_minute=None, latency=0.0, failure_rate=0.0):
+        self.path = path
+        self.calls = Counter()
+        self.quota_per_minute = quota_per_minute
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self._recent = deque()
+        self._lock = threading.Lock()
+        self.data = {title: [list(header)] for title, header in HEADERS.items()}
+        if path and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.data.update(json.load(f))
+
+    def request(self, title):
+        """Account for one API request, failing the way Google does when asked to."""
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.calls[title] += 1
+            if self.quota_per_minute is not None:
+                now = time.monotonic()
+                while self._recent and now - self._recent[0] > 60:
+                    self._recent.popleft()
+                if len(self._recent) >= self.quota_per_minute:
+                    raise FakeAPIError(429, "Quota exceeded for quota metric 'Read requests'")
+                self._recent.append(now)
+        if self.failure_rate and random.random() < self.failure_rate:
+            raise FakeAPIError(503, "The service is currently unavailable.")
+
+    def values_batch_get(self, ranges, params=None):
+        self.request('values_batch_get')
+        value_ranges = []
+        for a1 in ranges:
+            title, _, cells = a1.partition('!')
+            title = title.strip("'").replace("''", "'")
+            ws = FakeWorksheet(self, title, self.data.get(title, []))
+            value_ranges.append({'range': a1, 'values': ws._read(cells) if cells else _trim(ws.rows)})
+        return {'valueRanges': value_ranges}
+
+    def worksheet(self, title):
+        if title not in self.data:
+            self.data[title] = []
+        return FakeWorksheet(self, title, self.data[title])
+
+    def save(self):
+        if self.path:
+            with open(self.path, 'w', encoding='utf-8') as f:
+                json.dump(self.data, f, ensure_ascii=False)
@@ -0,0 +1,203 @@
+import re
+from collections import Counter
+from datetime import date, datetime
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from .heatmap import forget_history
+from .models import MoodEntry, SyncCheckpoint
+from .risk import comment_risk
+from .tenants import tenant_db
+
+# Two-way sync between the MoodEntries worksheet and MoodEntry, keyed by
+# (username, date). Each run makes at most three Sheets requests: one
+# batch_get for the key columns plus the rows appended since the last run,
+# one batch_update for changed rows and one append_rows for new ones.
+#
+# A SyncCheckpoint remembers how many sheet rows have been read and up to
+# when local changes have been pushed, so a normal run only looks at new
+# sheet rows and entries whose updated_at moved. `full=True` re-reads the
+# whole sheet, which also catches edits to older rows. When both sides
+# changed the same key, `prefer` decides. Deletions are not propagated.
+
+WORKSHEET = 'MoodEntries'
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+UPDATED_RANGE = re.compile(r'![A-Z]+(\d+):[A-Z]+(\d+)$')
+
+
+def sheet_row(entry):
+    """MoodEntry as a MoodEntries row, in SheetsDB.add_mood_entry's layout."""
+    return [
+        entry.user.username,
+        entry.date.isoformat(),
+        entry.mood_slug,
+        entry.comment or '',
+        timezone.localtime(entry.timestamp).strftime(TIMESTAMP_FORMAT),
+    ]
+
+
+def _same(row, entry):
+    username, day, mood, comment = (list(row) + [''] * 4)[:4]
+    return [username.strip(), day.strip(), mood.strip().lower(), comment] == sheet_row(entry)[:4]
+
+
+def _parse(row):
+    """(username, day, mood code, comment, timestamp) or None if the row is unusable."""
+    row = list(row) + [''] * (5 - len(row))
+    username, day, mood, comment, stamp = (v.strip() if i != 3 else v for i, v in enumerate(row[:5]))
+    code = MoodEntry.MOOD_CODES.get(mood.lower())
+    try:
+        day = date.fromisoformat(day)
+    except ValueError:
+        return None
+    if not username or code is None:
+        return None
+    try:
+        stamp = timezone.make_aware(datetime.strptime(stamp, TIMESTAMP_FORMAT))
+    except ValueError:
+        stamp = None
+    return username, day, code, comment, stamp
+
+
+def _entries_for(keys):
+    """Existing MoodEntry rows for (username, iso date) keys."""
+    if not keys:
+        return {}
+    usernames = {u for u, _ in keys}
+    days = {d for _, d in keys}
+    entries = MoodEntry.objects.select_related('user').filter(user__username__in=usernames, date__in=days)
+    found = {(e.user.username, e.date.isoformat()): e for e in entries}
+    return {k: e for k, e in found.items() if k in keys}
+
+
+def sync_moods(sheet, full=False, prefer='db', dry_run=False):
+    """Run one sync against `sheet` (a gspread Spreadsheet or FakeSpreadsheet). Returns a Counter."""
+    started = timezone.now()
+    stats = Counter()
+    checkpoint, _ = SyncCheckpoint.objects.get_or_create(name=WORKSHEET)
+    incremental = not full and checkpoint.db_synced_at is not None
+    first_new = max(checkpoint.sheet_rows + 1, 2) if incremental else 2
+
+    ws = sheet.worksheet(WORKSHEET)
+    key_block, new_block = ws.batch_get(['A2:B', f'A{first_new}:E'])
+
+    # Row number of every key in the sheet; a repeated key means the last row
+    index = {}
+    for row_no, row in enumerate(key_block, start=2):
+        if len(row) >= 2 and row[0].strip():
+            index[(row[0].strip(), row[1].strip())] = row_no
+    sheet_end = 1 + len(key_block)
+
+    remote = {}
+    for row_no, row in enumerate(new_block, start=first_new):
+        if len(row) >= 2 and row[0].strip():
+            remote[(row[0].strip(), row[1].strip())] = row
+
+    local = MoodEntry.objects.select_related('user').filter(user__isnull=False)
+    if incremental:
+        local = local.filter(updated_at__gt=checkpoint.db_synced_at)
+    local = {(e.user.username, e.date.isoformat()): e for e in local}
+    if checkpoint.db_synced_at:
+        changed_locally = {k for k, e in local.items() if e.updated_at > checkpoint.db_synced_at}
+    else:
+        changed_locally = set(local)
+
+    existing = dict(local) if not incremental else {**_entries_for(set(remote) - set(local)), **local}
+
+    # Sheet -> database
+    pull = {}
+    for key, row in remote.items():
+        entry = existing.get(key)
+        if entry is not None and _same(row, entry):
+            continue
+        if key in changed_locally:
+            stats['conflicts'] += 1
+            if prefer == 'db':
+                continue
+        pull[key] = row
+
+    # Database -> sheet
+    push = {}
+    for key, entry in local.items():
+        if key in pull:
+            continue
+        row = remote.get(key)
+        if row is not None and _same(row, entry):
+            continue
+        if row is not None and key not in changed_locally:
+            continue  # the sheet side changed; pulled above
+        push[key] = entry
+
+    if not dry_run:
+        _apply_pull(pull, existing, started, stats)
+    else:
+        stats['pulled'] = len(pull)
+
+    updates = [
+        {'range': f'A{index[key]}:E{index[key]}', 'values': [sheet_row(entry)]}
+        for key, entry in push.items() if key in index
+    ]
+    appends = [sheet_row(entry) for key, entry in push.items() if key not in index]
+    stats['pushed_updated'], stats['pushed_appended'] = len(updates), len(appends)
+    if not dry_run:
+        if updates:
+            ws.batch_update(updates)
+        checkpoint.sheet_rows = sheet_end
+        if appends:
+            response = ws.append_rows(appends)
+            first, last = _appended_rows(response)
+            # Rows someone else added after our read sit before ours; leave the
+            # checkpoint where it was so the next run reads them
+            if first == sheet_end + 1:
+                checkpoint.sheet_rows = last
+        checkpoint.db_synced_at = started
+        checkpoint.save()
+    return stats
+
+
+def _appended_rows(response):
+    """(first, last) sheet row numbers from an append's updates.updatedRange, e.g. "'MoodEntries'!A12:E14"."""
+    match = UPDATED_RANGE.search(response['updates']['updatedRange'])
+    return int(match.group(1)), int(match.group(2))
+
+
+def _apply_pull(pull, existing, started, stats):
+    parsed = {}
+    for key, row in pull.items():
+        record = _parse(row)
+        if record is None:
+            stats['skipped_invalid'] += 1
+        else:
+            parsed[key] = record
+
+    users = dict(User.objects.filter(
+        username__in={username for username, *_ in parsed.values()}
+    ).values_list('username', 'id'))
+
+    changed, created = [], []
+    for key, (username, day, code, comment, stamp) in parsed.items():
+        if username not in users:
+            stats['skipped_unknown_user'] += 1
+            continue
+        entry = existing.get(key) or MoodEntry(user_id=users[username])
+        entry.mood, entry.valence, entry.comment = code, MoodEntry.MOOD_VALENCE[code], comment
+        entry.risk_flags = comment_risk(comment)
+        # Stamped with the run's start so the next run does not echo it back
+        entry.updated_at = started
+        if entry.pk:
+            changed.append(entry)
+        else:
+            created.append((entry, day, stamp))
+
+    with transaction.atomic(using=tenant_db()):
+        MoodEntry.objects.bulk_update(changed, ['mood', 'valence', 'comment', 'risk_flags', 'updated_at'])
+        MoodEntry.objects.bulk_create([e for e, _, _ in created])
+        # bulk_create applies auto_now/auto_now_add; restore the sheet's values
+        for entry, day, stamp in created:
+            entry.date, entry.timestamp, entry.updated_at = day, stamp or entry.timestamp, started
+        MoodEntry.objects.bulk_update([e for e, _, _ in created], ['date', 'timestamp', 'updated_at'])
+    if changed or created:
+        forget_history()
+    stats['pulled_updated'], stats['pulled_created'] = len(changed), len(created)
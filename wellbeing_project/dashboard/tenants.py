@@ -0,0 +1,104 @@
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+# One SQLite file per school. settings.SCHOOL_TENANTS lists the schools;
+# each gets a DATABASES alias "school_<slug>" holding its own users,
+# profiles and mood data. The default database keeps sessions, the email
+# -> school directory (TenantMembership) and anyone not in a school.
+#
+# The school for the current request lives in a context variable, set by
+# TenantMiddleware from the session and by login_view from the directory.
+# Management commands pick one with the TENANT environment variable.
+
+_current = ContextVar('tenant', default=None)
+
+# Always stored in the default database
+SHARED_APPS = {'sessions'}
+SHARED_MODELS = {'tenantmembership'}
+
+
+def tenant_alias(slug):
+    return f"school_{slug}"
+
+
+def current_tenant():
+    return _current.get() or os.environ.get('TENANT') or None
+
+
+def tenant_db(slug=None):
+    """Database alias for `slug` (default: the current school)."""
+    slug = slug or current_tenant()
+    if slug and slug in settings.SCHOOL_TENANTS:
+        return tenant_alias(slug)
+    return DEFAULT_DB_ALIAS
+
+
+def tenant_connection():
+    return connections[tenant_db()]
+
+
+@contextmanager
+def use_tenant(slug):
+    token = _current.set(slug)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def tenant_for_email(email):
+    from .models import TenantMembership
+
+    if not settings.SCHOOL_TENANTS:
+        return None
+    return (
+        TenantMembership.objects.using(DEFAULT_DB_ALIAS)
+        .filter(email=email.lower())
+        .values_list('tenant', flat=True)
+        .first()
+    )
+
+
+def move_membership(old_email, new_email, slug=None):
+    """Point the directory at a user's new address after they change it."""
+    from .models import TenantMembership
+
+    slug = slug or current_tenant()
+    if not slug or slug not in settings.SCHOOL_TENANTS or old_email.lower() == new_email.lower():
+        return
+    directory = TenantMembership.objects.using(DEFAULT_DB_ALIAS)
+    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+        directory.filter(email=old_email.lower()).delete()
+        if new_email:
+            directory.update_or_create(email=new_email.lower(), defaults={'tenant': slug})
+
+
+def is_shared(model):
+    return model._meta.app_label in SHARED_APPS or model._meta.model_name in SHARED_MODELS
+
+
+class TenantRouter:
+    def db_for_read(self, model, **hints):
+        return DEFAULT_DB_ALIAS if is_shared(model) else tenant_db()
+
+    db_for_write = db_for_read
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if app_label in SHARED_APPS or model_name in SHARED_MODELS:
+            return db == DEFAULT_DB_ALIAS
+        return None
+
+
+class TenantMiddleware:
+    """Route this request's queries to the logged-in user's school. Goes before AuthenticationMiddleware."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with use_tenant(request.session.get('tenant')):
+            return self.get_response(request)
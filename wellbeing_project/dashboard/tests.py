@@ -1,3 +1,1366 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core import mail
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import checkin_queue, jobs, metrics, ratelimit, replica, sheets_client
+from .admin import EstimatedCountPaginator, MoodEntryResource, MoodWidget
+from .digest import send_digests, window
+from .archive import archive_before, archive_path, read_archive, restore_range, term_for
+from .columnar import parquet_available
+from .hashers import from_sheets
+from .heatmap import forget_history, mood_heatmap
+from .middleware import SHEETS_READS, SheetsReadScopeMiddleware
+from .models import MOODS, DigestRun, ExportJob, MoodEntry, MoodRollup, ReportSnapshot, SyncCheckpoint, TenantMembership, UserProfile
+from .rehash import _rehash
+from .reports import build_snapshot, closed_periods, refresh_rollups, summarize
+from .risk import RISK_BITS, comment_risk, risk_labels
+from .search import search_comments
+from .sheets_batch import read_scope
+from .sheets_client import SheetsClient, SheetsUnavailable, ThrottledSpreadsheet
+from .sheets_db import SheetsDB
+from .sheets_fake import FakeAPIError, FakeSpreadsheet, FakeWorksheet
+from .sheets_sync import WORKSHEET, sync_moods
+from .tenants import TenantRouter, tenant_alias, tenant_for_email, use_tenant
+
+
+def make_student(username, class_group='7A', email=None):
+    # No password: hashing one takes a real PBKDF2 run; tests sign in with force_login
+    user = User.objects.create_user(username, email or f"{username}@example.com")
+    UserProfile.objects.create(user=user, user_type='student', class_group=class_group)
+    return user
+
+
+def make_entry(user, day, mood='happy', comment=''):
+    entry = MoodEntry.objects.create(user=user, mood=MoodEntry.MOOD_CODES[mood], comment=comment)
+    # date is auto_now_add; move it to the day the test needs
+    MoodEntry.objects.filter(pk=entry.pk).update(date=day)
+    entry.date = day
+    return entry
+
+
+# Tests marked with this need two schools configured, e.g.
+#     SCHOOL_TENANTS=north,south python manage.py test dashboard.tests
+needs_tenants = skipUnless(len(settings.SCHOOL_TENANTS) >= 2, "needs SCHOOL_TENANTS with two schools")
+# Not '__all__': replica aliases mirror these and must not open their own transactions
+SCHOOL_DATABASES = {DEFAULT_DB_ALIAS, *map(tenant_alias, settings.SCHOOL_TENANTS)}
+
+# Pages render {% static %}, and tests run without a collected manifest
+PLAIN_STATIC = {**settings.STORAGES, 'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'}}
+
+
+# ----------------- Mood Import -----------------
+class MoodImportTests(SimpleTestCase):
+    def test_widget_reads_slugs_and_codes(self):
+        widget = MoodWidget()
+        self.assertEqual(widget.clean('happy'), MoodEntry.MOOD_CODES['happy'])
+        self.assertEqual(widget.clean('4'), 4)
+        self.assertIsNone(widget.clean(''))
+        for value in ('sleepy', '0', '99'):
+            with self.assertRaises(ValueError):
+                widget.clean(value)
+
+    def test_unknown_mood_is_a_validation_error_on_the_row(self):
+        resource = MoodEntryResource()
+        for value in ('sleepy', '13'):
+            with self.assertRaises(ValidationError) as raised:
+                resource.import_instance(MoodEntry(), {'mood': value, 'comment': ''})
+            self.assertIn('mood', raised.exception.message_dict)
+
+
+# ----------------- Archive / Restore -----------------
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.archive_dir)
+        self.student = make_student('amy')
+
+    def test_term_for(self):
+        self.assertEqual(term_for(date(2024, 2, 10)), '2024-spring')
+        self.assertEqual(term_for(date(2024, 5, 1)), '2024-summer')
+        self.assertEqual(term_for(date(2024, 12, 31)), '2024-autumn')
+
+    def test_archive_moves_old_entries_to_term_files_and_keeps_rollups(self):
+        old = make_entry(self.student, date(2024, 2, 10), 'sad', 'rough week')
+        make_entry(self.student, date(2024, 10, 1), 'calm')
+        recent = make_entry(self.student, date(2025, 3, 1), 'happy')
+
+        summary = archive_before(date(2025, 1, 1), self.archive_dir)
+
+        self.assertEqual(summary, {'2024-spring': 1, '2024-autumn': 1})
+        self.assertEqual(list(MoodEntry.objects.values_list('id', flat=True)), [recent.id])
+        with gzip.open(archive_path('2024-spring', self.archive_dir), 'rt', encoding='utf-8') as f:
+            record = json.loads(f.readline())
+        self.assertEqual((record['id'], record['mood'], record['comment']), (old.id, 'sad', 'rough week'))
+        rollup = MoodRollup.objects.get(date=date(2024, 2, 10))
+        self.assertEqual((rollup.class_group, rollup.mood, rollup.count), ('7A', MoodEntry.MOOD_CODES['sad'], 1))
+
+    def test_dry_run_changes_nothing(self):
+        make_entry(self.student, date(2024, 2, 10))
+        self.assertEqual(archive_before(date(2025, 1, 1), self.archive_dir, dry_run=True), {'2024-spring': 1})
+        self.assertEqual(MoodEntry.objects.count(), 1)
+        self.assertFalse(os.listdir(self.archive_dir))
+
+    def test_restore_range_brings_back_entries_with_original_dates(self):
+        old = make_entry(self.student, date(2024, 2, 10), 'sad', 'I feel hopeless')
+        make_entry(self.student, date(2024, 3, 20), 'calm')
+        archive_before(date(2025, 1, 1), self.archive_dir)
+
+        self.assertEqual(restore_range(date(2024, 2, 1), date(2024, 2, 28), self.archive_dir), 1)
+
+        restored = MoodEntry.objects.get()
+        self.assertEqual((restored.id, restored.date, restored.user_id), (old.id, date(2024, 2, 10), self.student.id))
+        self.assertEqual(restored.timestamp, old.timestamp)
+        self.assertEqual(restored.risk_labels, ['Hopelessness'])
+
+    def test_rearchived_range_is_restored_once(self):
+        make_entry(self.student, date(2024, 2, 10))
+        archive_before(date(2025, 1, 1), self.archive_dir)
+        restore_range(date(2024, 1, 1), date(2024, 12, 31), self.archive_dir)
+        archive_before(date(2025, 1, 1), self.archive_dir)
+
+        self.assertEqual(len(list(read_archive(date(2024, 1, 1), date(2024, 12, 31), self.archive_dir))), 2)
+        self.assertEqual(restore_range(date(2024, 1, 1), date(2024, 12, 31), self.archive_dir), 1)
+        self.assertEqual(MoodEntry.objects.count(), 1)
+
+    def test_restore_drops_missing_users(self):
+        make_entry(self.student, date(2024, 2, 10))
+        archive_before(date(2025, 1, 1), self.archive_dir)
+        self.student.delete()
+
+        restore_range(date(2024, 1, 1), date(2024, 12, 31), self.archive_dir)
+        self.assertIsNone(MoodEntry.objects.get().user_id)
+
+    def rollup(self, day):
+        return {MoodEntry.MOOD_SLUGS[m]: (c, a) for m, c, a in MoodRollup.objects.filter(date=day).values_list('mood', 'count', 'archived')}
+
+    def test_archiving_a_day_twice_adds_up(self):
+        day = date(2024, 2, 10)
+        make_entry(self.student, day, 'sad')
+        archive_before(date(2025, 1, 1), self.archive_dir)
+        make_entry(self.student, day, 'sad')
+        archive_before(date(2025, 1, 1), self.archive_dir)
+
+        self.assertEqual(self.rollup(day), {'sad': (2, 2)})
+
+    def test_late_entry_on_an_archived_day_adds_to_its_rollup(self):
+        day = date(2024, 2, 10)
+        make_entry(self.student, day, 'sad')
+        make_entry(make_student('bob'), day, 'sad')
+        archive_before(date(2025, 1, 1), self.archive_dir)
+        make_entry(make_student('cat'), day, 'happy')
+
+        refresh_rollups(day, day)
+        refresh_rollups(day, day)
+
+        self.assertEqual(self.rollup(day), {'sad': (2, 2), 'happy': (1, 0)})
+        self.assertEqual(summarize(day, day)[0]['checkins'], 3)
+
+    def test_restored_entries_are_not_counted_twice(self):
+        day = date(2024, 2, 10)
+        make_entry(self.student, day, 'sad')
+        archive_before(date(2025, 1, 1), self.archive_dir)
+        restore_range(day, day, self.archive_dir)
+        restore_range(day, day, self.archive_dir)
+
+        refresh_rollups(day, day)
+        self.assertEqual(self.rollup(day), {'sad': (1, 0)})
+        archive_before(date(2025, 1, 1), self.archive_dir)
+        self.assertEqual(self.rollup(day), {'sad': (1, 1)})
+
+
+# ----------------- Period Reports -----------------
+class ReportTests(TestCase):
+    def setUp(self):
+        self.student = make_student('amy')
+        # Monday 2 September 2024
+        make_entry(self.student, date(2024, 9, 2), 'happy')
+        make_entry(make_student('bob', class_group='7B'), date(2024, 9, 8), 'sad')
+
+    def test_closed_periods_stop_before_the_current_one(self):
+        monday = date(2024, 9, 2)
+        self.assertEqual(list(closed_periods('week', monday, today=date(2024, 9, 8))), [])
+        self.assertEqual(list(closed_periods('week', monday, today=date(2024, 9, 9))), [(monday, date(2024, 9, 8))])
+        self.assertEqual(
+            list(closed_periods('week', date(2024, 9, 4), today=date(2024, 9, 16))),
+            [(monday, date(2024, 9, 8)), (date(2024, 9, 9), date(2024, 9, 15))],
+        )
+        self.assertEqual(list(closed_periods('term', date(2024, 5, 1), today=date(2024, 8, 31))), [])
+        self.assertEqual(
+            list(closed_periods('term', date(2024, 5, 1), today=date(2024, 9, 1))),
+            [(date(2024, 5, 1), date(2024, 8, 31))],
+        )
+
+    def test_build_snapshot_is_idempotent(self):
+        week = (date(2024, 9, 2), date(2024, 9, 8))
+        self.assertEqual(build_snapshot('week', *week), 3)
+        first = list(ReportSnapshot.objects.values_list('scope', 'class_group', 'data'))
+
+        self.assertEqual(build_snapshot('week', *week), 0)
+        self.assertEqual(build_snapshot('week', *week, rebuild=True), 3)
+
+        self.assertEqual(list(ReportSnapshot.objects.values_list('scope', 'class_group', 'data')), first)
+        school = ReportSnapshot.objects.get(scope='school')
+        self.assertEqual((school.data['checkins'], school.data['moods']), (2, {'happy': 1, 'sad': 1}))
+
+    def test_command_snapshots_closed_periods_from_the_first_day(self):
+        out = StringIO()
+        call_command('build_report_snapshots', '--period=week', stdout=out)
+        call_command('build_report_snapshots', '--period=week', stdout=out)
+
+        self.assertTrue(ReportSnapshot.objects.filter(period='week', start=date(2024, 9, 2), scope='school').exists())
+        self.assertIn("week: 0 new snapshots", out.getvalue())
+
+    @override_settings(STORAGES=PLAIN_STATIC)
+    def test_reports_page_reads_snapshots_not_entries(self):
+        build_snapshot('week', date(2024, 9, 2), date(2024, 9, 8))
+        teacher = make_student('tom')
+        UserProfile.objects.filter(user=teacher).update(user_type='teacher')
+        self.client.force_login(teacher)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('teacher_reports'), {'period': 'week', 'start': '2024-09-02'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['school'].data['checkins'], 2)
+        self.assertEqual([c.class_group for c in response.context['classes']], ['7A', '7B'])
+        self.assertFalse([q['sql'] for q in queries if MoodEntry._meta.db_table in q['sql']])
+
+
+# ----------------- Admin Changelist -----------------
+class EstimatedCountPaginatorTests(TestCase):
+    def setUp(self):
+        self.student = make_student('amy')
+        self.archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.archive_dir)
+
+    def count(self, queryset=None):
+        return EstimatedCountPaginator(queryset if queryset is not None else MoodEntry.objects.all(), 10).count
+
+    def analyze(self):
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE dashboard_moodentry")
+
+    def test_exact_count_until_analysed(self):
+        for _ in range(5):
+            make_entry(self.student, date(2025, 3, 1))
+        self.assertEqual(self.count(), 5)
+
+    def test_uses_id_span_when_it_matches_the_analysed_rows(self):
+        entries = [make_entry(self.student, date(2025, 3, 1)) for _ in range(20)]
+        self.analyze()
+        # A row removed behind ANALYZE's back is still inside the span
+        MoodEntry.objects.filter(pk=entries[5].pk).delete()
+        self.assertEqual(self.count(), 20)
+
+    def test_archived_gap_falls_back_to_exact_count(self):
+        for i in range(30):
+            make_entry(self.student, date(2023, 1, 5) if 10 <= i < 25 else date(2025, 3, 1))
+        self.analyze()
+        archive_before(date(2024, 1, 1), self.archive_dir)
+        self.assertEqual(self.count(), 15)
+
+    def test_filtered_lists_are_counted_exactly(self):
+        for mood in ['happy', 'sad', 'sad']:
+            make_entry(self.student, date(2025, 3, 1), mood)
+        self.analyze()
+        self.assertEqual(self.count(MoodEntry.objects.filter(mood=MoodEntry.MOOD_CODES['sad'])), 2)
+
+
+# ----------------- Comment Search -----------------
+class SearchTests(TestCase):
+    def setUp(self):
+        self.student = make_student('amy')
+
+    def test_prefix_match_ranked_with_highlight(self):
+        make_entry(self.student, date(2025, 3, 1), 'sad', 'someone keeps bullying me at lunch')
+        make_entry(self.student, date(2025, 3, 2), 'happy', 'great lunch today')
+
+        results = search_comments('bully')
+
+        self.assertEqual(len(results), 1)
+        self.assertIn('<mark>bullying</mark>', results[0]['snippet_html'])
+
+    def test_snippet_is_escaped(self):
+        make_entry(self.student, date(2025, 3, 1), 'sad', '<b>lunch</b> was bad')
+        self.assertNotIn('<b>', search_comments('lunch')[0]['snippet_html'])
+
+
+@needs_tenants
+class SchoolSearchTests(TestCase):
+    databases = SCHOOL_DATABASES
+
+    def test_search_reads_the_current_schools_database(self):
+        north, south = settings.SCHOOL_TENANTS[:2]
+        with use_tenant(north):
+            make_entry(make_student('amy'), date(2025, 3, 1), 'sad', 'worried about exams')
+        with use_tenant(north):
+            self.assertEqual([r['entry'].comment for r in search_comments('exams')], ['worried about exams'])
+        with use_tenant(south):
+            self.assertEqual(search_comments('exams'), [])
+
+
+# ----------------- Password Rehash -----------------
+@override_settings(PBKDF2_ITERATIONS=1000, PASSWORD_REHASH_ASYNC=False, GOOGLE_SHEETS_ENABLED=False)
+class RehashTests(TestCase):
+    def setUp(self):
+        self.student = make_student('amy')
+
+    def set_hash(self, encoded):
+        User.objects.filter(pk=self.student.pk).update(password=encoded)
+
+    def stored(self):
+        return User.objects.get(pk=self.student.pk).password
+
+    def test_outdated_iterations_upgraded_on_login(self):
+        with override_settings(PBKDF2_ITERATIONS=500):
+            self.set_hash(make_password('secret'))
+
+        user = authenticate(email='amy@example.com', password='secret', user_type='student')
+
+        self.assertEqual(user, self.student)
+        self.assertEqual(identify_hasher(self.stored()).decode(self.stored())['iterations'], 1000)
+
+    def test_legacy_sheets_hash_upgraded_on_login(self):
+        legacy = '2bb80d537b1da3e38bd30361aa855686bde0eacd7162fef6a25fe97bf527a25b'
+        self.set_hash(from_sheets(legacy))
+
+        self.assertEqual(authenticate(email='amy@example.com', password='secret'), self.student)
+        self.assertEqual(identify_hasher(self.stored()).algorithm, 'pbkdf2_sha256')
+
+    def test_current_hash_left_alone(self):
+        current = make_password('secret')
+        self.set_hash(current)
+
+        authenticate(email='amy@example.com', password='secret')
+
+        self.assertEqual(self.stored(), current)
+
+    def test_wrong_password_not_rehashed(self):
+        with override_settings(PBKDF2_ITERATIONS=500):
+            outdated = make_password('secret')
+        self.set_hash(outdated)
+
+        self.assertIsNone(authenticate(email='amy@example.com', password='wrong'))
+        self.assertEqual(self.stored(), outdated)
+
+    def test_password_changed_in_between_wins(self):
+        with override_settings(PBKDF2_ITERATIONS=500):
+            outdated = make_password('secret')
+        changed = make_password('new-secret')
+        self.set_hash(changed)
+
+        _rehash('default', self.student.pk, outdated, 'secret')
+
+        self.assertEqual(self.stored(), changed)
+
+
+# ----------------- Check-in Queue -----------------
+class CheckinQueueTests(TestCase):
+    def setUp(self):
+        spool_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, spool_dir)
+        spool = override_settings(CHECKIN_SPOOL_PATH=os.path.join(spool_dir, 'checkins.sqlite3'))
+        spool.enable()
+        self.addCleanup(spool.disable)
+        # Drain by hand; the worker thread would use its own connection
+        worker = mock.patch.object(checkin_queue, '_ensure_worker')
+        worker.start()
+        self.addCleanup(worker.stop)
+        self.student = make_student('amy')
+        self.today = date.today()
+
+    def tearDown(self):
+        checkin_queue._local.conn.close()
+        checkin_queue._local.conn = None
+
+    def enqueue(self, mood, key, comment=''):
+        checkin_queue.enqueue_checkin(self.student.pk, self.today, MoodEntry.MOOD_CODES[mood], comment, key)
+
+    def stored(self):
+        return MoodEntry.objects.get(user=self.student, date=self.today)
+
+    def test_double_submit_applied_once(self):
+        self.enqueue('sad', 'k1')
+        self.enqueue('happy', 'k1')
+
+        self.assertEqual(checkin_queue.drain(), 1)
+        self.assertEqual(self.stored().mood, MoodEntry.MOOD_CODES['sad'])
+
+    def test_latest_submission_wins(self):
+        self.enqueue('sad', 'k1')
+        self.enqueue('happy', 'k2')
+        checkin_queue.drain(batch_size=1)
+        self.assertEqual(self.stored().mood, MoodEntry.MOOD_CODES['happy'])
+
+    def test_timestamp_is_when_accepted(self):
+        with mock.patch.object(checkin_queue.time, 'time', return_value=1_700_000_000.0):
+            self.enqueue('sad', 'k1')
+        checkin_queue.drain()
+        self.assertEqual(self.stored().timestamp.timestamp(), 1_700_000_000.0)
+
+    def test_replayed_key_ignored_after_apply(self):
+        self.enqueue('sad', 'k1')
+        checkin_queue.drain()
+
+        self.enqueue('happy', 'k1')
+
+        self.assertEqual(checkin_queue.pending_count(), 0)
+        self.assertEqual(self.stored().mood, MoodEntry.MOOD_CODES['sad'])
+
+    def test_tombstones_expire_after_session_age(self):
+        self.enqueue('sad', 'k1')
+        checkin_queue.drain()
+        later = time.time() + settings.SESSION_COOKIE_AGE + 60
+        with mock.patch.object(checkin_queue.time, 'time', return_value=later):
+            self.enqueue('happy', 'k2')
+            checkin_queue.drain()
+
+        tombstones = checkin_queue._spool().execute('SELECT key FROM checkin_applied').fetchall()
+        self.assertEqual(tombstones, [('k2',)])
+
+    def test_older_submission_does_not_overwrite_newer_entry(self):
+        self.enqueue('sad', 'k1')
+        # Submitted directly after the queued form was accepted
+        make_entry(self.student, self.today, 'happy')
+        MoodEntry.objects.filter(user=self.student).update(timestamp=timezone.now() + timedelta(seconds=5))
+
+        checkin_queue.drain()
+
+        self.assertEqual(self.stored().mood, MoodEntry.MOOD_CODES['happy'])
+        self.assertEqual(checkin_queue.pending_count(), 0)
+
+
+# ----------------- Roster Provisioning -----------------
+class ProvisionRosterTests(TestCase):
+    def provision(self, rows, header='email,first_name,class_group,password', **options):
+        roster = tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False)
+        self.addCleanup(os.remove, roster.name)
+        with roster:
+            roster.write(f"{header}\n")
+            roster.writelines(f"{row}\n" for row in rows)
+        out = StringIO()
+        call_command('provision_roster', roster.name, iterations=1, workers=1, stdout=out, **options)
+        return out.getvalue()
+
+    def test_creates_users_and_profiles(self):
+        self.provision(['Amy@Example.com,Amy,7A,secret'])
+
+        user = User.objects.get(email='amy@example.com')
+        self.assertEqual(user.userprofile.class_group, '7A')
+        self.assertTrue(user.check_password('secret'))
+
+    def test_existing_email_skipped_whatever_its_case(self):
+        existing = make_student('amy', email='Amy@Example.com')
+
+        output = self.provision(['amy@example.com,Amy,7B,secret'])
+
+        self.assertIn('already exists', output)
+        self.assertEqual(list(User.objects.values_list('pk', flat=True)), [existing.pk])
+
+    def test_duplicate_usernames_rejected_before_writing(self):
+        with self.assertRaisesMessage(CommandError, "username amy appears more than once"):
+            self.provision(['amy,a@example.com,7A', 'amy,b@example.com,7B'], header='username,email,class_group')
+        self.assertFalse(User.objects.exists())
+
+    @override_settings(GOOGLE_SHEETS_ENABLED=True, GOOGLE_SHEETS_FAKE_PATH='')
+    def test_sheets_failure_after_commit_is_reported(self):
+        db = SheetsDB()
+        db.sheet = ThrottledSpreadsheet(SheetsClient(max_retries=0), FakeSpreadsheet())
+        err = StringIO()
+        with mock.patch('dashboard.sheets_db.db', db), \
+                mock.patch.object(FakeWorksheet, 'append_rows', side_effect=FakeAPIError(403, "denied")):
+            self.provision(['amy@example.com,Amy,7A,secret'], sheets=True, stderr=err)
+
+        self.assertIn('users were still created', err.getvalue())
+        self.assertTrue(User.objects.filter(email='amy@example.com').exists())
+
+
+# ----------------- Sheets Sync -----------------
+class SheetsSyncTests(TestCase):
+    def setUp(self):
+        self.sheet = FakeSpreadsheet()
+        self.rows = self.sheet.data[WORKSHEET]
+        self.student = make_student('amy')
+
+    def test_pull_creates_entries_from_new_rows(self):
+        self.rows.append(['amy', '2025-03-01', 'sad', 'long day', '2025-03-01 08:30:00'])
+        self.rows.append(['nobody', '2025-03-01', 'happy', '', ''])
+
+        stats = sync_moods(self.sheet)
+
+        entry = MoodEntry.objects.get(user=self.student)
+        self.assertEqual((entry.date, entry.mood_slug, entry.comment), (date(2025, 3, 1), 'sad', 'long day'))
+        self.assertEqual(timezone.localtime(entry.timestamp).strftime('%H:%M'), '08:30')
+        self.assertEqual((stats['pulled_created'], stats['skipped_unknown_user']), (1, 1))
+
+    def test_push_appends_local_entries_once(self):
+        make_entry(self.student, date(2025, 3, 1), 'calm', 'fine')
+
+        sync_moods(self.sheet)
+        stats = sync_moods(self.sheet)
+
+        self.assertEqual([row[:4] for row in self.rows[1:]], [['amy', '2025-03-01', 'calm', 'fine']])
+        self.assertEqual((stats['pushed_appended'], stats['pulled_created']), (0, 0))
+
+    def test_conflict_resolved_by_prefer(self):
+        entry = make_entry(self.student, date(2025, 3, 1), 'calm')
+        sync_moods(self.sheet)
+        self.rows[1][2] = 'sad'
+        entry.mood = MoodEntry.MOOD_CODES['happy']
+        entry.save()
+
+        stats = sync_moods(self.sheet, full=True, prefer='db')
+        self.assertEqual(stats['conflicts'], 1)
+        self.assertEqual(self.rows[1][2], 'happy')
+
+        self.rows[1][2] = 'sad'
+        entry.save()
+        sync_moods(self.sheet, full=True, prefer='sheet')
+        self.assertEqual(MoodEntry.objects.get(pk=entry.pk).mood_slug, 'sad')
+
+    def test_checkpoint_follows_the_appended_range(self):
+        self.rows.append([])  # blank row the API appends after
+        make_entry(self.student, date(2025, 3, 1), 'calm')
+
+        sync_moods(self.sheet)
+
+        self.assertEqual(len(self.rows), 2)
+        self.assertEqual(SyncCheckpoint.objects.get(name=WORKSHEET).sheet_rows, 2)
+
+    def test_rows_added_during_a_run_are_read_next_time(self):
+        make_student('ben')
+        make_entry(self.student, date(2025, 3, 1), 'calm')
+        append_rows = FakeWorksheet.append_rows
+
+        def someone_else_appends_first(ws, values):
+            ws.rows.append(['ben', '2025-03-01', 'sad', '', ''])
+            return append_rows(ws, values)
+
+        with mock.patch.object(FakeWorksheet, 'append_rows', someone_else_appends_first):
+            sync_moods(self.sheet)
+        self.assertEqual(SyncCheckpoint.objects.get(name=WORKSHEET).sheet_rows, 1)
+
+        sync_moods(self.sheet)
+
+        self.assertTrue(MoodEntry.objects.filter(user__username='ben', date=date(2025, 3, 1)).exists())
+        self.assertEqual(SyncCheckpoint.objects.get(name=WORKSHEET).sheet_rows, 3)
+
+
+# ----------------- Sheets Client -----------------
+class SheetsClientTests(SimpleTestCase):
+    def setUp(self):
+        sheets_client.metrics.reset()
+        sleep = mock.patch.object(sheets_client.time, 'sleep')
+        self.sleep = sleep.start()
+        self.addCleanup(sleep.stop)
+        self.client = SheetsClient(rate=600, burst=100, max_retries=2, budget_wait=0)
+
+    def failing(self, *errors):
+        """A call that raises `errors` in turn, then returns 'ok'."""
+        errors = list(errors)
+
+        def call():
+            if errors:
+                raise errors.pop(0)
+            return 'ok'
+        return call
+
+    def test_retries_429_and_5xx_then_succeeds(self):
+        call = self.failing(FakeAPIError(429, 'quota'), FakeAPIError(503, 'unavailable'))
+
+        self.assertEqual(self.client.call('get', call), 'ok')
+        stats = sheets_client.metrics.snapshot()['get']
+        self.assertEqual((stats['calls'], stats['retries'], stats['errors']), (3, 2, 2))
+
+    def test_gives_up_after_max_retries(self):
+        call = self.failing(*[FakeAPIError(500, 'boom')] * 3)
+        with self.assertRaises(SheetsUnavailable):
+            self.client.call('get', call)
+
+    def test_client_errors_not_retried(self):
+        with self.assertRaises(FakeAPIError):
+            self.client.call('get', self.failing(FakeAPIError(400, 'bad range')))
+        self.assertEqual(sheets_client.metrics.snapshot()['get']['calls'], 1)
+
+    def test_retry_after_is_honoured(self):
+        call = self.failing(FakeAPIError(429, 'quota', headers={'Retry-After': '3'}))
+        self.client.call('get', call)
+        self.assertGreaterEqual(self.sleep.call_args[0][0], 3)
+
+    def test_transport_errors_retried_then_unavailable(self):
+        self.assertEqual(self.client.call('get', self.failing(ConnectionResetError())), 'ok')
+        with self.assertRaises(SheetsUnavailable):
+            self.client.call('get', self.failing(*[TimeoutError()] * 3))
+
+    def test_bucket_refuses_when_quota_spent(self):
+        client = SheetsClient(rate=1, burst=1, budget_wait=0)
+        client.call('get', self.failing())
+        with self.assertRaises(SheetsUnavailable):
+            client.call('get', self.failing())
+        self.assertEqual(sheets_client.metrics.snapshot()['get']['throttled'], 1)
+
+    def test_identical_reads_in_flight_are_shared(self):
+        release, calls, results = threading.Event(), [], []
+
+        def slow_read():
+            calls.append(1)
+            release.wait(5)
+            return ['row']
+
+        threads = [
+            threading.Thread(target=lambda: results.append(self.client.call('get', slow_read, coalesce_key='k')))
+            for _ in range(3)
+        ]
+        for t in threads:
+            t.start()
+        deadline = time.monotonic() + 5
+        while sheets_client.metrics.snapshot().get('get', {}).get('coalesced', 0) < 2 and time.monotonic() < deadline:
+            pass
+        release.set()
+        for t in threads:
+            t.join()
+
+        self.assertEqual((len(calls), results), (1, [['row']] * 3))
+
+    def test_slow_worksheet_fetch_does_not_block_others(self):
+        fake, started, release = FakeSpreadsheet(), threading.Event(), threading.Event()
+        fetch = fake.worksheet
+
+        def worksheet(title):
+            if title == 'Users':
+                started.set()
+                release.wait(5)
+            return fetch(title)
+
+        fake.worksheet = worksheet
+        sheet = ThrottledSpreadsheet(self.client, fake)
+        slow = threading.Thread(target=sheet.worksheet, args=['Users'])
+        slow.start()
+        started.wait(5)
+        try:
+            self.assertEqual(sheet.worksheet('MoodEntries').title, 'MoodEntries')
+            self.assertTrue(slow.is_alive())
+        finally:
+            release.set()
+            slow.join()
+        self.assertIs(sheet.worksheet('Users'), sheet.worksheet('Users'))
+
+
+# ----------------- Sheets Read Batching -----------------
+@override_settings(GOOGLE_SHEETS_ENABLED=True, GOOGLE_SHEETS_FAKE_PATH='', PBKDF2_ITERATIONS=1000, RATE_LIMIT_ENABLED=False)
+class SheetsBatchTests(TestCase):
+    def setUp(self):
+        self.fake = FakeSpreadsheet()
+        self.fake.data['Users'] += [
+            ['zoe', 'zoe@example.com', make_password('secret'), 'student', 'Zoe'],
+            ['007', 'bond@example.com', '', 'student'],
+        ]
+        self.fake.data['MoodEntries'] += [['zoe', '2024-09-02', 'happy', '1,200', '2024-09-02 08:00:00']]
+        self.db = SheetsDB()
+        self.db.sheet = ThrottledSpreadsheet(SheetsClient(), self.fake)
+
+    def test_records_are_typed_like_get_all_records(self):
+        with read_scope():
+            users = self.db.get_all_users('student')
+            moods = self.db.get_mood_entries('zoe')
+
+        self.assertEqual(users, self.fake.worksheet('Users').get_all_records())
+        self.assertEqual((users[1]['username'], users[1]['first_name']), (7, ''))
+        self.assertEqual(moods[0]['comment'], 1200)
+        self.assertEqual(moods[0]['date'], '2024-09-02')
+
+    def test_declared_ranges_come_back_in_one_round_trip(self):
+        with read_scope('Users', 'MoodEntries'):
+            self.db.get_all_users('student')
+            self.db.get_mood_entries('zoe')
+            self.db.get_todays_mood_summary()
+        self.assertEqual(self.fake.calls, {'values_batch_get': 1})
+
+    def test_middleware_declares_the_views_worksheets(self):
+        request = RequestFactory().get('/')
+        request.resolver_match = mock.Mock(url_name='reports')
+
+        def view(request):
+            middleware.process_view(request, view, (), {})
+            self.db.get_all_users('teacher')
+            self.db.get_mood_entries('zoe')
+            return HttpResponse()
+
+        middleware = SheetsReadScopeMiddleware(view)
+        with mock.patch.dict(SHEETS_READS, {'reports': ('Users', 'MoodEntries')}):
+            middleware(request)
+        self.assertEqual(self.fake.calls, {'values_batch_get': 1})
+
+    def test_login_reads_users_through_the_declared_batch(self):
+        with mock.patch('dashboard.sheets_db.db', self.db):
+            response = self.client.post(reverse('login'), {'email': 'zoe@example.com', 'password': 'secret', 'user_type': 'student'})
+
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(User.objects.filter(username='zoe').exists())
+        self.assertEqual(self.fake.calls, {'values_batch_get': 1})
+
+
+# ----------------- Session Pruning -----------------
+class PruneSessionsTests(TestCase):
+    def test_deletes_only_expired_sessions(self):
+        now = timezone.now()
+        for i in range(3):
+            Session.objects.create(session_key=f"old{i}", session_data='', expire_date=now - timedelta(days=1))
+        Session.objects.create(session_key='live', session_data='', expire_date=now + timedelta(days=1))
+
+        call_command('prune_sessions', batch_size=2, pause=0, stdout=StringIO())
+
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['live'])
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cached_db')
+    def test_all_refused_while_sessions_are_in_the_database(self):
+        Session.objects.create(session_key='live', session_data='', expire_date=timezone.now() + timedelta(days=1))
+        with self.assertRaises(CommandError):
+            call_command('prune_sessions', all=True, stdout=StringIO())
+        self.assertTrue(Session.objects.exists())
+
+
+# ----------------- Schools / Email Login -----------------
+@override_settings(SCHOOL_TENANTS=['north', 'south'])
+class TenantRouterTests(SimpleTestCase):
+    router = TenantRouter()
+
+    def test_school_data_follows_the_current_school(self):
+        self.assertEqual(self.router.db_for_read(MoodEntry), DEFAULT_DB_ALIAS)
+        with use_tenant('north'):
+            self.assertEqual(self.router.db_for_read(MoodEntry), 'school_north')
+            self.assertEqual(self.router.db_for_write(User), 'school_north')
+        with use_tenant('elsewhere'):
+            self.assertEqual(self.router.db_for_read(MoodEntry), DEFAULT_DB_ALIAS)
+
+    def test_shared_models_stay_in_default(self):
+        with use_tenant('north'):
+            self.assertEqual(self.router.db_for_write(Session), DEFAULT_DB_ALIAS)
+            self.assertEqual(self.router.db_for_read(TenantMembership), DEFAULT_DB_ALIAS)
+
+    def test_shared_tables_only_migrated_in_default(self):
+        self.assertFalse(self.router.allow_migrate('school_north', 'sessions', 'session'))
+        self.assertTrue(self.router.allow_migrate(DEFAULT_DB_ALIAS, 'dashboard', 'tenantmembership'))
+        self.assertIsNone(self.router.allow_migrate('school_north', 'dashboard', 'moodentry'))
+
+
+@override_settings(PBKDF2_ITERATIONS=1000, GOOGLE_SHEETS_ENABLED=False)
+class EmailLoginTests(TestCase):
+    def setUp(self):
+        self.student = make_student('amy', email='Amy@Example.com')
+        self.student.set_password('secret')
+        self.student.save()
+
+    def test_email_matched_case_insensitively(self):
+        self.assertEqual(authenticate(email=' amy@EXAMPLE.com', password='secret'), self.student)
+
+    def test_wrong_user_type_refused(self):
+        self.assertIsNone(authenticate(email='amy@example.com', password='secret', user_type='teacher'))
+
+    @override_settings(SCHOOL_TENANTS=['north'])
+    def test_school_found_from_directory_whatever_the_case(self):
+        TenantMembership.objects.create(email='amy@example.com', tenant='north')
+        self.assertEqual(tenant_for_email('AMY@example.com'), 'north')
+
+    @override_settings(SCHOOL_TENANTS=['north'])
+    def test_directory_entries_are_stored_lower_case(self):
+        TenantMembership.objects.create(email='Amy@Example.com', tenant='north')
+        self.assertEqual(tenant_for_email('amy@example.com'), 'north')
+
+
+@needs_tenants
+# Login budgets live in a spool file that outlasts the test database
+@override_settings(PBKDF2_ITERATIONS=1000, GOOGLE_SHEETS_ENABLED=False, RATE_LIMIT_ENABLED=False)
+class SchoolLoginTests(TestCase):
+    databases = SCHOOL_DATABASES
+
+    def test_login_signs_in_against_the_users_school(self):
+        north = settings.SCHOOL_TENANTS[0]
+        with use_tenant(north):
+            student = make_student('amy')
+            student.set_password('secret')
+            student.save()
+        TenantMembership.objects.create(email='amy@example.com', tenant=north)
+
+        response = self.client.post(reverse('login'), {'email': 'Amy@example.com', 'password': 'secret', 'user_type': 'student'})
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.client.session['tenant'], north)
+        self.assertFalse(User.objects.using(DEFAULT_DB_ALIAS).filter(username='amy').exists())
+
+    @override_settings(STORAGES=PLAIN_STATIC)
+    def test_changed_email_still_finds_the_school(self):
+        north = settings.SCHOOL_TENANTS[0]
+        with use_tenant(north):
+            teacher = make_student('tom')
+            UserProfile.objects.filter(user=teacher).update(user_type='teacher')
+            teacher.set_password('secret')
+            teacher.save()
+        TenantMembership.objects.create(email='tom@example.com', tenant=north)
+        self.client.post(reverse('login'), {'email': 'tom@example.com', 'password': 'secret', 'user_type': 'teacher'})
+
+        self.client.post(reverse('teacher_settings'), {'first_name': 'Tom', 'email': 'Tom@school.example'})
+        self.client.logout()
+        response = self.client.post(reverse('login'), {'email': 'tom@school.example', 'password': 'secret', 'user_type': 'teacher'})
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.client.session['tenant'], north)
+        self.assertEqual(list(TenantMembership.objects.values_list('email', 'tenant')), [('tom@school.example', north)])
+
+
+# ----------------- Read Replicas -----------------
+@override_settings(READ_REPLICA_ENABLED=True)
+class ReplicaRouterTests(SimpleTestCase):
+    router = replica.ReplicaRouter()
+
+    def setUp(self):
+        fresh = mock.patch.object(replica, 'replica_for', replica.replica_alias)
+        fresh.start()
+        self.addCleanup(fresh.stop)
+
+    def test_only_inside_replica_views(self):
+        self.assertIsNone(self.router.db_for_read(MoodEntry))
+        with replica.use_replica():
+            self.assertEqual(self.router.db_for_read(MoodEntry), 'default_replica')
+
+    def test_accounts_and_profiles_read_from_the_primary(self):
+        with replica.use_replica():
+            self.assertIsNone(self.router.db_for_read(User))
+            self.assertIsNone(self.router.db_for_read(UserProfile))
+            self.assertIsNone(self.router.db_for_read(Session))
+
+
+class BackupDatabaseTests(SimpleTestCase):
+    def test_copy_is_complete_and_replaces_the_old_one(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        source, target = os.path.join(tmp, 'source.sqlite3'), os.path.join(tmp, 'copy', 'target.sqlite3')
+        conn = sqlite3.connect(source)
+        conn.execute('CREATE TABLE t (x)')
+        conn.executemany('INSERT INTO t VALUES (?)', [(i,) for i in range(5000)])
+        conn.commit()
+
+        replica.backup_database(source, target)
+        conn.execute('DELETE FROM t WHERE x >= 10')
+        conn.commit()
+        conn.close()
+        replica.backup_database(source, target)
+
+        copy = sqlite3.connect(target)
+        self.addCleanup(copy.close)
+        self.assertEqual(copy.execute('SELECT COUNT(*) FROM t').fetchone()[0], 10)
+        self.assertEqual(os.listdir(os.path.dirname(target)), ['target.sqlite3'])
+
+    @mock.patch.multiple(replica, BACKUP_STEP_PAGES=1, BACKUP_STEP_SLEEP=0.01)
+    def test_writers_get_in_between_steps(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        source, target = os.path.join(tmp, 'source.sqlite3'), os.path.join(tmp, 'target.sqlite3')
+        conn = sqlite3.connect(source, timeout=0)
+        self.addCleanup(conn.close)
+        conn.execute('CREATE TABLE t (x)')
+        conn.executemany('INSERT INTO t VALUES (?)', [('x' * 1000,) for _ in range(100)])
+        conn.commit()
+
+        copy = threading.Thread(target=replica.backup_database, args=(source, target))
+        copy.start()
+        written = 0
+        # Each write restarts the copy; past BACKUP_MAX_RESTARTS it finishes in one step
+        while copy.is_alive():
+            try:
+                conn.execute("INSERT INTO t VALUES ('y')")
+                conn.commit()
+                written += 1
+            except sqlite3.OperationalError:
+                pass
+            time.sleep(0.005)
+        copy.join()
+
+        self.assertGreater(written, 0)
+        copied = sqlite3.connect(target)
+        self.addCleanup(copied.close)
+        self.assertIn(copied.execute('SELECT COUNT(*) FROM t').fetchone()[0], range(100, 101 + written))
+
+
+# ----------------- Export Jobs -----------------
+class ExportTestCase(TestCase):
+    # run_jobs visits every school
+    databases = SCHOOL_DATABASES
+    params = {'days': 30, 'as_of': '2025-03-01'}
+
+    def setUp(self):
+        export_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, export_dir)
+        exports = override_settings(EXPORT_DIR=export_dir)
+        exports.enable()
+        self.addCleanup(exports.disable)
+        executor = mock.patch.object(jobs, '_executor')
+        self.executor = executor.start()
+        self.addCleanup(executor.stop)
+
+
+class ExportJobTests(ExportTestCase):
+    def test_identical_submits_share_a_job(self):
+        first = jobs.submit('moods_csv', self.params)
+        self.assertEqual(jobs.submit('moods_csv', self.params), first)
+        self.assertEqual(self.executor.return_value.submit.call_count, 1)
+
+    def test_only_one_active_job_per_key(self):
+        ExportJob.objects.create(kind='moods_csv', key='k')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ExportJob.objects.create(kind='moods_csv', key='k', status='running')
+        ExportJob.objects.create(kind='moods_csv', key='k', status='done')
+
+    def test_submit_racing_another_request_returns_its_job(self):
+        lookup = ExportJob.objects.filter
+        theirs = []
+
+        def other_request_commits_after_our_lookup(*args, **kwargs):
+            if theirs:
+                return lookup(*args, **kwargs)
+            theirs.append(ExportJob.objects.create(kind='moods_csv', params=self.params, key=kwargs['key']))
+            return ExportJob.objects.none()
+
+        with mock.patch.object(ExportJob.objects, 'filter', other_request_commits_after_our_lookup):
+            job = jobs.submit('moods_csv', self.params)
+
+        self.assertEqual(job, theirs[0])
+        self.assertEqual(ExportJob.objects.count(), 1)
+        self.executor.return_value.submit.assert_not_called()
+
+    def test_run_jobs_runs_queued_jobs(self):
+        job = jobs.submit('moods_csv', self.params)
+        call_command('run_jobs', stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'done')
+        self.assertTrue(os.path.exists(job.result_path))
+
+
+@needs_tenants
+class SchoolExportJobTests(ExportTestCase):
+    def test_run_jobs_covers_every_school(self):
+        north, south = settings.SCHOOL_TENANTS[:2]
+        for slug in (north, south):
+            with use_tenant(slug):
+                jobs.submit('moods_csv', self.params)
+
+        call_command('run_jobs', stdout=StringIO())
+
+        for slug in (north, south):
+            with use_tenant(slug):
+                job = ExportJob.objects.get()
+                self.assertEqual(job.status, 'done')
+                self.assertIn(slug, os.path.basename(job.result_path))
+
+
+# ----------------- Parquet Export -----------------
+@skipUnless(parquet_available(), "needs pyarrow")
+class ParquetExportTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        self.path = os.path.join(tmp, 'moods.parquet')
+        student = make_student('amy')
+        self.moods = ['happy', 'sad', 'calm', 'happy', 'angry']
+        for i, mood in enumerate(self.moods):
+            make_entry(student, date(2024, 9, 2) + timedelta(days=i), mood, f"note {i}")
+
+    def test_round_trip(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        call_command('export_moods', self.path, '--row-group-size=2', stdout=StringIO())
+
+        table = pq.read_table(self.path)
+        self.assertEqual(table.num_rows, 5)
+        self.assertTrue(pa.types.is_dictionary(table.schema.field('mood').type))
+        self.assertEqual(table.column('mood').to_pylist(), self.moods)
+        self.assertEqual(table.column('valence').to_pylist(), [MoodEntry.MOOD_VALENCE[MoodEntry.MOOD_CODES[m]] for m in self.moods])
+        self.assertEqual(table.column('date').to_pylist()[-1], date(2024, 9, 6))
+        self.assertEqual(table.column('class_group').to_pylist(), ['7A'] * 5)
+        metadata = pq.ParquetFile(self.path).metadata
+        self.assertEqual([metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)], [2, 2, 1])
+
+    def test_date_range_and_no_comments(self):
+        import pyarrow.parquet as pq
+
+        call_command('export_moods', self.path, '--start=2024-09-03', '--end=2024-09-04', '--no-comments', stdout=StringIO())
+
+        table = pq.read_table(self.path)
+        self.assertEqual(table.column('mood').to_pylist(), ['sad', 'calm'])
+        self.assertNotIn('comment', table.column_names)
+
+
+# ----------------- Class Heatmap -----------------
+@override_settings(CACHES={**settings.CACHES, 'reports': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'heatmap-tests'}})
+class HeatmapTests(TestCase):
+    start, end, today = date(2024, 9, 2), date(2024, 9, 6), date(2024, 9, 9)
+
+    def setUp(self):
+        forget_history()
+        self.students = [make_student(f"s{i}", class_group=['7A', '7B', ''][i % 3]) for i in range(6)]
+        moods = [slug for _, slug, *_ in MOODS]
+        for i, student in enumerate(self.students):
+            for d in range(5):
+                if (i + d) % 4:
+                    make_entry(student, self.start + timedelta(days=d), moods[(i * 3 + d) % len(moods)])
+
+    def heatmap(self):
+        return mood_heatmap(self.start, self.end, today=self.today)
+
+    def test_counts_match_a_naive_count(self):
+        heatmap = self.heatmap()
+
+        expected = {}
+        for entry in MoodEntry.objects.select_related('user__userprofile'):
+            cell = expected.setdefault((entry.user.userprofile.class_group, entry.date.isoformat()), [0] * len(MOODS))
+            cell[heatmap['moods'].index(entry.mood_slug)] += 1
+        counted = {
+            (group, day): cell
+            for group, row in zip(heatmap['classes'], heatmap['counts'])
+            for day, cell in zip(heatmap['dates'], row)
+            if any(cell)
+        }
+        self.assertEqual(heatmap['classes'], ['', '7A', '7B'])
+        self.assertEqual(counted, expected)
+
+    def test_finished_days_come_from_the_cache(self):
+        first = self.heatmap()
+        # update() skips the signals, so only the cache can hide this entry
+        make_entry(self.students[0], self.start, 'sad')
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.heatmap(), first)
+
+    def test_forget_history_starts_a_new_generation(self):
+        first = self.heatmap()
+        make_entry(self.students[0], self.start, 'sad')
+        forget_history()
+
+        second = self.heatmap()
+        self.assertEqual(sum(second['counts'][1][0]), sum(first['counts'][1][0]) + 1)
+
+    def test_editing_a_past_entry_invalidates(self):
+        self.heatmap()
+        entry = MoodEntry.objects.filter(user=self.students[1], date=self.start).get()
+        entry.mood = MoodEntry.MOOD_CODES['sad']
+        entry.save()
+
+        with self.assertNumQueries(1):
+            self.heatmap()
+
+
+# ----------------- Comment Risk Flags -----------------
+KEYWORDS = {
+    'self_harm': ['self harm', 'hurt myself'],
+    'bullying': ['bully', 'picking on me'],
+    'unsafe': ['abus*'],
+    'hopeless': [],
+}
+
+
+@override_settings(COMMENT_RISK_KEYWORDS=KEYWORDS)
+class CommentRiskTests(SimpleTestCase):
+    def test_whole_words_any_case(self):
+        self.assertEqual(comment_risk('A BULLY took my bag'), RISK_BITS['bullying'])
+        self.assertEqual(comment_risk('bullyproof vest'), 0)
+
+    def test_wildcard_matches_word_endings_only(self):
+        for text in ('abuse', 'he was abusive', 'Abused'):
+            self.assertEqual(comment_risk(text), RISK_BITS['unsafe'], text)
+        self.assertEqual(comment_risk('disabuse'), 0)
+
+    def test_multi_word_phrases_allow_spaces_and_hyphens(self):
+        for text in ('self harm', 'self-harm', 'self -  harm', 'thinking about SELF\nHARM'):
+            self.assertEqual(comment_risk(text), RISK_BITS['self_harm'], text)
+        self.assertEqual(comment_risk('selfharm'), 0)
+
+    def test_every_category_found_is_flagged(self):
+        flags = comment_risk('they keep picking on me and I want to hurt myself')
+        self.assertEqual(risk_labels(flags), ['Self-harm', 'Bullying'])
+
+    def test_nothing_to_check(self):
+        self.assertEqual(comment_risk(''), 0)
+        self.assertEqual(comment_risk(None), 0)
+        with override_settings(COMMENT_RISK_KEYWORDS={}):
+            self.assertEqual(comment_risk('bully'), 0)
+
+
+class FlagCommentsTests(TestCase):
+    def test_recheck_updates_only_changed_flags(self):
+        student = make_student('amy')
+        with override_settings(COMMENT_RISK_KEYWORDS={}):
+            entries = [make_entry(student, date(2025, 3, day), 'sad', text) for day, text in
+                       [(1, 'a bully again'), (2, 'fine'), (3, 'self-harm'), (4, 'bully')]]
+        stamps = dict(MoodEntry.objects.values_list('pk', 'updated_at'))
+
+        with override_settings(COMMENT_RISK_KEYWORDS=KEYWORDS):
+            call_command('flag_comments', workers=1, batch_size=2, dry_run=True, stdout=StringIO())
+            self.assertFalse(MoodEntry.objects.filter(risk_flags__gt=0).exists())
+            out = StringIO()
+            call_command('flag_comments', workers=1, batch_size=2, stdout=out)
+
+        flags = dict(MoodEntry.objects.values_list('pk', 'risk_flags'))
+        self.assertEqual([flags[e.pk] for e in entries],
+                         [RISK_BITS['bullying'], 0, RISK_BITS['self_harm'], RISK_BITS['bullying']])
+        self.assertIn('changed 3', out.getvalue())
+        self.assertEqual(dict(MoodEntry.objects.values_list('pk', 'updated_at')), stamps)
+
+
+# ----------------- Metrics -----------------
+class MetricsTests(SimpleTestCase):
+    def setUp(self):
+        self.registry = metrics.Registry()
+
+    def snapshot(self):
+        return {'counters': self.registry.counters, 'histograms': self.registry.histograms}
+
+    def test_histogram_buckets_are_cumulative(self):
+        for seconds in (0.003, 0.02, 0.02, 30):
+            self.registry.observe('wellbeing_request_seconds', seconds, view='checkin')
+
+        text = metrics.render(self.snapshot())
+
+        self.assertIn('wellbeing_request_seconds_bucket{view="checkin",le="0.005"} 1\n', text)
+        self.assertIn('wellbeing_request_seconds_bucket{view="checkin",le="0.025"} 3\n', text)
+        self.assertIn('wellbeing_request_seconds_bucket{view="checkin",le="10"} 3\n', text)
+        self.assertIn('wellbeing_request_seconds_bucket{view="checkin",le="+Inf"} 4\n', text)
+        self.assertIn('wellbeing_request_seconds_count{view="checkin"} 4\n', text)
+        self.assertIn('wellbeing_request_seconds_sum{view="checkin"} 30.043\n', text)
+
+    def test_merge_adds_counters_and_histograms(self):
+        self.registry.incr('wellbeing_checkins_total', path='spool')
+        self.registry.observe('wellbeing_db_query_seconds', 0.001, db='default')
+        other = metrics.Registry()
+        other.incr('wellbeing_checkins_total', 2, path='spool')
+        other.incr('wellbeing_checkins_total', path='direct')
+        other.observe('wellbeing_db_query_seconds', 0.3, db='default')
+
+        total = metrics.merge(metrics.merge({'counters': {}, 'histograms': {}}, self.snapshot()),
+                              {'counters': other.counters, 'histograms': other.histograms})
+        text = metrics.render(total)
+
+        self.assertIn('wellbeing_checkins_total{path="spool"} 3\n', text)
+        self.assertIn('wellbeing_checkins_total{path="direct"} 1\n', text)
+        self.assertIn('wellbeing_db_query_seconds_count{db="default"} 2\n', text)
+        self.assertIn('wellbeing_db_query_seconds_bucket{db="default",le="0.001"} 1\n', text)
+
+    def test_label_values_are_escaped(self):
+        self.registry.incr('wellbeing_cache_requests_total', cache='a"b\\c\nd', result='hit')
+        text = metrics.render(self.snapshot())
+        self.assertIn('wellbeing_cache_requests_total{cache="a\\"b\\\\c\\nd",result="hit"} 1\n', text)
+
+    def test_every_metric_has_help_and_type(self):
+        text = metrics.render({'counters': {}, 'histograms': {}})
+        for name in [*metrics.COUNTERS, *metrics.HISTOGRAMS]:
+            self.assertIn(f"# HELP {name} ", text)
+            self.assertIn(f"# TYPE {name} ", text)
+
+    def test_retired_workers_still_count(self):
+        metrics_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, metrics_dir)
+        with override_settings(METRICS_DIR=metrics_dir):
+            for pid, count in ((101, 2), (102, 5)):
+                registry = metrics.Registry()
+                registry.incr('wellbeing_checkins_total', count, path='direct')
+                metrics._write(metrics._path(f"{pid}.json"),
+                               {'counters': registry.counters, 'histograms': registry.histograms})
+            metrics.retire(101)
+            metrics.retire(102)
+            metrics.retire(103)
+
+            self.assertEqual(sorted(os.listdir(metrics_dir)), [metrics.RETIRED])
+            total = metrics._read(metrics._path(metrics.RETIRED))
+        self.assertEqual(total['counters']['wellbeing_checkins_total'], {metrics._key({'path': 'direct'}): 7})
+
+
+class HealthEndpointTests(TestCase):
+    databases = SCHOOL_DATABASES
+
+    def test_ready_when_every_database_answers(self):
+        response = self.client.get(reverse('readiness'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()['db_ms']), {alias for alias in settings.DATABASES if not alias.endswith('_replica')})
+
+    def test_missing_database_file_is_not_ready_and_not_created(self):
+        missing = os.path.join(tempfile.mkdtemp(), 'school.sqlite3')
+        self.addCleanup(shutil.rmtree, os.path.dirname(missing))
+
+        with mock.patch.dict(connection.settings_dict, NAME=missing):
+            response = self.client.get(reverse('readiness'))
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()['db_ms'][DEFAULT_DB_ALIAS], 'database file missing')
+        self.assertFalse(os.path.exists(missing))
+
+    @override_settings(METRICS_TOKEN='', DEBUG=False)
+    def test_metrics_need_a_token_in_production(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        with self.settings(DEBUG=True):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
+
+    @override_settings(METRICS_TOKEN='s3cret')
+    def test_metrics_check_the_token(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 401)
+        response = self.client.get(reverse('metrics'), headers={'Authorization': 'Bearer s3cret'})
+        self.assertEqual(response.status_code, 200)
+
+
+# ----------------- Rate Limits -----------------
+class RateLimitTests(SimpleTestCase):
+    # Window 1000 covers 60000..60060
+    start = 60000.0
+
+    def setUp(self):
+        spool_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, spool_dir)
+        limits = override_settings(
+            RATE_LIMIT_PATH=os.path.join(spool_dir, 'ratelimit.sqlite3'),
+            RATE_LIMITS={'test': {'ip': (10, 60), 'email': (3, 60)}},
+        )
+        limits.enable()
+        self.addCleanup(limits.disable)
+        self.addCleanup(lambda: ratelimit._local.conn.close())
+
+    def hits(self, count, at, **found):
+        return [ratelimit.hit('test', found or {'ip': '1.2.3.4'}, now=at) for _ in range(count)]
+
+    def test_refused_once_the_window_is_spent(self):
+        self.assertEqual(self.hits(10, self.start + 15), [None] * 10)
+        self.assertEqual(self.hits(1, self.start + 15), [('ip', 46)])
+        # The whole window's hits still weigh 10 at the very start of the next
+        self.assertEqual(self.hits(1, self.start + 60), [('ip', 1)])
+        self.assertEqual(self.hits(1, self.start + 61), [None])
+
+    def test_previous_window_weighted_by_overlap(self):
+        self.hits(10, self.start + 59)
+        # Halfway through the next window the old hits count for 5
+        self.assertEqual(self.hits(6, self.start + 90), [None] * 5 + [('ip', 1)])
+
+    def test_retry_after_waits_for_the_previous_window_to_fade(self):
+        self.hits(10, self.start + 30)
+        self.hits(1, self.start + 61)
+        # 10 * (1 - 1/60) + 1 > 10 now; 10 * (1 - 6/60) + 1 is exactly 10, still refused
+        self.assertEqual(self.hits(1, self.start + 61), [('ip', 6)])
+        self.assertEqual(self.hits(1, self.start + 66), [('ip', 1)])
+        self.assertEqual(self.hits(1, self.start + 67), [None])
+
+    def test_refused_requests_are_not_counted(self):
+        self.hits(10, self.start)
+        self.hits(50, self.start + 1)
+        self.assertEqual(self.hits(1, self.start + 120), [None])
+
+    def test_budgets_are_per_identity_and_kind(self):
+        self.hits(3, self.start, ip='1.2.3.4', email='amy@example.com')
+        self.assertEqual(self.hits(1, self.start, ip='1.2.3.4', email='amy@example.com'), [('email', 61)])
+        self.assertEqual(self.hits(1, self.start, ip='1.2.3.4', email='ben@example.com'), [None])
+        self.assertEqual(self.hits(1, self.start, ip='5.6.7.8'), [None])
+
+    def test_old_windows_pruned(self):
+        ratelimit._pruned_at = 0.0
+        self.hits(1, self.start)
+        self.hits(1, self.start + 1000)
+        rows = ratelimit._counts().execute('SELECT window FROM ratelimit_hits').fetchall()
+        self.assertEqual(rows, [(1016,)])
+
+    def test_decorator_answers_429_with_retry_after(self):
+        view = ratelimit.rate_limited('test', methods=('POST',))(lambda request: HttpResponse('ok'))
+        factory = RequestFactory()
+        with mock.patch.object(ratelimit.time, 'time', return_value=self.start + 50):
+            responses = [view(factory.post('/', {'email': 'Amy@example.com'})) for _ in range(4)]
+            self.assertEqual(view(factory.get('/')).status_code, 200)
+
+        self.assertEqual([r.status_code for r in responses], [200, 200, 200, 429])
+        self.assertEqual(responses[-1]['Retry-After'], '11')
+
+
+# ----------------- Low-Mood Digests -----------------
+@override_settings(DIGEST_INTERVAL_MINUTES=60, DIGEST_SETTLE_SECONDS=300, DIGEST_SCHOOL_WIDE=True)
+class DigestTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        for username, class_group in (('mrs_a', '7A'), ('mr_b', '7B'), ('head', '')):
+            teacher = User.objects.create_user(username, f"{username}@school.test", first_name=username)
+            UserProfile.objects.create(user=teacher, user_type='teacher', class_group=class_group)
+
+    def checkin(self, username, class_group, mood, minutes_ago=10, comment=''):
+        """A check-in whose updated_at is `minutes_ago` before the settle point of self.now."""
+        user = User.objects.filter(username=username).first() or make_student(username, class_group)
+        entry = make_entry(user, timezone.localdate(self.now), mood, comment)
+        stamp = self.now - timedelta(seconds=300, minutes=minutes_ago)
+        MoodEntry.objects.filter(pk=entry.pk).update(updated_at=stamp)
+        return entry
+
+    def test_one_message_per_teacher_for_their_class(self):
+        self.checkin('amy', '7A', 'sad')
+        self.checkin('ben', '7A', 'happy')
+        self.checkin('zed', '7B', 'happy', comment='they keep picking on me')
+
+        events, messages = send_digests(now=self.now)
+
+        self.assertEqual((events, len(mail.outbox)), (2, 3))
+        sent = {m.to[0]: m for m in mail.outbox}
+        self.assertIn('amy', sent['mrs_a@school.test'].body)
+        self.assertNotIn('zed', sent['mrs_a@school.test'].body)
+        self.assertTrue(sent['mr_b@school.test'].subject.endswith('(1 flagged) - 7B'))
+        self.assertIn('amy', sent['head@school.test'].body)
+        self.assertIn('zed', sent['head@school.test'].body)
+        self.assertEqual(DigestRun.objects.get().messages, 3)
+
+    def test_nothing_sent_without_events(self):
+        self.checkin('amy', '7A', 'happy')
+        self.assertEqual(send_digests(now=self.now), (0, []))
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(DigestRun.objects.get().events, 0)
+
+    def test_interval_gate(self):
+        send_digests(now=self.now)
+        self.assertIsNone(window(self.now + timedelta(minutes=59)))
+        self.assertIsNone(send_digests(now=self.now + timedelta(minutes=59)))
+        since, until = window(self.now + timedelta(minutes=60))
+        self.assertEqual(since, DigestRun.objects.get().until)
+        self.assertEqual(until, self.now + timedelta(minutes=60) - timedelta(seconds=300))
+
+    def test_failed_send_loses_nothing(self):
+        self.checkin('amy', '7A', 'sad')
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError('down')):
+            with self.assertRaises(OSError):
+                send_digests(now=self.now)
+        self.assertFalse(DigestRun.objects.exists())
+
+        send_digests(now=self.now + timedelta(minutes=5))
+
+        self.assertIn('amy', mail.outbox[0].body)
+
+    def test_entry_committed_after_its_stamp_is_still_reported(self):
+        send_digests(now=self.now)
+        # Stamped two minutes before that pass but committed after it
+        entry = self.checkin('amy', '7A', 'sad')
+        MoodEntry.objects.filter(pk=entry.pk).update(updated_at=self.now - timedelta(minutes=2))
+
+        events, _ = send_digests(now=self.now + timedelta(minutes=60))
+
+        self.assertEqual(events, 1)
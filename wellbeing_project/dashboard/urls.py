@@ -10,6 +10,16 @@ urlpatterns = [
     path('teacher/results/', views.teacher_results, name='teacher_results'),
     path('teacher/students/', views.teacher_students, name='teacher_students'),
     path('teacher/settings/', views.teacher_settings, name='teacher_settings'),
+    path('teacher/reports/', views.teacher_reports, name='teacher_reports'),
+    path('teacher/search/', views.teacher_search, name='teacher_search'),
+    path('api/comments/search/', views.comment_search_api, name='comment_search_api'),
+    path('api/heatmap/', views.mood_heatmap_api, name='mood_heatmap_api'),
+    path('teacher/exports/', views.export_start, name='export_start'),
+    path('teacher/exports/<int:job_id>/', views.export_status, name='export_status'),
+    path('teacher/exports/<int:job_id>/download/', views.export_download, name='export_download'),
 path('moods_csv/', views.moods_csv, name='moods_csv'),
+    path('health/', views.home, name='health'),
+    path('ready/', views.readiness, name='readiness'),
+    path('metrics', views.metrics_view, name='metrics'),
 
 ]
\ No newline at end of file
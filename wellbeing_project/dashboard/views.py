@@ -1,19 +1,37 @@
 import os
 import csv
+import hmac
+import time
+import uuid
 from datetime import datetime, timedelta
 
-from django.shortcuts import render, redirect
+from django.shortcuts import get_object_or_404, render, redirect
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.models import User
+from django.db import DatabaseError, connections
 from django.db.models import Count
-from django.http import HttpResponse
-
-from .models import UserProfile, MoodEntry
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.views.decorators.http import require_POST
+
+from . import metrics
+from .checkin_queue import enqueue_checkin, has_pending
+from .columnar import parquet_available
+from .heatmap import mood_heatmap
+from .jobs import MOODS_CSV_HEADER, moods_csv_row, submit
+from .models import MOODS, ExportJob, UserProfile, MoodEntry, ReportSnapshot
+from .ratelimit import rate_limited
+from .replica import reads_from_replica
+from .reports import term_bounds
+from .search import search_comments
+from .tenants import move_membership, tenant_for_email, use_tenant
 
 
 # ----------------- Authentication Views -----------------
+@rate_limited('login', methods=('POST',))
 def login_view(request):
     if request.method == 'POST':
         email = request.POST.get('email', '').strip()
@@ -23,25 +41,17 @@ def login_view(request):
         if not email or '@' not in email:
             return render(request, 'login.html', {'error': 'Please enter a valid email.'})
 
-        try:
-            user_obj = User.objects.get(email=email)
-        except User.DoesNotExist:
-            return render(request, 'login.html', {'error': 'No account found with this email'})
-
-        user = authenticate(request, username=user_obj.username, password=password)
-        if user is None:
-            return render(request, 'login.html', {'error': 'Invalid password'})
-
-        try:
-            profile = UserProfile.objects.get(user=user)
-            if profile.user_type != user_type:
-                return render(request, 'login.html', {
-                    'error': f"Account is registered as {profile.user_type}, not {user_type}"
-                })
-        except UserProfile.DoesNotExist:
-            return render(request, 'login.html', {'error': 'Profile missing for this account'})
+        # The school directory decides which database this account lives in
+        tenant = tenant_for_email(email)
+        with use_tenant(tenant):
+            user = authenticate(request, email=email, password=password, user_type=user_type)
+            if user is None:
+                error = getattr(request, 'login_error', 'Invalid email or password')
+                return render(request, 'login.html', {'error': error})
 
-        login(request, user)
+            login(request, user)
+        if tenant:
+            request.session['tenant'] = tenant
 
         return redirect('student_checkin' if user_type == 'student' else 'teacher_dashboard')
 
@@ -54,6 +64,7 @@ def logout_view(request):
 
 
 # ----------------- Student Views -----------------
+@rate_limited('checkin')
 @login_required
 def student_checkin(request):
     profile = UserProfile.objects.get(user=request.user)
@@ -61,21 +72,41 @@ def student_checkin(request):
         return redirect('teacher_dashboard')
 
     today = datetime.now().date()
-    has_checked = MoodEntry.objects.filter(user=request.user, date=today).exists()
 
     if request.method == 'POST':
-        mood = request.POST.get('mood')
+        mood = MoodEntry.MOOD_CODES.get(request.POST.get('mood'))
         comment = request.POST.get('comment', '')
 
-        MoodEntry.objects.update_or_create(
-            user=request.user,
-            date=today,
-            defaults={'mood': mood, 'comment': comment}
-        )
+        if mood is None:
+            return render(request, 'student_checkin.html', {
+                'error': 'Please pick a mood.',
+                'checkin_key': uuid.uuid4().hex,
+            })
+
+        if settings.CHECKIN_QUEUE_ENABLED:
+            # Scoped to the student so a replayed key cannot touch anyone else's entry
+            key = request.POST.get('checkin_key', '')[:64] or uuid.uuid4().hex
+            enqueue_checkin(request.user.pk, today, mood, comment, f"{request.user.pk}:{key}")
+            metrics.incr('wellbeing_checkins_total', path='spool')
+        else:
+            MoodEntry.objects.update_or_create(
+                user=request.user,
+                date=today,
+                # timestamp is when the student last submitted; the queue compares against it
+                defaults={'mood': mood, 'comment': comment, 'timestamp': timezone.now()}
+            )
+            metrics.incr('wellbeing_checkins_total', path='direct')
 
         return render(request, 'student_checkin.html', {'success': True})
 
-    return render(request, 'student_checkin.html', {'already_checked': has_checked})
+    has_checked = MoodEntry.objects.filter(user=request.user, date=today).exists()
+    if not has_checked and settings.CHECKIN_QUEUE_ENABLED:
+        has_checked = has_pending(request.user.pk, today)
+
+    return render(request, 'student_checkin.html', {
+        'already_checked': has_checked,
+        'checkin_key': uuid.uuid4().hex,
+    })
 
 
 @login_required
@@ -89,7 +120,7 @@ def student_history(request):
     chart_data = [
         {
             'date': entry.date.strftime('%b %d'),
-            'mood': entry.mood,
+            'mood': entry.mood_slug,
             'emoji': entry.get_emoji() if hasattr(entry, 'get_emoji') else ''
         }
         for entry in reversed(entries)
@@ -117,7 +148,7 @@ def teacher_dashboard(request):
     checked_today = MoodEntry.objects.filter(date=today).values('user').distinct().count()
     mood_counts = MoodEntry.objects.filter(date=today).values('mood').annotate(count=Count('mood'))
 
-    mood_data = {m['mood']: m['count'] for m in mood_counts}
+    mood_data = {MoodEntry.MOOD_SLUGS[m['mood']]: m['count'] for m in mood_counts}
     total = sum(mood_data.values())
 
     mood_percentages = {
@@ -125,11 +156,17 @@ def teacher_dashboard(request):
         for mood, count in mood_data.items()
     }
 
-    low_moods = ['sad', 'stressed', 'angry', 'worried']
-    low_entries = MoodEntry.objects.filter(date=today, mood__in=low_moods).select_related('user')
+    low_entries = MoodEntry.objects.filter(date=today, mood__in=MoodEntry.LOW_MOODS).select_related('user')
 
     weekly_moods = MoodEntry.objects.filter(date__gte=week_ago).values('mood').annotate(count=Count('mood'))
 
+    # Flagged when saved, so this reads the partial index rather than the comments
+    flagged_entries = (
+        MoodEntry.objects.filter(date__gte=week_ago, risk_flags__gt=0)
+        .select_related('user')
+        .order_by('-date', '-timestamp')[:50]
+    )
+
     context = {
         'total_students': total_students,
         'checked_in_today': checked_today,
@@ -139,12 +176,14 @@ def teacher_dashboard(request):
         'low_mood_entries': low_entries,
         'low_mood_count': low_entries.count(),
         'weekly_moods': weekly_moods[:3],
+        'flagged_entries': flagged_entries,
     }
 
     return render(request, 'teacher_dashboard.html', context)
 
 
 @login_required
+@reads_from_replica
 def teacher_results(request):
     profile = UserProfile.objects.get(user=request.user)
     if profile.user_type != 'teacher':
@@ -157,6 +196,7 @@ def teacher_results(request):
 
 
 @login_required
+@reads_from_replica
 def teacher_students(request):
     profile = UserProfile.objects.get(user=request.user)
     if profile.user_type != 'teacher':
@@ -169,7 +209,7 @@ def teacher_students(request):
         latest = MoodEntry.objects.filter(user=s).order_by('-date').first()
         student_list.append({
             'name': s.get_full_name() or s.username,
-            'latest_mood': latest.mood if latest else "No data",
+            'latest_mood': latest.get_mood_display() if latest else "No data",
             'emoji': latest.get_emoji() if latest else "❓",
             'date': latest.date if latest else None
         })
@@ -185,9 +225,12 @@ def teacher_settings(request):
 
     if request.method == 'POST':
         user = request.user
+        old_email = user.email
         user.first_name = request.POST.get('first_name', user.first_name)
         user.email = request.POST.get('email', user.email)
         user.save()
+        # Login finds the school by email, so the directory has to follow the change
+        move_membership(old_email, user.email)
 
         if request.POST.get('new_password'):
             user.set_password(request.POST['new_password'])
@@ -198,29 +241,268 @@ def teacher_settings(request):
     return render(request, 'teacher_settings.html')
 
 
+# ----------------- Counsellor Comment Search -----------------
+SEARCH_LIMIT = 50
+SEARCH_MAX_LIMIT = 200
+
+
+def _search_limit(request):
+    try:
+        return max(1, min(int(request.GET.get('limit', SEARCH_LIMIT)), SEARCH_MAX_LIMIT))
+    except ValueError:
+        return SEARCH_LIMIT
+
+
+@login_required
+def teacher_search(request):
+    profile = UserProfile.objects.get(user=request.user)
+    if profile.user_type != 'teacher':
+        return redirect('student_checkin')
+
+    query = request.GET.get('q', '').strip()
+    results = search_comments(query, limit=_search_limit(request)) if query else []
+
+    return render(request, 'teacher_search.html', {'query': query, 'results': results})
+
+
+@login_required
+def comment_search_api(request):
+    profile = UserProfile.objects.get(user=request.user)
+    if profile.user_type != 'teacher':
+        return JsonResponse({'error': 'Teachers only'}, status=403)
+
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return JsonResponse({'error': 'Missing q parameter'}, status=400)
+
+    results = []
+    for hit in search_comments(query, limit=_search_limit(request)):
+        entry = hit['entry']
+        user = entry.user
+        profile = getattr(user, 'userprofile', None) if user else None
+        results.append({
+            'id': entry.id,
+            'student': (user.get_full_name() or user.username) if user else None,
+            'username': user.username if user else None,
+            'class_group': profile.class_group if profile else '',
+            'date': entry.date.isoformat(),
+            'mood': entry.mood_slug,
+            'comment': entry.comment,
+            'snippet_html': hit['snippet_html'],
+            'score': hit['score'],
+        })
+
+    return JsonResponse({'query': query, 'count': len(results), 'results': results})
+
+
+# ----------------- Class Heatmap -----------------
+HEATMAP_MAX_DAYS = 366
+
+
+def _parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return None
+
+
+@login_required
+def mood_heatmap_api(request):
+    """Class x day x mood counts; defaults to the current term so far."""
+    profile = UserProfile.objects.get(user=request.user)
+    if profile.user_type != 'teacher':
+        return JsonResponse({'error': 'Teachers only'}, status=403)
+
+    today = datetime.now().date()
+    start, end = term_bounds(today)
+    end = min(end, today)
+    if request.GET.get('start') or request.GET.get('end'):
+        start, end = _parse_date(request.GET.get('start')), _parse_date(request.GET.get('end')) or today
+        if start is None or end is None:
+            return JsonResponse({'error': 'start and end must be YYYY-MM-DD'}, status=400)
+    if start > end or (end - start).days >= HEATMAP_MAX_DAYS:
+        return JsonResponse({'error': f'Pick a range of 1 to {HEATMAP_MAX_DAYS} days'}, status=400)
+
+    return JsonResponse(mood_heatmap(start, end, today=today))
+
+
+# ----------------- Period Reports -----------------
+@login_required
+@reads_from_replica
+def teacher_reports(request):
+    """Weekly and term summaries, read straight from the nightly snapshots."""
+    profile = UserProfile.objects.get(user=request.user)
+    if profile.user_type != 'teacher':
+        return redirect('student_checkin')
+
+    period = request.GET.get('period', 'week')
+    if period not in dict(ReportSnapshot.PERIOD_CHOICES):
+        period = 'week'
+
+    snapshots = ReportSnapshot.objects.filter(period=period)
+    available = list(snapshots.filter(scope='school').values_list('start', 'end'))
+
+    start = available[0][0] if available else None
+    if request.GET.get('start'):
+        try:
+            start = datetime.strptime(request.GET['start'], '%Y-%m-%d').date()
+        except ValueError:
+            pass
+
+    rows = list(snapshots.filter(start=start)) if start else []
+    school = next((r for r in rows if r.scope == 'school'), None)
+    classes = [r for r in rows if r.scope == 'class']
+
+    moods = []
+    if school:
+        moods = [
+            {'label': label, 'emoji': emoji, 'count': school.data['moods'][slug]}
+            for code, slug, label, emoji, valence in MOODS
+            if slug in school.data['moods']
+        ]
+
+    return render(request, 'teacher_reports.html', {
+        'period': period,
+        'periods': ReportSnapshot.PERIOD_CHOICES,
+        'available': available,
+        'start': start,
+        'school': school,
+        'classes': classes,
+        'moods': moods,
+    })
+
+
 # ----------------- CSV Export -----------------
 @login_required
+@reads_from_replica
 def moods_csv(request):
     response = HttpResponse(content_type='text/csv')
     writer = csv.writer(response)
-    writer.writerow(['Student Name', 'Date', 'Mood', 'Comment', 'Timestamp'])
+    writer.writerow(MOODS_CSV_HEADER)
 
     entries = MoodEntry.objects.filter(
         date__gte=datetime.now().date() - timedelta(days=30)
     ).select_related('user')
 
     for e in entries:
-        writer.writerow([
-            e.user.get_full_name() or e.user.username,
-            e.date,
-            e.mood,
-            e.comment or '',
-            e.timestamp.strftime('%Y-%m-%d %H:%M:%S')
-        ])
+        writer.writerow(moods_csv_row(e))
 
     return response
 
 
+# ----------------- Background Exports -----------------
+EXPORT_MAX_DAYS = 400
+EXPORT_CONTENT_TYPES = {'.csv': 'text/csv', '.parquet': 'application/vnd.apache.parquet'}
+
+
+def _can_export(user):
+    return user.is_staff or UserProfile.objects.filter(user=user, user_type='teacher').exists()
+
+
+def _job_json(job):
+    data = {
+        'id': job.pk,
+        'kind': job.kind,
+        'status': job.status,
+        'percent': job.percent,
+        'done_rows': job.done_rows,
+        'total_rows': job.total_rows,
+        'status_url': reverse('export_status', args=[job.pk]),
+    }
+    if job.status == 'done':
+        data['download_url'] = reverse('export_download', args=[job.pk])
+    if job.status == 'failed':
+        data['error'] = job.error
+    return data
+
+
+@login_required
+@require_POST
+def export_start(request):
+    """Queue (or reuse) a moods export, CSV or Parquet; poll the returned status_url."""
+    if not _can_export(request.user):
+        return JsonResponse({'error': 'Teachers only'}, status=403)
+    try:
+        days = max(1, min(int(request.POST.get('days', 30)), EXPORT_MAX_DAYS))
+    except ValueError:
+        return JsonResponse({'error': 'days must be a number'}, status=400)
+
+    today = datetime.now().date()
+    if request.POST.get('format') == 'parquet':
+        if not parquet_available():
+            return JsonResponse({'error': 'Parquet export is not installed on this server'}, status=400)
+        params = {'start': (today - timedelta(days=days)).isoformat(), 'end': today.isoformat()}
+        job = submit('moods_parquet', params, request.user)
+    else:
+        job = submit('moods_csv', {'days': days, 'as_of': today.isoformat()}, request.user)
+    return JsonResponse(_job_json(job), status=202)
+
+
+@login_required
+def export_status(request, job_id):
+    if not _can_export(request.user):
+        return JsonResponse({'error': 'Teachers only'}, status=403)
+    job = get_object_or_404(ExportJob, pk=job_id)
+    return JsonResponse(_job_json(job))
+
+
+@login_required
+def export_download(request, job_id):
+    if not _can_export(request.user):
+        return JsonResponse({'error': 'Teachers only'}, status=403)
+    job = get_object_or_404(ExportJob, pk=job_id, status='done')
+    if not os.path.exists(job.result_path):
+        raise Http404("This export has expired; start a new one")
+    suffix = os.path.splitext(job.result_path)[1]
+    return FileResponse(
+        open(job.result_path, 'rb'),
+        as_attachment=True,
+        filename=f"{job.kind}-{job.finished_at:%Y%m%d-%H%M}{suffix}",
+        content_type=EXPORT_CONTENT_TYPES.get(suffix, 'application/octet-stream'),
+    )
+
+
 # ----------------- Health / Home Endpoint -----------------
 def home(request):
     return HttpResponse("Wellbeing Dashboard running")
+
+
+def readiness(request):
+    """Ready when every database exists, has a schema and answers a trivial read within READINESS_MAX_DB_MS."""
+    ready, timings = True, {}
+    for alias in settings.DATABASES:
+        if alias.endswith('_replica'):
+            continue
+        connection = connections[alias]
+        # Connecting would create a missing SQLite file, which then looks healthy
+        if connection.vendor == 'sqlite' and not connection.is_in_memory_db() \
+                and not os.path.exists(connection.settings_dict['NAME']):
+            ready, timings[alias] = False, 'database file missing'
+            continue
+        started = time.perf_counter()
+        try:
+            with connection.cursor() as cursor:
+                # Touches the file (schema lock) without scanning anything
+                cursor.execute("PRAGMA schema_version")
+                migrated = cursor.fetchone()[0] > 0
+        except DatabaseError as exc:
+            ready, timings[alias] = False, str(exc)
+            continue
+        if not migrated:
+            ready, timings[alias] = False, 'no tables, not migrated'
+            continue
+        ms = round((time.perf_counter() - started) * 1000, 1)
+        timings[alias] = ms
+        ready = ready and ms <= settings.READINESS_MAX_DB_MS
+    return JsonResponse({'ready': ready, 'db_ms': timings}, status=200 if ready else 503)
+
+
+def metrics_view(request):
+    if not settings.METRICS_TOKEN and not settings.DEBUG:
+        # Without a token, metrics are only served in local development
+        return HttpResponse('Set METRICS_TOKEN to enable metrics', status=403)
+    if settings.METRICS_TOKEN and not hmac.compare_digest(
+        request.headers.get('Authorization', ''), f"Bearer {settings.METRICS_TOKEN}",
+    ):
+        return HttpResponse('Unauthorized', status=401)
+    return HttpResponse(metrics.render(metrics.collect()), content_type='text/plain; version=0.0.4; charset=utf-8')
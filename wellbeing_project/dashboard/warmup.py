@@ -0,0 +1,35 @@
+import gc
+import os
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.hashers import get_hashers
+from django.db import connections
+from django.template.loader import get_template
+from django.urls import get_resolver
+
+
+def warm_up():
+    """
+    Load everything a first request would otherwise pay for: URL patterns,
+    compiled templates, password hashers, model lookup tables. Meant to run
+    in the gunicorn master before it forks so workers share the result.
+    """
+    get_resolver().url_patterns
+    get_hashers()
+    # Fills each model's field and relation caches (_meta.get_fields())
+    for model in apps.get_models():
+        model._meta.get_fields()
+
+    templates = 0
+    for template_dir in settings.TEMPLATES[0]['DIRS']:
+        for name in sorted(os.listdir(template_dir)):
+            if name.endswith('.html'):
+                get_template(name)
+                templates += 1
+
+    # Forked workers must not share the master's SQLite handles
+    connections.close_all()
+    # Keep the warmed objects out of the collector so forked pages stay shared
+    gc.freeze()
+    return templates
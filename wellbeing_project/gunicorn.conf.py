@@ -0,0 +1,68 @@
+"""
+Gunicorn settings for the wellbeing dashboard.
+
+    gunicorn wellbeing_project.wsgi
+
+Requests spend most of their time waiting on Google Sheets or on SQLite,
+which only takes one writer at a time. A few processes with several
+threads each fit that mix better than many single-threaded processes,
+which would mostly queue on the database lock. Every value can be
+overridden from the environment.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+
+# Load Django once in the master; workers get it copy-on-write
+preload_app = True
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+workers = int(os.environ.get('WEB_CONCURRENCY', min(multiprocessing.cpu_count(), 4) or 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 20
+keepalive = 5
+
+# Recycle workers now and then to cap slow leaks; jitter avoids all
+# workers restarting at once
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = 100
+
+# Workers share metrics through files here (dashboard/metrics.py)
+os.environ.setdefault('METRICS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'metrics'))
+
+accesslog = '-'
+errorlog = '-'
+
+
+def on_starting(server):
+    from dashboard import metrics
+
+    metrics.clear()
+
+
+def when_ready(server):
+    # Runs in the master after the preloaded app is imported, before forking
+    from dashboard.warmup import warm_up
+
+    templates = warm_up()
+    server.log.info("Warmed up %d templates before forking workers", templates)
+
+
+def worker_abort(worker):
+    worker.log.warning("Worker %s timed out after %ss", worker.pid, timeout)
+
+
+def worker_exit(server, worker):
+    from dashboard import metrics
+
+    metrics.flush(force=True)
+
+
+def child_exit(server, worker):
+    # Keep the exited worker's counts, under one file, so totals don't drop
+    from dashboard import metrics
+
+    metrics.retire(worker.pid)
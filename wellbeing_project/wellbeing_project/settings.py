@@ -7,7 +7,6 @@ Generated by 'django-admin startproject' using Django 5.2.8.
 from pathlib import Path
 import os
 import json
-from google.oauth2 import service_account
 
 # ---------------------------------------------------------
 # BASE DIRECTORY
@@ -47,11 +46,16 @@ INSTALLED_APPS = [
 # MIDDLEWARE
 # ---------------------------------------------------------
 MIDDLEWARE = [
+    'dashboard.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'django.middleware.gzip.GZipMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
+    'dashboard.tenants.TenantMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'dashboard.middleware.SheetsReadScopeMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -90,6 +94,104 @@ DATABASES = {
     }
 }
 
+# One database file per school (see dashboard/tenants.py), e.g.
+# SCHOOL_TENANTS="north,south" -> tenants/north.sqlite3, tenants/south.sqlite3.
+# Create or update them all with `manage.py migrate_tenants`.
+SCHOOL_TENANTS = [slug.strip() for slug in os.environ.get("SCHOOL_TENANTS", "").split(",") if slug.strip()]
+TENANT_DB_DIR = os.environ.get("TENANT_DB_DIR", os.path.join(BASE_DIR, "tenants"))
+for _slug in SCHOOL_TENANTS:
+    DATABASES[f"school_{_slug}"] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(TENANT_DB_DIR, f"{_slug}.sqlite3"),
+    }
+
+# Read-only copies for exports and reports (see dashboard/replica.py).
+# READ_REPLICA=1 adds a "<alias>_replica" next to every database above;
+# copies older than READ_REPLICA_MAX_AGE seconds are refreshed in the
+# background and not read from. Cron `manage.py refresh_replicas` to keep
+# them warm, and run it after migrating.
+READ_REPLICA_ENABLED = os.environ.get("READ_REPLICA", "0") == "1"
+READ_REPLICA_MAX_AGE = int(os.environ.get("READ_REPLICA_MAX_AGE", "300"))
+READ_REPLICA_DIR = os.environ.get("READ_REPLICA_DIR", os.path.join(BASE_DIR, "replica"))
+if READ_REPLICA_ENABLED:
+    for _alias in list(DATABASES):
+        DATABASES[f"{_alias}_replica"] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(READ_REPLICA_DIR, f"{_alias}.sqlite3"),
+            'OPTIONS': {'init_command': 'PRAGMA query_only = ON'},
+            'TEST': {'MIRROR': _alias},
+        }
+
+DATABASE_ROUTERS = ['dashboard.replica.ReplicaRouter', 'dashboard.tenants.TenantRouter']
+
+
+# ---------------------------------------------------------
+# AUTHENTICATION
+# ---------------------------------------------------------
+# Students and teachers sign in by email; the admin still uses usernames
+AUTHENTICATION_BACKENDS = [
+    'dashboard.backends.EmailBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
+
+# Listed first = used for new hashes. Older formats still verify and are
+# rehashed in a background thread after the next successful login.
+PASSWORD_HASHERS = [
+    'dashboard.hashers.TunedPBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+    'dashboard.hashers.SheetsSHA256PasswordHasher',
+]
+
+# Work factor for new PBKDF2 hashes; see `manage.py bench_hashers`
+PBKDF2_ITERATIONS = int(os.environ.get("PBKDF2_ITERATIONS", 1_000_000))
+
+PASSWORD_REHASH_ASYNC = True
+PASSWORD_REHASH_QUEUE_SIZE = 1000
+
+
+# ---------------------------------------------------------
+# SESSIONS & CACHE
+# ---------------------------------------------------------
+# SESSION_BACKEND picks where sessions live:
+#   cached_db      - the "sessions" cache in front of django_session; page
+#                    views read the file cache, shared by every worker on
+#                    the host, and only logins write to SQLite (default)
+#   signed_cookies - in the browser, signed with SECRET_KEY; no database
+#                    access at all. Only with a private SECRET_KEY.
+#   db             - django_session only, as before
+# `manage.py prune_sessions` removes expired rows in small batches.
+SESSION_BACKEND = os.environ.get("SESSION_BACKEND", "cached_db")
+SESSION_ENGINE = {
+    "signed_cookies": "django.contrib.sessions.backends.signed_cookies",
+    "cached_db": "django.contrib.sessions.backends.cached_db",
+    "db": "django.contrib.sessions.backends.db",
+}[SESSION_BACKEND]
+SESSION_CACHE_ALIAS = "sessions"
+SESSION_COOKIE_AGE = 60 * 60 * 24 * 14
+
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "sessions": {
+        "BACKEND": "dashboard.metrics.CountingFileBasedCache",
+        "LOCATION": os.environ.get("SESSION_CACHE_DIR", os.path.join(BASE_DIR, "cache", "sessions")),
+        "TIMEOUT": SESSION_COOKIE_AGE,
+        # Django's default of 300 would cull live sessions back to the database;
+        # allow at least one per student and teacher
+        "OPTIONS": {"MAX_ENTRIES": int(os.environ.get("SESSION_CACHE_MAX_ENTRIES", 20000))},
+    },
+    # Finished days of the class heatmap (dashboard/heatmap.py), shared by all workers
+    "reports": {
+        "BACKEND": "dashboard.metrics.CountingFileBasedCache",
+        "LOCATION": os.environ.get("REPORTS_CACHE_DIR", os.path.join(BASE_DIR, "cache", "reports")),
+        "TIMEOUT": None,
+        "OPTIONS": {"MAX_ENTRIES": 20000},
+    },
+}
+
 
 # ---------------------------------------------------------
 # PASSWORD VALIDATION
@@ -116,6 +218,14 @@ USE_TZ = True
 # ---------------------------------------------------------
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
+
+# collectstatic writes content-hashed copies plus .gz/.br siblings;
+# WhiteNoise serves the hashed ones with a one-year immutable Cache-Control
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage"},
+}
 
 
 # ---------------------------------------------------------
@@ -124,9 +234,150 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
+# ---------------------------------------------------------
+# DATA RETENTION
+# ---------------------------------------------------------
+# Mood entries older than this are moved out of the database by
+# `manage.py archive_moods` into gzip JSONL files, one per school term.
+MOOD_RETENTION_DAYS = int(os.environ.get("MOOD_RETENTION_DAYS", 400))
+MOOD_ARCHIVE_DIR = os.environ.get("MOOD_ARCHIVE_DIR", os.path.join(BASE_DIR, "archive"))
+
+
+# ---------------------------------------------------------
+# CHECK-IN QUEUE
+# ---------------------------------------------------------
+# When on, student check-ins are written to a local spool file and applied
+# to the database by a background drainer (see dashboard/checkin_queue.py),
+# so a busy or locked database does not hold up the morning rush.
+# `manage.py drain_checkins` applies anything left over after a restart.
+CHECKIN_QUEUE_ENABLED = os.environ.get("CHECKIN_QUEUE_ENABLED", "0") == "1"
+CHECKIN_SPOOL_PATH = os.environ.get("CHECKIN_SPOOL_PATH", os.path.join(BASE_DIR, "spool", "checkins.sqlite3"))
+CHECKIN_DRAIN_BATCH_SIZE = 200
+
+
+# ---------------------------------------------------------
+# RATE LIMITS
+# ---------------------------------------------------------
+# Budgets per endpoint, as (requests, seconds) per client IP, login email
+# or signed-in user (see dashboard/ratelimit.py). A whole school can sit
+# behind one address, so the per-IP budgets are wide; the per-email and
+# per-user ones are what stop scripted retries. Counts are shared by the
+# workers on a host through RATE_LIMIT_PATH. Behind a proxy (Render: 1),
+# set RATE_LIMIT_PROXIES so X-Forwarded-For gives the client address.
+RATE_LIMIT_ENABLED = os.environ.get("RATE_LIMIT_ENABLED", "1") == "1"
+RATE_LIMIT_PATH = os.environ.get("RATE_LIMIT_PATH", os.path.join(BASE_DIR, "spool", "ratelimit.sqlite3"))
+RATE_LIMIT_PROXIES = int(os.environ.get("RATE_LIMIT_PROXIES", 0))
+RATE_LIMITS = {
+    'login': {'ip': (300, 60), 'email': (10, 300)},
+    'checkin': {'ip': (1200, 60), 'user': (20, 60)},
+}
+
+
+# ---------------------------------------------------------
+# COMMENT RISK FLAGS
+# ---------------------------------------------------------
+# Phrases that flag a check-in comment for follow-up (see dashboard/risk.py
+# for the matching rules). Point COMMENT_RISK_KEYWORDS_FILE at a JSON file
+# of the same shape to use a school's own list, then run
+# `manage.py flag_comments` to re-check existing comments.
+COMMENT_RISK_KEYWORDS = {
+    'self_harm': [
+        'kill myself', 'hurt myself', 'harm myself', 'self harm', 'cut myself', 'cutting myself',
+        'want to die', 'wanna die', 'end it all', 'suicid*', 'not be here anymore',
+    ],
+    'bullying': [
+        'bully', 'bullies', 'bullied', 'bullying', 'picking on me', 'pick on me', 'beat me up',
+        'threaten*', 'laughing at me',
+    ],
+    'unsafe': ['hits me', 'hurts me', 'unsafe at home', 'scared to go home', 'afraid to go home', 'abus*'],
+    'hopeless': ['hopeless', 'no point', 'nobody cares', 'no one cares', 'hate myself', 'worthless', 'give up'],
+}
+if os.environ.get("COMMENT_RISK_KEYWORDS_FILE"):
+    with open(os.environ["COMMENT_RISK_KEYWORDS_FILE"], encoding="utf-8") as _f:
+        COMMENT_RISK_KEYWORDS = json.load(_f)
+
+
+# ---------------------------------------------------------
+# EMAIL & LOW-MOOD DIGESTS
+# ---------------------------------------------------------
+# Teachers get one email per DIGEST_INTERVAL_MINUTES listing students in
+# their class who checked in low or with a flagged comment (teachers with
+# no class get the whole school unless DIGEST_SCHOOL_WIDE is off). Cron
+# `manage.py send_digests` every few minutes; it sends only when a digest
+# is due and there is something new. See dashboard/digest.py.
+EMAIL_BACKEND = os.environ.get("EMAIL_BACKEND", "django.core.mail.backends.console.EmailBackend")
+EMAIL_HOST = os.environ.get("EMAIL_HOST", "localhost")
+EMAIL_PORT = int(os.environ.get("EMAIL_PORT", 25))
+EMAIL_HOST_USER = os.environ.get("EMAIL_HOST_USER", "")
+EMAIL_HOST_PASSWORD = os.environ.get("EMAIL_HOST_PASSWORD", "")
+EMAIL_USE_TLS = os.environ.get("EMAIL_USE_TLS", "0") == "1"
+EMAIL_TIMEOUT = 20
+DEFAULT_FROM_EMAIL = os.environ.get("DEFAULT_FROM_EMAIL", "wellbeing@localhost")
+SITE_URL = os.environ.get("SITE_URL", "http://localhost:8000")
+
+DIGEST_INTERVAL_MINUTES = int(os.environ.get("DIGEST_INTERVAL_MINUTES", 60))
+DIGEST_SCHOOL_WIDE = os.environ.get("DIGEST_SCHOOL_WIDE", "1") == "1"
+# A digest covers changes at least this old. Writers stamp updated_at before
+# they commit (the Sheets sync uses its start time), so this must be longer
+# than a sync or check-in drain can take, or their entries are missed
+DIGEST_SETTLE_SECONDS = int(os.environ.get("DIGEST_SETTLE_SECONDS", 300))
+# Entries dated further back than this are left out (e.g. restored from an archive)
+DIGEST_MAX_AGE_DAYS = 1
+# Longest list in one email; the rest are counted
+DIGEST_MAX_ROWS = 50
+
+
+# ---------------------------------------------------------
+# BACKGROUND EXPORTS
+# ---------------------------------------------------------
+# Exports run on a thread pool in each web process (dashboard/jobs.py),
+# tracked in the ExportJob table. A finished file is handed to anyone
+# asking for the same export within EXPORT_RESULT_TTL seconds.
+# `manage.py run_jobs` picks up jobs left behind by a restart.
+EXPORT_JOB_WORKERS = int(os.environ.get("EXPORT_JOB_WORKERS", 2))
+EXPORT_DIR = os.environ.get("EXPORT_DIR", os.path.join(BASE_DIR, "exports"))
+EXPORT_RESULT_TTL = int(os.environ.get("EXPORT_RESULT_TTL", 600))
+EXPORT_KEEP_DAYS = 7
+
+
+# ---------------------------------------------------------
+# MONITORING
+# ---------------------------------------------------------
+# /metrics serves Prometheus text format (dashboard/metrics.py). With
+# several processes, each writes its totals to METRICS_DIR every
+# METRICS_FLUSH_SECONDS and a scrape adds them up; gunicorn.conf.py sets
+# the directory. Scrapes must send "Authorization: Bearer <METRICS_TOKEN>";
+# without a token /metrics is only served with DEBUG on.
+# /ready/ answers 503 when a database takes longer than READINESS_MAX_DB_MS.
+METRICS_DIR = os.environ.get("METRICS_DIR", "")
+METRICS_FLUSH_SECONDS = 5
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+READINESS_MAX_DB_MS = int(os.environ.get("READINESS_MAX_DB_MS", 500))
+
+
 # ---------------------------------------------------------
 # GOOGLE SHEETS AUTH CONFIG (LOCAL + RENDER)
 # ---------------------------------------------------------
+# Off unless credentials are configured. When off, nothing imports the
+# Google client libraries, which keeps worker boot and tests fast.
+GOOGLE_SHEETS_ENABLED = os.environ.get(
+    "GOOGLE_SHEETS_ENABLED",
+    "1" if os.environ.get("GOOGLE_SHEETS_CREDS") or os.environ.get("GOOGLE_CREDENTIALS_JSON")
+    or os.environ.get("GOOGLE_SHEETS_FAKE_PATH") else "0",
+) == "1"
+
+# Request budget for the Sheets API, per process (see dashboard/sheets_client.py).
+# Google allows 60 requests per minute per user; with several workers, split it.
+SHEETS_QUOTA_PER_MINUTE = int(os.environ.get("SHEETS_QUOTA_PER_MINUTE", 60))
+SHEETS_QUOTA_BURST = 10
+SHEETS_MAX_RETRIES = 3
+# Longest a request waits for quota before giving up and degrading (seconds)
+SHEETS_BUDGET_WAIT = 2.0
+
+# Local development: a JSON file standing in for the spreadsheet
+# (dashboard/sheets_fake.py), so Sheets code paths run without credentials
+GOOGLE_SHEETS_FAKE_PATH = os.environ.get("GOOGLE_SHEETS_FAKE_PATH", "")
+
 GOOGLE_SHEETS_SCOPES = [
     "https://www.googleapis.com/auth/spreadsheets",
     "https://www.googleapis.com/auth/drive"
@@ -138,6 +389,7 @@ def get_google_credentials():
     Loads Google service account credentials.
     Works BOTH locally and on Render using environment variable.
     """
+    from google.oauth2 import service_account
 
     # Render (environment variable)
     if os.environ.get("GOOGLE_CREDENTIALS_JSON"):